@@ -1,12 +1,174 @@
 from uuid import uuid1
+import asyncio
+import threading
 import streamlit as st
-from graph import graph
+from graph import graph, astream_answer
+from ingestion import INGEST_POLL_SECONDS
 
-def run(text, config):  
-    return graph.invoke({"messages": text}, config, debug=True)  
+@st.cache_resource
+def get_event_loop():
+    """
+    Event loop único do processo, rodando numa thread daemon.
+    
+    O cliente httpx async do langchain_openai é compartilhado pelo processo:
+    com um asyncio.run por rerun, cada sessão usaria um loop novo e o cliente
+    ficaria preso a um loop já fechado ("Event loop is closed").
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True, name="graph-event-loop").start()
+    return loop
+
+def run_coroutine(coroutine):
+    """Executa a corrotina no loop do processo e espera o resultado (na thread do script)."""
+    return asyncio.run_coroutine_threadsafe(coroutine, get_event_loop()).result()
+
+def run_streaming(text, config, placeholder):
+    """
+    Executa o graph em modo streaming, renderizando a resposta no placeholder
+    à medida que os tokens e eventos de ferramenta chegam.
+    
+    O stream roda no loop do processo; cada evento é buscado e renderizado na
+    thread do script (o Streamlit só desenha a partir dela).
+    
+    Returns:
+        Evento final do stream: estado do graph, ttft_ms e total_ms
+        
+    Raises:
+        RuntimeError: O stream terminou sem o evento final ("done")
+    """
+    events = astream_answer({"messages": text}, config)
+    content = ""
+    try:
+        while True:
+            try:
+                event = run_coroutine(events.__anext__())
+            except StopAsyncIteration:
+                raise RuntimeError("O graph encerrou a resposta sem o evento final (done)")
+            if event["type"] == "token":
+                content += event["content"]
+                placeholder.markdown(content + "▌")
+            elif event["type"] == "tool_start":
+                query = event['args'].get('query') or event['args'].get('metric', '')
+                placeholder.markdown(f"{content}\n\n🔍 Consultando relatórios: *{query}*")
+            elif event["type"] == "tool_end":
+                content = event["content"]
+                placeholder.markdown(content)
+            elif event["type"] == "done":
+                return event
+    finally:
+        run_coroutine(events.aclose())
+
+
+@st.cache_resource
+def start_warm_up():
+    """Abre o banco e carrega o modelo de embeddings em background, uma vez por processo."""
+    from tools import warm_up
+    thread = threading.Thread(target=warm_up, daemon=True)
+    thread.start()
+    return thread
+
+
+@st.cache_resource
+def start_metrics_server():
+    """Expõe /metrics (Prometheus) e /metrics.json se METRICS_PORT estiver definido."""
+    from metrics import METRICS_PORT, serve_metrics
+    return serve_metrics(int(METRICS_PORT)) if METRICS_PORT else None
+
+
+@st.cache_resource
+def start_ingestion_worker():
+    """Worker que indexa os uploads enfileirados, uma thread por processo."""
+    from ingestion import get_ingestion_worker
+    return get_ingestion_worker()
+
+
+def _upload_key(uploaded_file) -> str:
+    return f"{uploaded_file.name}:{uploaded_file.size}"
+
+
+def submit_uploads(uploaded_files):
+    """Enfileira os arquivos (bytes do buffer do upload, sem arquivo temporário) e acompanha os jobs na sessão."""
+    from ingestion import get_ingestion_queue
+    queue = get_ingestion_queue()
+    jobs = st.session_state.setdefault("ingestion_jobs", {})
+    for uploaded_file in uploaded_files:
+        jobs[_upload_key(uploaded_file)] = queue.submit(uploaded_file.name, uploaded_file.getvalue())
+    st.session_state["ingestion_polling"] = True
+    start_ingestion_worker().notify()
+
+
+JOB_ICONS = {"queued": "⏳", "running": "🔄", "done": "✅", "error": "❌"}
+
+
+def show_ingestion_status():
+    """Progresso dos jobs de ingestão da sessão (atualizado periodicamente enquanto há jobs pendentes)."""
+    from ingestion import get_ingestion_queue
+    jobs = get_ingestion_queue().jobs(st.session_state["ingestion_jobs"].values())
+    if not jobs:
+        return
+    
+    finished = sum(job["status"] in ("done", "error") for job in jobs)
+    st.progress(finished / len(jobs), text=f"📥 Indexação: {finished}/{len(jobs)} arquivos")
+    for job in jobs:
+        if job["status"] == "running":
+            detail = f"{job['chunks']} chunks gravados"
+        elif job["status"] == "queued":
+            detail = "na fila"
+        else:
+            detail = job["message"]
+        st.caption(f"{JOB_ICONS[job['status']]} {job['filename']}: {detail}")
+    
+    # Tudo processado: parar o polling e atualizar a página (contagem de documentos)
+    if finished == len(jobs) and st.session_state.get("ingestion_polling"):
+        st.session_state["ingestion_polling"] = False
+        st.rerun()
+
+
+def show_document_browser():
+    """Chunks indexados em páginas (ids e previews dos metadados), com filtro e remoção por arquivo."""
+    from metadata import build_where
+    from tools import DOCUMENT_PAGE_SIZE, get_vector_db
+    
+    db = get_vector_db()
+    source = st.selectbox("Arquivo", ["Todos", *sorted(db.manifest.entries)], key="docs_source")
+    where = build_where(source=source) if source != "Todos" else None
+    
+    first_page = db.list_documents(0, DOCUMENT_PAGE_SIZE, where)
+    if first_page["status"] != "success":
+        st.error(first_page["message"])
+        return
+    pages = max(1, -(-first_page["total"] // DOCUMENT_PAGE_SIZE))
+    page_number = st.number_input(
+        f"Página (de {pages})", min_value=1, max_value=pages, value=1, key=f"docs_page_{source}"
+    )
+    page = first_page if page_number == 1 else db.list_documents(
+        (page_number - 1) * DOCUMENT_PAGE_SIZE, DOCUMENT_PAGE_SIZE, where
+    )
+    if page["status"] != "success":
+        st.error(page["message"])
+        return
+    
+    for i, document in enumerate(page["documents"], page["offset"] + 1):
+        filename = document["source"] or f"Documento {i}"
+        part = f" (parte {document['chunk_index'] + 1})" if "chunk_index" in document else ""
+        st.text_area(f"{i}. {filename}{part}", document["preview"], height=100, disabled=True,
+                     key=f"doc_{document['id']}")
+    
+    if where and st.button(f"🗑️ Remover {source}", type="secondary"):
+        with st.spinner(f"Removendo {source}..."):
+            result = db.delete_documents(where)
+        if result["status"] == "success":
+            st.success(f"✅ {result['message']}")
+            st.rerun()
+        else:
+            st.error(f"❌ {result['message']}")
 
 
 def build_page(is_on: bool):
+    start_warm_up()
+    start_metrics_server()
+    start_ingestion_worker()
+    
     if "thread_id" not in st.session_state:
         st.session_state["thread_id"] = str(uuid1())
 
@@ -25,115 +187,19 @@ def build_page(is_on: bool):
                 help="Formatos suportados: TXT, PDF, DOCX, MD"
             )
             
-            # Processamento automático quando arquivos são enviados
-            if uploaded_files and "last_uploaded_files" not in st.session_state:
-                st.session_state["last_uploaded_files"] = []
-            
-            # Verificar se há novos arquivos
-            if uploaded_files:
-                current_files = [f.name for f in uploaded_files]
-                if current_files != st.session_state.get("last_uploaded_files", []):
-                    st.session_state["last_uploaded_files"] = current_files
-                    
-                    # Auto-indexar novos arquivos
-                    with st.spinner("🔄 Auto-indexando arquivos..."):
-                        try:
-                            from tools import vectorize_financial_reports
-                            import tempfile
-                            import os
-                            
-                            documents = []
-                            processed_count = 0
-                            
-                            for uploaded_file in uploaded_files:
-                                try:
-                                    # Criar arquivo temporário
-                                    with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix=f"_{uploaded_file.name}") as tmp_file:
-                                        tmp_file.write(uploaded_file.getvalue())
-                                        tmp_path = tmp_file.name
-                                    
-                                    # Processar arquivo
-                                    from tools import read_file_content
-                                    content = read_file_content(tmp_path)
-                                    
-                                    if "❌ Erro" not in content and "não suportado" not in content:
-                                        documents.append(f"📄 {uploaded_file.name}:\n{content}")
-                                        processed_count += 1
-                                    
-                                    # Limpar arquivo temporário
-                                    os.unlink(tmp_path)
-                                    
-                                except Exception as e:
-                                    st.error(f"Erro processando {uploaded_file.name}: {str(e)}")
-                            
-                            # Indexar documentos
-                            if documents:
-                                result = vectorize_financial_reports.invoke({"reports": documents})
-                                if result["status"] == "success":
-                                    st.success(f"✅ {processed_count} documentos indexados automaticamente!")
-                                
-                        except Exception as e:
-                            st.error(f"Erro na auto-indexação: {str(e)}")
-            
+            # Uploads novos vão para a fila de ingestão; a indexação roda em background
             if uploaded_files:
+                submitted = st.session_state.get("ingestion_jobs", {})
+                new_files = [f for f in uploaded_files if _upload_key(f) not in submitted]
+                if new_files:
+                    submit_uploads(new_files)
+                
                 if st.button("🔄 Indexar Documentos"):
-                    try:
-                        from tools import vectorize_financial_reports
-                        import tempfile
-                        import os
-                        
-                        documents = []
-                        processed_files = []
-                        failed_files = []
-                        
-                        for uploaded_file in uploaded_files:
-                            try:
-                                # Criar arquivo temporário
-                                with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix=f"_{uploaded_file.name}") as tmp_file:
-                                    tmp_file.write(uploaded_file.getvalue())
-                                    tmp_path = tmp_file.name
-                                
-                                # Processar arquivo usando nossa função
-                                from tools import read_file_content
-                                content = read_file_content(tmp_path)
-                                
-                                # Verificar se foi processado com sucesso
-                                if "❌ Erro" in content or "não suportado" in content:
-                                    failed_files.append(f"{uploaded_file.name}: {content}")
-                                else:
-                                    documents.append(f"📄 {uploaded_file.name}:\n{content}")
-                                    processed_files.append(uploaded_file.name)
-                                
-                                # Limpar arquivo temporário
-                                os.unlink(tmp_path)
-                                
-                            except Exception as e:
-                                failed_files.append(f"{uploaded_file.name}: Erro - {str(e)}")
-                        
-                        # Mostrar status de processamento
-                        if processed_files:
-                            st.info(f"📄 Arquivos processados: {', '.join(processed_files)}")
-                        
-                        if failed_files:
-                            st.warning("⚠️ Arquivos com problema:")
-                            for failure in failed_files:
-                                st.text(f"  • {failure}")
-                        
-                        # Indexar documentos processados com sucesso
-                        if documents:
-                            with st.spinner(f"Indexando {len(documents)} documentos..."):
-                                result = vectorize_financial_reports.invoke({"reports": documents})
-                            
-                            if result["status"] == "success":
-                                st.success(f"✅ {result['documents_added']} documentos indexados com sucesso!")
-                                st.info(f"📊 Total no banco: {result['total_documents']} documentos")
-                            else:
-                                st.error(f"❌ Erro na indexação: {result['message']}")
-                        else:
-                            st.error("❌ Nenhum documento foi processado com sucesso")
-                            
-                    except Exception as e:
-                        st.error(f"❌ Erro geral: {str(e)}")
+                    submit_uploads(uploaded_files)
+            
+            if st.session_state.get("ingestion_jobs"):
+                polling = st.session_state.get("ingestion_polling", False)
+                st.fragment(show_ingestion_status, run_every=INGEST_POLL_SECONDS if polling else None)()
             
             # Indexar documentos de exemplo
             st.subheader("📊 Documentos de Exemplo")
@@ -155,6 +221,15 @@ def build_page(is_on: bool):
             
             st.divider()
             
+            # Cache semântico de respostas
+            st.checkbox(
+                "♻️ Ignorar cache de respostas",
+                key="bypass_answer_cache",
+                help="Gera uma resposta nova mesmo que uma pergunta equivalente já tenha sido respondida"
+            )
+            
+            st.divider()
+            
             # Gerenciar banco de dados
             st.header("�️ Banco de Dados")
             
@@ -180,34 +255,10 @@ def build_page(is_on: bool):
                             st.session_state["confirm_clear"] = True
                             st.warning("⚠️ Clique novamente para confirmar a limpeza")
                 
-                # Listar documentos indexados
+                # Listar documentos indexados (uma página por vez, sem ler os textos)
                 if stats["total_documents"] > 0:
                     with st.expander("📋 Ver Documentos Indexados"):
-                        try:
-                            import chromadb
-                            from chromadb.config import Settings
-                            
-                            client = chromadb.PersistentClient(
-                                path='./chromadb_storage',
-                                settings=Settings(anonymized_telemetry=False, allow_reset=True)
-                            )
-                            collection = client.get_collection('financial_reports')
-                            all_data = collection.get()
-                            
-                            for i, (doc_id, document) in enumerate(zip(all_data['ids'], all_data['documents']), 1):
-                                # Extrair nome do arquivo
-                                first_line = document.split('\n')[0]
-                                if '📄' in first_line:
-                                    filename = first_line.replace('📄', '').strip().rstrip(':')
-                                else:
-                                    filename = f"Documento {i}"
-                                
-                                # Mostrar preview
-                                preview = document[:200] + "..." if len(document) > 200 else document
-                                st.text_area(f"{i}. {filename}", preview, height=100, disabled=True, key=f"doc_{i}")
-                                
-                        except Exception as e:
-                            st.error(f"Erro ao listar documentos: {e}")
+                        show_document_browser()
                 
             except Exception as e:
                 st.warning(f"Status não disponível: {str(e)}")
@@ -226,6 +277,7 @@ def build_page(is_on: bool):
         with input_container:
             conversational = st.columns((1, 14))
             if conversational[0].button(label="🗑️"):
+                graph.checkpointer.delete_thread(st.session_state["thread_id"])
                 st.session_state["chat_history"] = []
                 st.session_state["thread_id"] = str(uuid1())
                 st.rerun()
@@ -238,12 +290,21 @@ def build_page(is_on: bool):
             
             config = {
                 "configurable": {
-                    "thread_id": st.session_state["thread_id"]
+                    "thread_id": st.session_state["thread_id"],
+                    "bypass_answer_cache": st.session_state.get("bypass_answer_cache", False)
                 }
             }
 
             try:
-                response = run(prompt, config)
+                # Renderizar a resposta incrementalmente enquanto o graph executa
+                with output.container():
+                    with st.chat_message("user"):
+                        st.markdown(prompt)
+                    with st.chat_message("assistant"):
+                        result = run_streaming(prompt, config, st.empty())
+                output.empty()
+                
+                response = result["state"]
                 # Estruturar resposta baseada no tipo de sistema usado
                 assistant_response = {
                     "role": "assistant", 
@@ -252,7 +313,11 @@ def build_page(is_on: bool):
                     # Novos campos para RAG financeiro
                     "retrieved_doc": response.get("retrieved_doc", ""),
                     "similarity_score": response.get("similarity_score", 0.0),
-                    "confidence": response.get("confidence", "")
+                    "confidence": response.get("confidence", ""),
+                    # Latência percebida (primeiro token) e total
+                    "ttft_ms": result["ttft_ms"],
+                    "total_ms": result["total_ms"],
+                    "answer_cache": response.get("answer_cache")
                 }
                 
                 st.session_state["chat_history"].append(assistant_response)
@@ -279,6 +344,14 @@ def build_page(is_on: bool):
                 with st.chat_message(msg["role"]):
                     st.markdown(msg["content"])
                     
+                    if msg.get("total_ms") is not None:
+                        st.caption(f"⚡ Primeiro token: {msg['ttft_ms']:.0f} ms · Total: {msg['total_ms']:.0f} ms")
+                    
+                    cached = msg.get("answer_cache") or {}
+                    if cached.get("status") == "hit":
+                        st.caption(f"♻️ Resposta do cache (similaridade {cached['similarity']:.0%} "
+                                   f"com \"{cached['cached_query']}\")")
+                    
                     # Sistema RAG financeiro - exibir informações detalhadas
                     if msg.get("retrieved_doc") and msg["role"] == "assistant":
                         with st.expander("📊 Informações do Sistema RAG Financeiro"):
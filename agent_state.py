@@ -4,6 +4,15 @@ from langgraph.graph.message import add_messages
 from pydantic import BaseModel, Field
 import numpy as np
 
+def merge_metrics(current: Optional[Dict[str, float]], update: Optional[Dict[str, Optional[float]]]) -> Dict[str, float]:
+    """
+    Combina as métricas gravadas por nós que rodam em paralelo (cada nó grava suas próprias chaves).
+
+    Uma chave com valor None é removida (métrica de uma execução anterior do nó).
+    """
+    merged = {**(current or {}), **(update or {})}
+    return {key: value for key, value in merged.items() if value is not None}
+
 #STATE
 class AgentState(TypedDict):
     """
@@ -14,6 +23,7 @@ class AgentState(TypedDict):
     Index: para identificar base de conhecimento aplicada
     Docs: lista de documentos recuperados e filtrados
     Summary: resumo da conversa
+    Summary_metrics: resumos feitos e tokens economizados na thread
     
     Novos campos para RAG:
     Financial_reports: relatórios financeiros para indexação
@@ -23,6 +33,7 @@ class AgentState(TypedDict):
     Confidence: nível de confiança (alta/média/baixa)
     Retrieval_metrics: métricas de performance do sistema
     Vector_db_info: informações sobre o banco de vetores persistente
+    Answer_cache: consulta ao cache semântico de respostas (status, versão da coleção, similaridade)
     """
 
     messages: Annotated[List[BaseMessage], add_messages]
@@ -30,6 +41,7 @@ class AgentState(TypedDict):
     index: str
     docs: List[Dict]
     summary: str
+    summary_metrics: Optional[Dict[str, int]]
     
     # Campos para Financial Reports RAG
     financial_reports: Optional[List[str]]
@@ -37,10 +49,13 @@ class AgentState(TypedDict):
     retrieved_doc: Optional[str]
     similarity_score: Optional[float]
     confidence: Optional[str]  # "alta", "média", "baixa"
-    retrieval_metrics: Optional[Dict[str, float]]
+    retrieval_metrics: Annotated[Optional[Dict[str, float]], merge_metrics]
     
     # Campos para banco de vetores persistente
     vector_db_info: Optional[Dict[str, Any]]  # tipo de DB, path, estatísticas
+    
+    # Cache semântico de respostas (answer_cache.py)
+    answer_cache: Optional[Dict[str, Any]]  # "hit", "miss", "bypass", "skip" ou "stored"
 
 
 class ConfidenceGrade(BaseModel):
@@ -0,0 +1,171 @@
+"""
+Cache semântico de respostas do agente.
+
+Perguntas repetidas (ou quase iguais) dos analistas não precisam passar de novo
+pelo LLM: a resposta gerada para uma pergunta fica guardada junto do embedding da
+pergunta, e uma pergunta nova cujo embedding tenha similaridade de cosseno
+>= ANSWER_CACHE_THRESHOLD com uma já respondida recebe a mesma resposta.
+
+Uma resposta só é reaproveitada se a coleção não mudou desde que foi gerada
+(versão do manifesto do SimpleVectorDB) e se tem menos de ANSWER_CACHE_TTL
+segundos; acima de ANSWER_CACHE_SIZE respostas, sai a usada há mais tempo.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+
+import metrics
+
+# Configurações
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "1") == "1"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # Similaridade de cosseno mínima
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))              # Validade de uma resposta (segundos)
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))               # Respostas mantidas em memória
+
+
+class SemanticAnswerCache:
+    """
+    Respostas indexadas pelo embedding da pergunta, com TTL e remoção LRU.
+
+    A busca compara a pergunta com todas as guardadas numa única multiplicação
+    de matriz (o cache é pequeno), então não depende de um índice à parte.
+
+    Args:
+        maxsize: Número máximo de respostas
+        threshold: Similaridade de cosseno mínima para reaproveitar uma resposta
+        ttl: Segundos até uma resposta expirar
+        clock: Relógio em segundos (substituível para simular o tempo)
+    """
+
+    def __init__(self, maxsize: int = ANSWER_CACHE_SIZE, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 ttl: float = ANSWER_CACHE_TTL, clock: Callable[[], float] = time.time):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None  # Embeddings na ordem de _entries (refeita após mudanças)
+        self._keys: List[str] = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _drop(self, key: str):
+        del self._entries[key]
+        self._matrix = None
+
+    def _purge_expired(self):
+        deadline = self._clock() - self.ttl
+        for key in [key for key, entry in self._entries.items() if entry["created_at"] < deadline]:
+            self._drop(key)
+
+    def lookup(self, embedding, version: Hashable) -> Optional[Dict]:
+        """
+        Resposta guardada para a pergunta mais parecida, se passar do threshold.
+
+        Respostas geradas com outra versão da coleção são descartadas ao serem
+        encontradas (os documentos mudaram, a resposta pode estar desatualizada).
+
+        Returns:
+            {"query", "answer", "similarity", "age_s"} ou None
+        """
+        query_vector = self._normalize(embedding)
+        with self._lock:
+            self._purge_expired()
+            if not self._entries:
+                self.misses += 1
+                metrics.increment("answer_cache_lookups", result="miss")
+                return None
+            if self._matrix is None:
+                self._keys = list(self._entries)
+                self._matrix = np.vstack([self._entries[key]["embedding"] for key in self._keys])
+
+            similarities = self._matrix @ query_vector
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            key = self._keys[best]
+            entry = self._entries[key]
+
+            if similarity < self.threshold:
+                result = "miss"
+            elif entry["version"] != version:
+                self._drop(key)
+                result = "stale"
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.increment("answer_cache_lookups", result="hit")
+                return {
+                    "query": entry["query"],
+                    "answer": entry["answer"],
+                    "similarity": round(similarity, 4),
+                    "age_s": round(self._clock() - entry["created_at"], 1)
+                }
+
+            self.misses += 1
+            if result == "stale":
+                self.stale += 1
+            metrics.increment("answer_cache_lookups", result=result)
+            return None
+
+    def store(self, query: str, embedding, answer: str, version: Hashable):
+        """Guarda (ou substitui) a resposta de uma pergunta, gerada com a versão `version` da coleção."""
+        with self._lock:
+            if query in self._entries:
+                del self._entries[query]
+            self._entries[query] = {
+                "query": query,
+                "embedding": self._normalize(embedding),
+                "answer": answer,
+                "version": version,
+                "created_at": self._clock()
+            }
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        """Tamanho, acertos, erros (dos quais descartados por mudança na coleção) e taxa de acerto."""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+# Instância global, criada sob demanda
+_answer_cache: Optional[SemanticAnswerCache] = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Retorna o cache de respostas global (compartilhado pelas sessões do Streamlit)."""
+    global _answer_cache
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = SemanticAnswerCache()
+    return _answer_cache
@@ -0,0 +1,6 @@
+"""
+Benchmarks do Financial RAG.
+
+Executar a partir da raiz do projeto, por exemplo:
+    python -m benchmarks.chunking
+"""
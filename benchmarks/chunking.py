@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+📏 Benchmark de Chunking
+=======================
+
+Compara as estratégias de `chunking.py` com o splitter antigo (`_split_into_chunks`,
+aplicado só a documentos > 10.000 caracteres) sobre os documentos de exemplo:
+nº de chunks, tamanho médio, tempo de chunking e, com --embed, tempo de embedding.
+
+Uso:
+    python -m benchmarks.chunking [--scale 50] [--embed]
+"""
+
+import argparse
+import statistics
+import time
+from pathlib import Path
+from typing import List
+
+from chunking import CHUNKERS, get_chunker
+
+SAMPLE_DIR = Path(__file__).resolve().parent.parent / "documentos_exemplo"
+
+
+def legacy_split(document: str, chunk_size: int = 2000, overlap: int = 200) -> List[str]:
+    """Reprodução do splitter anterior, para comparação."""
+    if len(document) <= 10000:
+        return [document]
+    chunks = []
+    start = 0
+    while start < len(document):
+        end = start + chunk_size
+        if end < len(document):
+            for i in range(end, max(start + chunk_size // 2, end - 200), -1):
+                if document[i] == '\n':
+                    end = i
+                    break
+        chunk_content = document[start:end].strip()
+        if chunk_content:
+            chunks.append(f"Documento (Parte {len(chunks) + 1}):\n{chunk_content}")
+        start = end - overlap if end > overlap else end
+        if start >= len(document):
+            break
+    return chunks
+
+
+def load_corpus(scale: int) -> List[str]:
+    """Documentos de exemplo; com scale > 1, cada um é repetido para simular relatórios longos."""
+    documents = [path.read_text(encoding="utf-8") for path in sorted(SAMPLE_DIR.glob("*.txt"))]
+    if scale > 1:
+        documents += [doc * scale for doc in documents]
+    return documents
+
+
+def run(scale: int, embed: bool):
+    corpus = load_corpus(scale)
+    total_chars = sum(len(doc) for doc in corpus)
+    print(f"📚 Corpus: {len(corpus)} documentos, {total_chars:,} caracteres")
+
+    embedding_function = None
+    if embed:
+        from embeddings import load_embedding_model
+        embedding_function = load_embedding_model()
+        embedding_function(["aquecimento"])
+
+    strategies = {"legacy": lambda doc: legacy_split(doc)}
+    for name in CHUNKERS:
+        chunker = get_chunker(name)
+        if hasattr(chunker, "count_tokens"):
+            chunker.count_tokens("aquecimento")  # carregar o tokenizer fora da medição
+        strategies[name] = lambda doc, chunker=chunker: list(chunker.chunk([doc], "📄 exemplo.txt:"))
+
+    print(f"\n{'estratégia':<12}{'chunks':>8}{'média':>8}{'máx':>8}{'chunk (ms)':>12}{'embed (ms)':>12}")
+    for name, split in strategies.items():
+        start = time.perf_counter()
+        chunks = [chunk for doc in corpus for chunk in split(doc)]
+        chunk_ms = (time.perf_counter() - start) * 1000
+
+        embed_ms = float("nan")
+        if embedding_function:
+            start = time.perf_counter()
+            embedding_function(chunks)
+            embed_ms = (time.perf_counter() - start) * 1000
+
+        sizes = [len(chunk) for chunk in chunks]
+        print(f"{name:<12}{len(chunks):>8}{statistics.mean(sizes):>8.0f}{max(sizes):>8}"
+              f"{chunk_ms:>12.1f}{embed_ms:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das estratégias de chunking")
+    parser.add_argument("--scale", type=int, default=50, help="Repetições de cada documento de exemplo")
+    parser.add_argument("--embed", action="store_true", help="Medir também o tempo de embedding (baixa o modelo)")
+    args = parser.parse_args()
+    run(args.scale, args.embed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+🗜️ Benchmark do Armazenamento Compacto
+=====================================
+
+Compara a busca vetorial do ChromaDB (HNSW, float32) com o armazenamento
+compacto de compact.py (int8 memory-mapped + re-score exato em float32):
+
+- corpus: o mesmo do benchmark de recuperação, ingerido com COMPACT_VECTORS=1
+  (o armazenamento é preenchido durante a ingestão, como no aplicativo);
+- consultas e verdade: as do hnsw_sweep (perguntas rotuladas + linhas de chunks
+  sorteados; distância do k-ésimo vizinho exato por força bruta em numpy);
+- alvos: collection.query (HNSW), só a primeira passada em int8 e a primeira
+  passada + re-score de cada nº de candidatos em --candidates;
+- métricas: recall@k contra os vizinhos exatos, latência p50/p95, bytes em disco
+  (códigos int8 x vetores float32 x arquivos do HNSW) e, de ponta a ponta,
+  SimpleVectorDB.search no modo vector com e sem o armazenamento compacto.
+
+Uso:
+    python -m benchmarks.compact [--chunks 20000] [--candidates 20,50,100,200] [--k 10]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+
+from benchmarks.hnsw_sweep import DISTANCE_TOLERANCE, _int_list, kth_distances, measure, sample_queries
+from benchmarks.retrieval import evaluate_search, ingest, load_embedding_function, percentile, rss_mb
+
+
+def directory_mb(path: Path, pattern: str = "*") -> float:
+    return round(sum(f.stat().st_size for f in path.rglob(pattern) if f.is_file()) / 1024 / 1024, 2)
+
+
+def load_vectors_by_id(collection, batch_size: int = 1000) -> Dict[str, np.ndarray]:
+    """Embedding de cada chunk da coleção, por id (lido em páginas)."""
+    vectors = {}
+    offset = 0
+    while True:
+        page = collection.get(limit=batch_size, offset=offset, include=["embeddings"])
+        if not page["ids"]:
+            break
+        vectors.update(zip(page["ids"], np.asarray(page["embeddings"], dtype=np.float32)))
+        offset += len(page["ids"])
+    return vectors
+
+
+def exact_distances(vectors: np.ndarray, query: np.ndarray, space: str) -> np.ndarray:
+    """Distância exata (métrica do ChromaDB) entre a consulta e cada vetor."""
+    if space == "l2":
+        return np.sum((vectors - query) ** 2, axis=1)
+    if space == "cosine":
+        norms = np.maximum(np.linalg.norm(vectors, axis=1), 1e-12) * max(float(np.linalg.norm(query)), 1e-12)
+        return 1 - vectors @ query / norms
+    return 1 - vectors @ query
+
+
+def measure_compact(store, queries: np.ndarray, thresholds: np.ndarray, k: int, space: str,
+                    candidates: int, rescore: bool, repeat: int, vectors_by_id: Dict[str, np.ndarray]) -> Dict:
+    """
+    Recall@k contra os vizinhos exatos e latência de CompactVectorStore.search.
+
+    O acerto é conferido com a distância exata dos ids devolvidos (sem re-score,
+    as distâncias da busca são as aproximadas do int8).
+    """
+    latencies, recalls = [], []
+    for _ in range(repeat):
+        recalls = []
+        for query, threshold in zip(queries, thresholds):
+            start_time = time.perf_counter()
+            hits = store.search(query, k, space, candidates=candidates, rescore=rescore)
+            latencies.append((time.perf_counter() - start_time) * 1000)
+            distances = exact_distances(np.vstack([vectors_by_id[doc_id] for doc_id, _ in hits]), query, space)
+            recalls.append(float(np.sum(distances <= threshold + DISTANCE_TOLERANCE)) / k)
+    return {
+        f"recall@{k}": float(np.mean(recalls)),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+    }
+
+
+def run(args) -> Dict:
+    workdir = tempfile.mkdtemp(prefix="compact_benchmark_")
+    os.environ["CHROMADB_PATH"] = os.path.join(workdir, "chromadb")
+    os.environ["CHECKPOINT_DB"] = os.path.join(workdir, "checkpoints.sqlite")
+    os.environ["COMPACT_VECTORS"] = "1"
+    os.environ.setdefault("OPENAI_API_KEY", "stub")  # o LLM nunca é chamado
+
+    from tools import get_vector_db
+
+    db = get_vector_db()
+    db.embedding_function = load_embedding_function(args.embedding)
+    print(f"🧠 Embedding: {type(db.embedding_function).__name__}")
+    print(f"📥 Ingerindo até {args.chunks:,} chunks em {workdir}")
+    report = {"ingest": ingest(db, args.chunks), "k": args.k, "space": db.space, "results": []}
+    print(f"✅ {report['ingest']['chunks']:,} chunks em {report['ingest']['seconds']}s")
+
+    store = db.compact
+    vectors_by_id = load_vectors_by_id(db.collection)
+    vectors = np.vstack(list(vectors_by_id.values()))
+    queries_text = sample_queries(db.collection, args.queries)
+    queries = np.asarray(db.embedding_function(queries_text), dtype=np.float32)
+    thresholds = kth_distances(vectors, queries, args.k, db.space)
+    print(f"🔎 {len(queries)} consultas, {len(vectors):,} vetores de {vectors.shape[1]} dimensões")
+
+    chroma_path = Path(os.environ["CHROMADB_PATH"])
+    compact_stats = store.get_stats()
+    report["storage_mb"] = {
+        "hnsw_index": directory_mb(chroma_path, "*.bin"),
+        "compact_first_pass": compact_stats["first_pass_mb"],
+        "compact_total": compact_stats["total_mb"],
+        "float32_vectors": round(vectors.nbytes / 1024 / 1024, 2),
+    }
+    report["clipped_values"] = compact_stats["clipped_values"]
+
+    # A primeira consulta carrega o índice / os memmaps do disco: não entra na medição
+    db.collection.query(query_embeddings=[queries[0]], n_results=args.k, include=[])
+    store.search(queries[0], args.k, db.space)
+
+    targets = {"chroma hnsw": lambda: measure(db.collection, queries, thresholds, args.k, args.repeat)}
+    targets["int8 (sem re-score)"] = lambda: measure_compact(
+        store, queries, thresholds, args.k, db.space, args.k, False, args.repeat, vectors_by_id
+    )
+    for candidates in args.candidates:
+        targets[f"int8 + re-score {candidates}"] = lambda candidates=candidates: measure_compact(
+            store, queries, thresholds, args.k, db.space, candidates, True, args.repeat, vectors_by_id
+        )
+
+    print(f"\n{'alvo':<24}{'R@' + str(args.k):>8}{'p50 ms':>9}{'p95 ms':>9}")
+    for name, evaluate in targets.items():
+        row = {"target": name, **evaluate()}
+        report["results"].append(row)
+        print(f"{name:<24}{row[f'recall@{args.k}']:>8.3f}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}")
+
+    # Ponta a ponta: perguntas rotuladas no modo vector, com e sem o armazenamento compacto
+    report["search:vector"] = {"compact": evaluate_search(db, "vector", args.repeat)}
+    db.compact = None
+    report["search:vector"]["chroma"] = evaluate_search(db, "vector", args.repeat)
+    db.compact = store
+    print(f"\n{'search:vector':<24}{'R@1':>8}{'R@3':>8}{'p50 ms':>9}{'p95 ms':>9}")
+    for name, metrics in report["search:vector"].items():
+        print(f"{name:<24}{metrics['recall@1']:>8.2f}{metrics['recall@3']:>8.2f}"
+              f"{metrics['p50_ms']:>9.2f}{metrics['p95_ms']:>9.2f}")
+
+    storage = report["storage_mb"]
+    print(f"\n💾 Disco: HNSW {storage['hnsw_index']} MB | int8 (primeira passada) {storage['compact_first_pass']} MB | "
+          f"compacto total {storage['compact_total']} MB | float32 {storage['float32_vectors']} MB")
+    if report["clipped_values"]:
+        print(f"⚠️ {report['clipped_values']} valores saturados na quantização (recalibre com `python compact.py`)")
+    report["rss_mb"] = round(rss_mb(), 1)
+    print(f"💾 RSS (pico): {report['rss_mb']} MB")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HNSW x armazenamento compacto int8 com re-score")
+    parser.add_argument("--chunks", type=int, default=20000, help="Tamanho do corpus em chunks")
+    parser.add_argument("--candidates", type=_int_list, default=[20, 50, 100, 200],
+                        help="Candidatos re-pontuados em float32")
+    parser.add_argument("--k", type=int, default=10, help="Vizinhos avaliados no recall")
+    parser.add_argument("--queries", type=int, default=200, help="Consultas sorteadas do corpus (além das rotuladas)")
+    parser.add_argument("--repeat", type=int, default=1, help="Rodadas de consultas por alvo (latência)")
+    parser.add_argument("--embedding", choices=("auto", "default", "hashing"), default="auto",
+                        help="auto: modelo padrão se estiver em cache, senão hashing")
+    parser.add_argument("--json", help="Gravar o relatório completo neste arquivo")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"📝 Relatório gravado em {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+🔎 Micro-benchmark do extract_relevant_info
+==========================================
+
+Compara a versão atual (busca no documento inteiro + heap) com a implementação
+anterior (loops de `any(...)` por linha + sort completo), conferindo que ambas
+produzem exatamente o mesmo resultado.
+
+Uso:
+    python -m benchmarks.extract [--scale 20] [--repeat 50]
+"""
+
+import argparse
+import timeit
+from pathlib import Path
+
+from tools import extract_relevant_info
+
+SAMPLE_DIR = Path(__file__).resolve().parent.parent / "documentos_exemplo"
+
+QUERIES = [
+    "Qual foi o lucro líquido do Itaú?",
+    "ROE e ROA do Bradesco no Q3 2024",
+    "índice de Basileia",
+    "Inadimplência 90+ dias e coverage ratio",
+    "receitas de prestação de serviços",
+    "dividendos",
+]
+
+
+def legacy_extract_relevant_info(document: str, query: str) -> str:
+    """
+    Versão anterior de tools.extract_relevant_info (referência do benchmark).
+    
+    Args:
+        document: Documento completo encontrado
+        query: Pergunta do usuário
+        
+    Returns:
+        Informações específicas extraídas
+    """
+    try:
+        # Dividir documento em chunks menores para análise
+        document_lines = [line.strip() for line in document.split('\n') if line.strip()]
+        
+        # Extrair título do documento
+        document_title = ""
+        for line in document_lines[:3]:
+            if '📄' in line or any(word in line.lower() for word in [ 'relatório', 'trimestre']):
+                document_title = f"**{line}**"
+                break
+        
+        # Extrair termos-chave da query do usuário para busca flexível
+        query_terms = set()
+        query_lower = query.lower()
+        
+        # Adicionar palavras da query (removendo stop words básicas)
+        stop_words = {'o', 'a', 'do', 'da', 'de', 'no', 'na', 'em', 'por', 'para', 'com', 'foi', 'ser', 'qual', 'que', 'como'}
+        for word in query_lower.split():
+            cleaned_word = word.strip('.,?!();:')
+            if len(cleaned_word) > 2 and cleaned_word not in stop_words:
+                query_terms.add(cleaned_word)
+        
+        # Scoring de linhas baseado na relevância para a query
+        scored_lines = []
+        
+        for line in document_lines:
+            if len(line) < 10:  # Ignorar linhas muito curtas
+                continue
+                
+            line_lower = line.lower()
+            score = 0
+            
+            # Pontuação por termos da query encontrados
+            for term in query_terms:
+                if term in line_lower:
+                    score += 3
+                    
+            # Bonificação para linhas com valores financeiros
+            if any(indicator in line_lower for indicator in ['r$', 'milhões', 'bilhões', '%']):
+                score += 2
+                
+            # Bonificação para linhas com métricas financeiras
+            if any(metric in line_lower for metric in ['lucro', 'receita', 'ebitda', 'roe', 'margem', 'patrimônio']):
+                score += 2
+                
+            # Bonificação para linhas com números e períodos
+            if any(period in line_lower for period in ['3t25', 'q3', 'trimestre', '2024', '2025']):
+                score += 1
+                
+            if score > 0:
+                scored_lines.append((score, line))
+        
+        # Ordenar por score e pegar as mais relevantes
+        scored_lines.sort(key=lambda x: x[0], reverse=True)
+        relevant_lines = [f"- {line}" for score, line in scored_lines[:8]]  # Top 8 linhas mais relevantes
+        
+        # Se não encontrou linhas relevantes, usar fallback inteligente
+        if not relevant_lines:
+            # Buscar linhas com dados financeiros gerais
+            for line in document_lines:
+                if any(indicator in line.lower() for indicator in ['r$', '%', 'milhões', 'bilhões']):
+                    relevant_lines.append(f"- {line}")
+                    if len(relevant_lines) >= 5:
+                        break
+        
+        # Se ainda não encontrou nada, pegar início do documento
+        if not relevant_lines:
+            for i, line in enumerate(document_lines[1:6]):  # Pular título
+                if len(line) > 20:
+                    relevant_lines.append(f"- {line}")
+        
+        # Montar resultado final
+        result_parts = []
+        
+        if document_title:
+            result_parts.append(document_title)
+            result_parts.append("")
+        
+        if relevant_lines:
+            result_parts.extend(relevant_lines)
+        else:
+            # Último recurso
+            result_parts.append(f"- {document[:300]}...")
+        
+        return "\n".join(result_parts)
+        
+    except Exception as e:
+        # Em caso de erro, retornar versão truncada
+        return f"**Erro na extração:** {str(e)}\n\n{document[:300]}..."
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark do extract_relevant_info")
+    parser.add_argument("--scale", type=int, default=20, help="Repetições de cada documento (chunks maiores)")
+    parser.add_argument("--repeat", type=int, default=50, help="Execuções por medição")
+    args = parser.parse_args()
+
+    documents = [path.read_text(encoding="utf-8") * args.scale for path in sorted(SAMPLE_DIR.glob("*.txt"))]
+    cases = [(document, query) for document in documents for query in QUERIES]
+
+    mismatches = sum(
+        extract_relevant_info(document, query) != legacy_extract_relevant_info(document, query)
+        for document, query in cases
+    )
+    print(f"📚 {len(cases)} casos ({len(documents)} documentos x {len(QUERIES)} queries), "
+          f"{sum(len(d) for d in documents):,} caracteres")
+    print(f"{'✅' if not mismatches else '❌'} Resultados divergentes: {mismatches}")
+
+    results = {}
+    for name, function in [("anterior", legacy_extract_relevant_info), ("atual", extract_relevant_info)]:
+        elapsed = timeit.timeit(lambda: [function(d, q) for d, q in cases], number=args.repeat)
+        results[name] = elapsed / (args.repeat * len(cases)) * 1000
+        print(f"   {name:<10}{results[name]:>8.3f} ms/chamada")
+
+    print(f"⚡ Speedup: {results['anterior'] / results['atual']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
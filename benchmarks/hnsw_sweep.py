@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+📐 Varredura de Parâmetros HNSW
+==============================
+
+Mede recall x latência do índice HNSW do ChromaDB para escolher distância, M,
+ef_construction e ef_search de uma implantação:
+
+- corpus: o mesmo do benchmark de recuperação (exemplos + relatórios sintéticos);
+- consultas: as perguntas rotuladas + linhas de chunks sorteados do corpus;
+- verdade: a distância do k-ésimo vizinho exato de cada consulta, por força bruta
+  em numpy (um resultado conta como acerto se estiver a essa distância ou menos,
+  o que trata empates entre chunks quase idênticos);
+- para cada (distância, M, ef_construction) a coleção é reconstruída com
+  SimpleVectorDB.rebuild_collection (sem re-embedar) e cada ef_search é aplicado
+  com SimpleVectorDB.set_ef_search, sem reconstruir;
+- métricas: recall@k contra os vizinhos exatos, latência p50/p95 de
+  collection.query e tempo de construção do índice.
+
+Uso:
+    python -m benchmarks.hnsw_sweep [--chunks 20000] [--spaces l2,cosine] [--m 8,16,32]
+                                    [--ef-construction 100,200] [--ef-search 10,50,100,200]
+
+Ao final, sugere a configuração mais rápida (p95) com recall >= --target-recall e
+o comando reconstruir_indice.py correspondente.
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.retrieval import QUESTIONS, ingest, load_embedding_function, percentile, rss_mb
+
+
+DISTANCE_TOLERANCE = 1e-4  # Folga de ponto flutuante entre numpy e o índice
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+def load_embeddings(collection, batch_size: int = 1000):
+    """Matriz de embeddings da coleção inteira (lida em páginas)."""
+    vectors = []
+    offset = 0
+    while True:
+        page = collection.get(limit=batch_size, offset=offset, include=["embeddings"])
+        if not page["ids"]:
+            break
+        vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+        offset += len(page["ids"])
+    return np.vstack(vectors)
+
+
+def sample_queries(collection, count: int, seed: int = 42) -> List[str]:
+    """Perguntas rotuladas + uma linha de conteúdo de chunks sorteados do corpus."""
+    rng = random.Random(seed)
+    total = collection.count()
+    queries = [question for question, _, _ in QUESTIONS]
+    for offset in rng.sample(range(total), min(count, total)):
+        document = collection.get(limit=1, offset=offset, include=["documents"])["documents"][0]
+        lines = [line for line in document.split("\n")[1:] if len(line.strip()) > 10]
+        if lines:
+            queries.append(rng.choice(lines).strip("• "))
+    return queries
+
+
+def kth_distances(vectors: np.ndarray, queries: np.ndarray, k: int, space: str) -> np.ndarray:
+    """Distância do k-ésimo vizinho exato de cada consulta, na mesma métrica do ChromaDB."""
+    if space == "l2":
+        distances = (
+            np.sum(queries ** 2, axis=1, keepdims=True) - 2 * queries @ vectors.T + np.sum(vectors ** 2, axis=1)
+        )
+    elif space == "cosine":
+        normalized = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        query_norms = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        distances = 1 - query_norms @ normalized.T
+    else:
+        distances = 1 - queries @ vectors.T
+    return np.partition(distances, k - 1, axis=1)[:, k - 1]
+
+
+def measure(collection, queries: np.ndarray, thresholds: np.ndarray, k: int, repeat: int) -> Dict:
+    """Recall@k contra os vizinhos exatos e latência das consultas ao índice."""
+    latencies, recalls = [], []
+    for _ in range(repeat):
+        recalls = []
+        for query, threshold in zip(queries, thresholds):
+            start_time = time.perf_counter()
+            results = collection.query(query_embeddings=[query], n_results=k, include=["distances"])
+            latencies.append((time.perf_counter() - start_time) * 1000)
+            distances = np.asarray(results["distances"][0])
+            recalls.append(float(np.sum(distances <= threshold + DISTANCE_TOLERANCE)) / k)
+    return {
+        f"recall@{k}": float(np.mean(recalls)),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+    }
+
+
+def run(args) -> Dict:
+    workdir = tempfile.mkdtemp(prefix="hnsw_sweep_")
+    os.environ["CHROMADB_PATH"] = os.path.join(workdir, "chromadb")
+    os.environ["CHECKPOINT_DB"] = os.path.join(workdir, "checkpoints.sqlite")
+
+    from tools import get_vector_db
+
+    db = get_vector_db()
+    db.embedding_function = load_embedding_function(args.embedding)
+    print(f"🧠 Embedding: {type(db.embedding_function).__name__}")
+    print(f"📥 Ingerindo até {args.chunks:,} chunks em {workdir}")
+    report = {"ingest": ingest(db, args.chunks), "k": args.k, "results": []}
+    print(f"✅ {report['ingest']['chunks']:,} chunks em {report['ingest']['seconds']}s")
+
+    vectors = load_embeddings(db.collection)
+    queries_text = sample_queries(db.collection, args.queries)
+    queries = np.asarray(db.embedding_function(queries_text), dtype=np.float32)
+    print(f"🔎 {len(queries)} consultas, {len(vectors):,} vetores de {vectors.shape[1]} dimensões")
+
+    header = f"{'space':<8}{'M':>5}{'ef_c':>7}{'ef_s':>7}{'R@' + str(args.k):>8}{'p50 ms':>9}{'p95 ms':>9}{'build s':>9}"
+    print(f"\n{header}")
+    for space in args.spaces.split(","):
+        thresholds = kth_distances(vectors, queries, args.k, space)
+        for m in args.m:
+            for ef_construction in args.ef_construction:
+                rebuilt = db.rebuild_collection(
+                    space=space, m=m, ef_construction=ef_construction, ef_search=args.ef_search[0]
+                )
+                if rebuilt["status"] != "success":
+                    raise RuntimeError(rebuilt["message"])
+                for ef_search in args.ef_search:
+                    db.set_ef_search(ef_search)
+                    # A primeira consulta carrega o índice do disco: não entra na medição
+                    db.collection.query(query_embeddings=[queries[0]], n_results=args.k, include=[])
+                    row = {
+                        "space": space, "m": m, "ef_construction": ef_construction, "ef_search": ef_search,
+                        "build_seconds": rebuilt["seconds"],
+                        **measure(db.collection, queries, thresholds, args.k, args.repeat)
+                    }
+                    report["results"].append(row)
+                    print(f"{space:<8}{m:>5}{ef_construction:>7}{ef_search:>7}{row[f'recall@{args.k}']:>8.3f}"
+                          f"{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['build_seconds']:>9.1f}")
+
+    eligible = [row for row in report["results"] if row[f"recall@{args.k}"] >= args.target_recall]
+    if eligible:
+        best = min(eligible, key=lambda row: row["p95_ms"])
+        report["recommended"] = best
+        print(f"\n🏆 Mais rápida com recall@{args.k} >= {args.target_recall}: "
+              f"space={best['space']} M={best['m']} ef_construction={best['ef_construction']} "
+              f"ef_search={best['ef_search']} (p95 {best['p95_ms']:.2f} ms)")
+        print(f"   python reconstruir_indice.py --space {best['space']} --m {best['m']} "
+              f"--ef-construction {best['ef_construction']} --ef-search {best['ef_search']}")
+    else:
+        print(f"\n⚠️ Nenhuma configuração atingiu recall@{args.k} >= {args.target_recall}")
+
+    report["rss_mb"] = round(rss_mb(), 1)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Varredura recall x latência dos parâmetros HNSW")
+    parser.add_argument("--chunks", type=int, default=20000, help="Tamanho do corpus em chunks")
+    parser.add_argument("--spaces", default="l2,cosine", help="Distâncias avaliadas (l2, cosine, ip)")
+    parser.add_argument("--m", type=_int_list, default=[8, 16, 32], help="Valores de M")
+    parser.add_argument("--ef-construction", type=_int_list, default=[100, 200], help="Valores de ef_construction")
+    parser.add_argument("--ef-search", type=_int_list, default=[10, 50, 100, 200], help="Valores de ef_search")
+    parser.add_argument("--k", type=int, default=10, help="Vizinhos avaliados no recall")
+    parser.add_argument("--queries", type=int, default=200, help="Consultas sorteadas do corpus (além das rotuladas)")
+    parser.add_argument("--repeat", type=int, default=1, help="Rodadas de consultas por configuração (latência)")
+    parser.add_argument("--target-recall", type=float, default=0.95, help="Recall mínimo da recomendação")
+    parser.add_argument("--embedding", choices=("auto", "default", "hashing"), default="auto",
+                        help="auto: modelo padrão se estiver em cache, senão hashing")
+    parser.add_argument("--json", help="Gravar o relatório completo neste arquivo")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"📝 Relatório gravado em {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+🎯 Benchmark de Recuperação
+==========================
+
+Avalia a qualidade e o desempenho da busca de ponta a ponta, sem rede e sem LLM:
+
+- corpus: documentos de `documentos_exemplo/` + relatórios sintéticos gerados a
+  partir deles (outros bancos, trimestres e valores) até o nº de chunks pedido;
+- perguntas rotuladas: cada uma aponta o documento e o trecho que a respondem;
+- alvos: SimpleVectorDB.search (vector, bm25, hybrid), busca + reranking (--rerank),
+  financial_reports_retriever_tool
+  e o graph completo com o LLM substituído por stubs, nos modos "agent" (o stub sempre
+  chama o retriever) e "fast" (busca direta; o stub da geração devolve o contexto);
+- métricas: recall@k, MRR, latência p50/p95/p99, throughput de ingestão e RSS.
+
+O banco é criado num diretório temporário. Sem o modelo all-MiniLM-L6-v2 em cache
+(~/.cache/chroma), usa-se um embedding por hashing de termos (--embedding hashing).
+
+Uso:
+    python -m benchmarks.retrieval [--chunks 10000] [--repeat 3] [--embedding auto]
+    python -m benchmarks.retrieval --min-recall 0.8 --max-p95-ms 200   # gate de regressão
+
+Com --min-recall/--max-p95-ms, termina com código 1 se o recall@3 ou o p95 do modo
+padrão do retriever ficarem fora do limite.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+SAMPLE_DIR = Path(__file__).resolve().parent.parent / "documentos_exemplo"
+K_VALUES = (1, 3, 5, 10)
+INGEST_BATCH = 500  # Documentos sintéticos por chamada de add_documents
+
+# (pergunta, documento que responde, trecho que precisa estar no chunk)
+QUESTIONS: List[Tuple[str, str, str]] = [
+    ("Qual foi o lucro líquido recorrente do Itaú no 3T24?", "itau_q3_2024.txt", "R$ 7.891 milhões"),
+    ("ROE ajustado do Itaú Unibanco", "itau_q3_2024.txt", "ROE ajustado: 19,2%"),
+    ("Margem financeira do Itaú no terceiro trimestre", "itau_q3_2024.txt", "R$ 18.234 milhões"),
+    ("Índice de eficiência do Itaú", "itau_q3_2024.txt", "39,4%"),
+    ("Inadimplência 90+ dias do Itaú", "itau_q3_2024.txt", "Inadimplência 90+ dias: 2,9%"),
+    ("Coverage ratio do Itaú", "itau_q3_2024.txt", "Coverage ratio: 285%"),
+    ("Patrimônio líquido do Itaú Unibanco", "itau_q3_2024.txt", "R$ 164.5 bilhões"),
+    ("Quantos clientes digitais o Itaú tem?", "itau_q3_2024.txt", "34,2 milhões"),
+    ("Dividend yield e payout do Itaú", "itau_q3_2024.txt", "Payout ratio: 45%"),
+    ("Qual foi o lucro líquido ajustado do Bradesco no Q3 2024?", "bradesco_q3_2024.txt", "R$ 5.624 milhões"),
+    ("ROE do Bradesco no terceiro trimestre de 2024", "bradesco_q3_2024.txt", "18,5%"),
+    ("Receita de intermediação financeira do Bradesco", "bradesco_q3_2024.txt", "R$ 15.842 milhões"),
+    ("Índice de Basileia do Bradesco", "bradesco_q3_2024.txt", "Índice de Basileia: 13,8%"),
+    ("Carteira de crédito total do Bradesco", "bradesco_q3_2024.txt", "R$ 456.7 bilhões"),
+    ("Lucro do segmento Seguros e Previdência do Bradesco", "bradesco_q3_2024.txt", "R$ 494 milhões"),
+    ("Inadimplência total do Bradesco", "bradesco_q3_2024.txt", "Inadimplência total: 3,8%"),
+]
+
+_SYNTHETIC_BANKS = [
+    "Banco Aurora", "Banco Meridiano", "Caixa Horizonte", "Banco Atlântico", "Banco Serra Azul",
+    "Banco Vale Verde", "Banco Litoral", "Banco Planalto", "Banco Cruzeiro", "Banco Pioneiro",
+]
+_BANK_NAMES = re.compile(r"Itaú Unibanco|Itaú|Bradesco S\.A\.|Bradesco")
+_PERIODS = re.compile(r"3º Trimestre 2024|Terceiro Trimestre 2024|Q3 2024|Q4 2024|Q3 2023")
+_NUMBERS = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+# =============================================================================
+# CORPUS
+# =============================================================================
+
+def load_samples() -> List[Tuple[str, str]]:
+    """Documentos de exemplo como pares (nome do arquivo, conteúdo)."""
+    return [(path.name, path.read_text(encoding="utf-8")) for path in sorted(SAMPLE_DIR.glob("*.txt"))]
+
+
+def synthetic_reports(samples: List[Tuple[str, str]], seed: int = 42) -> Iterator[Tuple[str, str]]:
+    """
+    Gera relatórios sintéticos infinitos a partir dos exemplos.
+
+    Cada relatório troca banco, período e todos os valores do modelo: mesma
+    estrutura e vocabulário dos documentos reais (distratores difíceis), mas
+    nenhum contém as respostas das perguntas rotuladas.
+    """
+    rng = random.Random(seed)
+    number = 0
+    while True:
+        _, template = samples[number % len(samples)]
+        bank = f"{_SYNTHETIC_BANKS[rng.randrange(len(_SYNTHETIC_BANKS))]} {number // len(_SYNTHETIC_BANKS):05d}"
+        quarter, year = rng.randint(1, 4), rng.randint(2015, 2023)
+
+        content = _BANK_NAMES.sub(bank, template)
+        content = _PERIODS.sub(f"Q{quarter} {year}", content)
+        content = _NUMBERS.sub(lambda match: _perturb(match.group(), rng), content)
+        yield f"sintetico_{number:07d}_q{quarter}_{year}.txt", content
+        number += 1
+
+
+def _perturb(value: str, rng: random.Random) -> str:
+    """Altera um número mantendo o formato (casas decimais e separador)."""
+    separator = "," if "," in value else "." if "." in value else ""
+    integer, _, decimals = value.replace(",", ".").partition(".")
+    new_integer = max(1, int(int(integer) * rng.uniform(0.5, 1.5)))
+    if not separator:
+        return str(new_integer)
+    return f"{new_integer}{separator}{rng.randrange(10 ** len(decimals)):0{len(decimals)}d}"
+
+
+def as_document(name: str, content: str) -> str:
+    return f"📄 {name}:\n{content}"
+
+
+# =============================================================================
+# EMBEDDING OFFLINE
+# =============================================================================
+
+class HashingEmbeddingFunction:
+    """
+    Embedding determinístico por hashing de termos (bag-of-words com sinal),
+    para rodar sem baixar o modelo. Mede o pipeline, não a qualidade do modelo.
+    """
+
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+
+    def __call__(self, texts: List[str]) -> List[np.ndarray]:
+        from bm25 import tokenize
+
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                digest = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+                vectors[row, digest % self.dimensions] += 1.0 if digest >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return list(vectors / np.maximum(norms, 1e-12))
+
+
+def load_embedding_function(kind: str):
+    """Modelo padrão (precisa estar em cache para rodar offline) ou hashing."""
+    if kind == "hashing":
+        return HashingEmbeddingFunction()
+    try:
+        from embeddings import load_embedding_model
+        embedding_function = load_embedding_model()
+        embedding_function(["aquecimento"])
+        return embedding_function
+    except Exception as e:
+        if kind == "default":
+            raise
+        print(f"⚠️ Modelo de embeddings indisponível ({e}); usando embedding por hashing")
+        return HashingEmbeddingFunction()
+
+
+# =============================================================================
+# MÉTRICAS
+# =============================================================================
+
+def rss_mb() -> float:
+    """Pico de memória residente do processo (MB)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+def is_relevant(content: str, source: str, answer: str) -> bool:
+    """Chunk relevante: vem do documento esperado e contém o trecho da resposta."""
+    return content.startswith(f"📄 {source}") and answer in content
+
+
+def summarize(ranks: List[int], latencies_ms: List[float]) -> Dict:
+    """Recall@k, MRR (ranks começam em 1; 0 = não encontrado) e latências."""
+    result = {f"recall@{k}": sum(1 for rank in ranks if 0 < rank <= k) / len(ranks) for k in K_VALUES}
+    result["mrr"] = sum(1 / rank for rank in ranks if rank) / len(ranks)
+    result.update({
+        "p50_ms": percentile(latencies_ms, 50),
+        "p95_ms": percentile(latencies_ms, 95),
+        "p99_ms": percentile(latencies_ms, 99),
+    })
+    return result
+
+
+# =============================================================================
+# EXECUÇÃO
+# =============================================================================
+
+def ingest(db, target_chunks: int) -> Dict:
+    """
+    Indexa os exemplos e relatórios sintéticos até atingir `target_chunks` chunks.
+
+    O último lote é dimensionado pelos chunks que faltam (na média de chunks por
+    documento até ali): o corpus passa do alvo em no máximo um documento, e o
+    relatório traz o número real de chunks.
+    """
+    samples = load_samples()
+    start_time = time.perf_counter()
+    documents = 0
+
+    db.add_documents([as_document(name, content) for name, content in samples])
+    documents += len(samples)
+
+    generator = synthetic_reports(samples)
+    chunks = db.collection.count()
+    while chunks < target_chunks:
+        chunks_per_document = max(chunks / documents, 1.0)
+        size = min(INGEST_BATCH, max(1, int((target_chunks - chunks) / chunks_per_document)))
+        batch = [as_document(*next(generator)) for _ in range(size)]
+        db.add_documents(batch)
+        documents += len(batch)
+        chunks = db.collection.count()
+        print(f"   {chunks:,} chunks...", end="\r")
+
+    elapsed = time.perf_counter() - start_time
+    return {
+        "documents": documents,
+        "target_chunks": target_chunks,
+        "chunks": chunks,
+        "seconds": round(elapsed, 2),
+        "chunks_per_sec": round(chunks / elapsed, 1),
+        "rss_mb": round(rss_mb(), 1),
+    }
+
+
+def evaluate_search(db, mode: str, repeat: int, search_fn=None) -> Dict:
+    search_fn = search_fn or (lambda question: db.search(question, k=max(K_VALUES), mode=mode))
+    ranks, latencies = [], []
+    for _ in range(repeat):
+        db.result_cache.clear()  # medir a busca, não o cache de resultados
+        ranks = []
+        for question, source, answer in QUESTIONS:
+            start_time = time.perf_counter()
+            chunks = search_fn(question)
+            latencies.append((time.perf_counter() - start_time) * 1000)
+            ranks.append(next(
+                (position for position, chunk in enumerate(chunks, 1)
+                 if is_relevant(chunk["content"], source, answer)), 0
+            ))
+    return summarize(ranks, latencies)
+
+
+def evaluate_answers(answer_fn, db, repeat: int) -> Dict:
+    """Avalia um alvo que devolve texto: acerto = trecho da resposta presente (rank 1)."""
+    ranks, latencies = [], []
+    for _ in range(repeat):
+        db.result_cache.clear()
+        ranks = []
+        for question, source, answer in QUESTIONS:
+            start_time = time.perf_counter()
+            text = answer_fn(question)
+            latencies.append((time.perf_counter() - start_time) * 1000)
+            ranks.append(1 if source in text and answer in text else 0)
+    return summarize(ranks, latencies)
+
+
+class StubToolCallingLLM:
+    """LLM de teste: sempre chama o retriever com a última pergunta do usuário."""
+
+    def _respond(self, messages):
+        from langchain_core.messages import AIMessage
+        question = next(m.content for m in reversed(messages) if m.type == "human")
+        return AIMessage(content="", tool_calls=[{
+            "name": "financial_reports_retriever_tool", "args": {"query": question}, "id": f"call_{time.time_ns()}"
+        }])
+
+    def invoke(self, messages, *args, **kwargs):
+        return self._respond(messages)
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        return self._respond(messages)
+
+
+class StubGenerationLLM:
+    """LLM de teste da geração: responde com o próprio prompt (que traz o contexto recuperado)."""
+
+    def _respond(self, messages):
+        from langchain_core.messages import AIMessage
+        return AIMessage(content=messages[0].content)
+
+    def invoke(self, messages, *args, **kwargs):
+        return self._respond(messages)
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        return self._respond(messages)
+
+
+def graph_answer_fn(mode: str = "agent"):
+    """Executa o graph completo (async, com checkpointer) com o LLM substituído pelos stubs."""
+    import nodes
+    nodes.llm_with_tools = StubToolCallingLLM()
+    nodes.llm = StubGenerationLLM()
+    from graph import build_graph
+    graph = build_graph(mode)
+
+    def answer(question: str) -> str:
+        # Sem o cache de respostas: cada rodada mede o caminho completo
+        config = {"configurable": {"thread_id": f"benchmark-{time.time_ns()}", "bypass_answer_cache": True}}
+        state = asyncio.run(graph.ainvoke({"messages": question}, config))
+        return state["messages"][-1].content
+
+    return answer
+
+
+def run(args) -> Dict:
+    # Banco, índice BM25 e checkpoints isolados num diretório temporário
+    workdir = tempfile.mkdtemp(prefix="rag_benchmark_")
+    os.environ["CHROMADB_PATH"] = os.path.join(workdir, "chromadb")
+    os.environ["CHECKPOINT_DB"] = os.path.join(workdir, "checkpoints.sqlite")
+    os.environ.setdefault("OPENAI_API_KEY", "stub")  # o LLM nunca é chamado
+    if args.rerank:
+        os.environ["RERANK"] = "1"  # Desligado por padrão no aplicativo
+
+    from tools import DEFAULT_SEARCH_MODE, financial_reports_retriever_tool, get_vector_db, retrieve
+
+    db = get_vector_db()
+    db.embedding_function = load_embedding_function(args.embedding)
+    print(f"🧠 Embedding: {type(db.embedding_function).__name__}")
+
+    print(f"📥 Ingerindo até {args.chunks:,} chunks em {workdir}")
+    report = {"ingest": ingest(db, args.chunks), "targets": {}}
+    ingest_report = report["ingest"]
+    print(f"✅ {ingest_report['documents']:,} documentos, {ingest_report['chunks']:,} chunks "
+          f"(alvo {ingest_report['target_chunks']:,}) em "
+          f"{ingest_report['seconds']}s ({ingest_report['chunks_per_sec']:,} chunks/s), RSS {ingest_report['rss_mb']} MB")
+
+    targets = {f"search:{mode}": (lambda mode=mode: evaluate_search(db, mode, args.repeat))
+               for mode in ("vector", "bm25", "hybrid")}
+    if args.rerank:
+        from rerank import get_reranker
+        if get_reranker().load():
+            targets[f"rerank:{DEFAULT_SEARCH_MODE}"] = lambda: evaluate_search(
+                db, DEFAULT_SEARCH_MODE, args.repeat, lambda question: retrieve(question, k=max(K_VALUES))
+            )
+    targets["retriever_tool"] = lambda: evaluate_answers(
+        lambda question: financial_reports_retriever_tool.invoke({"query": question}), db, args.repeat
+    )
+    if not args.skip_graph:
+        targets["graph (LLM stub)"] = lambda: evaluate_answers(graph_answer_fn("agent"), db, args.repeat)
+        targets["graph fast (stub)"] = lambda: evaluate_answers(graph_answer_fn("fast"), db, args.repeat)
+
+    header = "".join(f"{'R@' + str(k):>7}" for k in K_VALUES)
+    print(f"\n{'alvo':<20}{header}{'MRR':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, evaluate in targets.items():
+        metrics = evaluate()
+        report["targets"][name] = metrics
+        recalls = "".join(f"{metrics[f'recall@{k}']:>7.2f}" for k in K_VALUES)
+        print(f"{name:<20}{recalls}{metrics['mrr']:>7.2f}"
+              f"{metrics['p50_ms']:>9.1f}{metrics['p95_ms']:>9.1f}{metrics['p99_ms']:>9.1f}")
+
+    report["rss_mb"] = round(rss_mb(), 1)
+    report["gate_target"] = f"search:{DEFAULT_SEARCH_MODE}"
+    print(f"\n💾 RSS (pico): {report['rss_mb']} MB")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline de recuperação")
+    parser.add_argument("--chunks", type=int, default=10000, help="Tamanho do corpus em chunks (10k a 1M)")
+    parser.add_argument("--repeat", type=int, default=3, help="Rodadas de perguntas por alvo (latência)")
+    parser.add_argument("--embedding", choices=("auto", "default", "hashing"), default="auto",
+                        help="auto: modelo padrão se estiver em cache, senão hashing")
+    parser.add_argument("--skip-graph", action="store_true", help="Não avaliar o graph completo")
+    parser.add_argument("--rerank", action="store_true",
+                        help="Avaliar também o reranking com cross-encoder (baixa o modelo se preciso)")
+    parser.add_argument("--json", help="Gravar o relatório completo neste arquivo")
+    parser.add_argument("--min-recall", type=float, default=None, help="Recall@3 mínimo do modo padrão")
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="p95 máximo (ms) do modo padrão")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"📝 Relatório gravado em {args.json}")
+
+    gated = report["targets"][report["gate_target"]]
+    failures = []
+    if args.min_recall is not None and gated["recall@3"] < args.min_recall:
+        failures.append(f"recall@3 {gated['recall@3']:.2f} < {args.min_recall}")
+    if args.max_p95_ms is not None and gated["p95_ms"] > args.max_p95_ms:
+        failures.append(f"p95 {gated['p95_ms']:.1f} ms > {args.max_p95_ms} ms")
+    if failures:
+        print(f"❌ Regressão em {report['gate_target']}: {'; '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
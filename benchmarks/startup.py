@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark de Inicialização
+============================
+
+Mede o tempo de cold start (processo Python novo a cada execução) dos caminhos
+de entrada do sistema: imports do app Streamlit e do grafo, o CLI de limpeza
+lendo estatísticas, o warm-up completo (banco + modelo de embeddings) e o
+warm-up seguido de consultas (o modelo carregado no warm-up é reaproveitado).
+
+Uso:
+    python -m benchmarks.startup [--runs 5] [--budget 3.0]
+
+Com --budget, termina com código 1 se a mediana de algum cenário de import
+ultrapassar o limite (em segundos), para barrar regressões.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Cenários: nome -> (código executado, entra no limite de --budget)
+SCENARIOS = {
+    "import tools": ("import tools", True),
+    "import graph": ("import graph", True),
+    "app (streamlit + graph)": ("import streamlit, graph", True),
+    "cli: estatísticas": ("from tools import get_vector_stats; get_vector_stats.invoke({})", False),
+    "warm-up completo": ("from tools import warm_up; warm_up()", False),
+    # Diferença para o warm-up = custo das consultas (o modelo não pode ser recarregado a cada uma)
+    "warm-up + 20 consultas": (
+        "from tools import get_vector_db, warm_up; warm_up(); "
+        "[get_vector_db().embed_query(f'consulta {i}') for i in range(20)]", False
+    ),
+}
+
+
+def time_scenario(code: str, runs: int) -> list:
+    """Executa o código em processos novos e retorna os tempos de parede (s)."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=PROJECT_ROOT,
+            capture_output=True,
+            text=True
+        )
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "erro desconhecido"
+            raise RuntimeError(error)
+        timings.append(elapsed)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de cold start")
+    parser.add_argument("--runs", type=int, default=5, help="Execuções por cenário")
+    parser.add_argument("--budget", type=float, default=None, help="Limite (s) para a mediana dos imports")
+    args = parser.parse_args()
+
+    baseline = statistics.median(time_scenario("pass", args.runs))
+    print(f"🐍 Interpretador vazio: {baseline * 1000:.0f} ms\n")
+    print(f"{'cenário':<28}{'mediana (ms)':>14}{'mín (ms)':>10}{'máx (ms)':>10}")
+
+    over_budget = []
+    for name, (code, gated) in SCENARIOS.items():
+        try:
+            timings = time_scenario(code, args.runs)
+        except RuntimeError as e:
+            print(f"{name:<28}{'⚠️ ' + str(e)[:60]:>34}")
+            continue
+        median = statistics.median(timings)
+        print(f"{name:<28}{median * 1000:>14.0f}{min(timings) * 1000:>10.0f}{max(timings) * 1000:>10.0f}")
+        if gated and args.budget is not None and median > args.budget:
+            over_budget.append(name)
+
+    if over_budget:
+        print(f"\n❌ Acima do limite de {args.budget:.1f}s: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
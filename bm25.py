@@ -0,0 +1,166 @@
+"""
+Índice invertido BM25 mantido ao lado da coleção do ChromaDB.
+
+Complementa a busca vetorial em consultas de termos exatos ("Coverage ratio",
+"Inadimplência 90+ dias"), é atualizado incrementalmente a cada inserção/remoção
+e persistido em disco para não ser reconstruído a cada processo.
+"""
+
+import heapq
+import math
+import os
+import pickle
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Parâmetros do Okapi BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60  # Constante do Reciprocal Rank Fusion
+
+_TOKEN = re.compile(r"\w+")
+_STOP_WORDS = {
+    'o', 'a', 'os', 'as', 'do', 'da', 'dos', 'das', 'de', 'no', 'na', 'nos', 'nas', 'em',
+    'por', 'para', 'com', 'foi', 'ser', 'qual', 'quais', 'que', 'como', 'e', 'um', 'uma', 'ao'
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Minúsculas, sem acentos, sem stop words ("Inadimplência 90+" -> ["inadimplencia", "90"])."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return [token for token in _TOKEN.findall(text) if token not in _STOP_WORDS]
+
+
+def reciprocal_rank_fusion(*rankings: List[str], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """
+    Combina rankings de IDs somando 1 / (k + posição) de cada lista.
+
+    Returns:
+        Lista (id, score) ordenada do maior para o menor score
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for position, doc_id in enumerate(ranking, 1):
+            scores[doc_id] += 1.0 / (k + position)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """
+    Índice BM25 incremental: postings termo -> {doc_id: frequência}.
+
+    Args:
+        path: Arquivo onde o índice é persistido
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+        self._lock = threading.RLock()
+        self._loaded_mtime = 0
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, documents: Iterable[Tuple[str, str]]):
+        """Indexa pares (doc_id, texto); IDs já indexados são substituídos."""
+        with self._lock:
+            for doc_id, text in documents:
+                if doc_id in self.doc_lengths:
+                    self._remove({doc_id})
+                tokens = tokenize(text)
+                for term, frequency in Counter(tokens).items():
+                    self.postings[term][doc_id] = frequency
+                self.doc_lengths[doc_id] = len(tokens)
+                self.total_length += len(tokens)
+
+    def remove(self, doc_ids: Iterable[str]):
+        with self._lock:
+            doc_ids = {doc_id for doc_id in doc_ids if doc_id in self.doc_lengths}
+            if doc_ids:
+                self._remove(doc_ids)
+
+    def _remove(self, doc_ids: set):
+        # Uma única varredura dos postings por lote de remoções (remoções são raras)
+        for term in list(self.postings):
+            docs = self.postings[term]
+            for doc_id in doc_ids.intersection(docs):
+                del docs[doc_id]
+            if not docs:
+                del self.postings[term]
+        for doc_id in doc_ids:
+            self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def clear(self):
+        with self._lock:
+            self.postings = defaultdict(dict)
+            self.doc_lengths = {}
+            self.total_length = 0
+
+    def search(self, query: str, k: int = 10, allowed: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Retorna os k documentos com maior score BM25 para a consulta.
+
+        Com `allowed`, só esses documentos são pontuados (pré-filtro por metadados);
+        as estatísticas do corpus (idf, tamanho médio) continuam as da coleção toda.
+        """
+        with self._lock:
+            total_docs = len(self.doc_lengths)
+            if not total_docs:
+                return []
+            avg_length = self.total_length / total_docs
+            scores: Dict[str, float] = defaultdict(float)
+
+            for term in set(tokenize(query)):
+                docs = self.postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (total_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                for doc_id, frequency in docs.items():
+                    if allowed is not None and doc_id not in allowed:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def save(self):
+        """Grava o índice em disco (atômico: arquivo temporário + rename)."""
+        with self._lock:
+            state = (dict(self.postings), self.doc_lengths, self.total_length)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+            self._loaded_mtime = self.path.stat().st_mtime_ns
+
+    def load(self):
+        """Carrega o índice do disco, se existir."""
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                postings, doc_lengths, total_length = pickle.load(f)
+            with self._lock:
+                self.postings = defaultdict(dict, postings)
+                self.doc_lengths = doc_lengths
+                self.total_length = total_length
+                self._loaded_mtime = self.path.stat().st_mtime_ns
+        except Exception as e:
+            print(f"⚠️ Índice BM25 ilegível, será reconstruído: {e}")
+
+    def reload_if_changed(self):
+        """Recarrega o índice se outro processo o gravou depois da última leitura."""
+        try:
+            if self.path.stat().st_mtime_ns != self._loaded_mtime:
+                self.load()
+        except OSError:
+            pass
@@ -0,0 +1,106 @@
+"""
+Caches em memória para o caminho de busca.
+
+LRUCache é um dicionário limitado por tamanho (remove o item usado há mais tempo),
+seguro para as várias sessões do Streamlit e, opcionalmente, persistido em disco.
+"""
+
+import atexit
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """
+    Cache LRU com contadores de acerto/erro.
+
+    Args:
+        maxsize: Número máximo de itens
+        path: Arquivo para persistir o cache entre execuções (opcional)
+        persist_every: Gravar em disco a cada N inserções (além da saída do processo)
+    """
+
+    def __init__(self, maxsize: int = 1024, path: Optional[str] = None, persist_every: int = 50):
+        self.maxsize = maxsize
+        self.path = Path(path) if path else None
+        self.persist_every = persist_every
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._unsaved = 0
+
+        if self.path:
+            self._load()
+            atexit.register(self.save)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            self._unsaved += 1
+            should_save = self.path is not None and self._unsaved >= self.persist_every
+        if should_save:
+            self.save()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._unsaved += 1
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        """Tamanho, acertos, erros e taxa de acerto do cache."""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+    def save(self):
+        """Grava o cache em disco (atômico: arquivo temporário + rename)."""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._unsaved:
+                return
+            items = list(self._data.items())
+            self._unsaved = 0
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(items, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ Não foi possível gravar o cache {self.path}: {e}")
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                items = pickle.load(f)
+            self._data = OrderedDict(items[-self.maxsize:])
+        except Exception as e:
+            print(f"⚠️ Cache {self.path} ilegível, ignorando: {e}")
@@ -0,0 +1,385 @@
+"""
+Checkpointer do LangGraph persistido em SQLite.
+
+Substitui o MemorySaver: o histórico de cada conversa (thread) fica em disco, não
+na RAM do processo, sobrevive a reinícios e é compartilhado entre processos
+(modo WAL: leitores não bloqueiam o escritor). Para o arquivo não crescer sem
+limite:
+
+- compactação: só os últimos CHECKPOINTS_PER_THREAD checkpoints de cada thread
+  são mantidos (cada checkpoint guarda o estado completo, então os antigos
+  são descartáveis);
+- TTL: threads sem atividade há mais de THREAD_TTL_HOURS são removidas,
+  numa varredura feita no máximo a cada EVICT_INTERVAL segundos.
+
+O graph deste projeto não usa DeltaChannel, por isso a compactação não precisa
+preservar a cadeia de checkpoints ancestrais.
+"""
+
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+# Configurações
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", "./checkpoints.sqlite")
+THREAD_TTL_HOURS = float(os.getenv("THREAD_TTL_HOURS", "24"))         # Conversas inativas são removidas
+CHECKPOINTS_PER_THREAD = int(os.getenv("CHECKPOINTS_PER_THREAD", "3"))  # Checkpoints mantidos por thread
+EVICT_INTERVAL = 600  # Intervalo mínimo entre varreduras de TTL (segundos)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS threads_last_access ON threads (last_access);
+"""
+
+
+class SQLiteCheckpointer(BaseCheckpointSaver[str]):
+    """
+    Checkpointer SQLite (WAL) com compactação e expiração de threads inativas.
+
+    Args:
+        path: Arquivo do banco SQLite
+        ttl_hours: Horas sem novos checkpoints até a thread ser removida (0 desativa)
+        keep_last: Checkpoints mantidos por thread/namespace (0 desativa a compactação)
+    """
+
+    def __init__(self, path: str = CHECKPOINT_DB, ttl_hours: float = THREAD_TTL_HOURS,
+                 keep_last: int = CHECKPOINTS_PER_THREAD):
+        super().__init__()
+        self.path = path
+        self.ttl_hours = ttl_hours
+        self.keep_last = keep_last
+        self._lock = threading.Lock()
+        self._last_eviction = 0.0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    # -------------------------------------------------------------------------
+    # Leitura
+    # -------------------------------------------------------------------------
+
+    def _tuple(self, thread_id: str, checkpoint_ns: str, row: Tuple) -> CheckpointTuple:
+        checkpoint_id, parent_checkpoint_id, type_, checkpoint, metadata_type, metadata = row
+        writes = self.conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_path, task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id)
+        ).fetchall()
+        return CheckpointTuple(
+            config=self._config(thread_id, checkpoint_ns, checkpoint_id),
+            checkpoint=self.serde.loads_typed((type_, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=(
+                self._config(thread_id, checkpoint_ns, parent_checkpoint_id) if parent_checkpoint_id else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value in writes
+            ],
+        )
+
+    @staticmethod
+    def _config(thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> RunnableConfig:
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint_id,
+            }
+        }
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Checkpoint pedido em `config` ou, sem checkpoint_id, o mais recente da thread."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        columns = "checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+
+        with self._lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self.conn.execute(
+                    f"SELECT {columns} FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id)
+                ).fetchone()
+            else:
+                row = self.conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns)
+                ).fetchone()
+            return self._tuple(thread_id, checkpoint_ns, row) if row else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """Checkpoints do mais recente para o mais antigo, com os filtros do LangGraph."""
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+            "metadata_type, metadata FROM checkpoints"
+        )
+        conditions, params = [], []
+        if config:
+            conditions.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                conditions.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                conditions.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            conditions.append("checkpoint_id < ?")
+            params.append(before_id)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+            results = []
+            for thread_id, checkpoint_ns, *row in rows:
+                if limit is not None and len(results) >= limit:
+                    break
+                if filter:
+                    metadata = self.serde.loads_typed((row[4], row[5]))
+                    if not all(metadata.get(key) == value for key, value in filter.items()):
+                        continue
+                results.append(self._tuple(thread_id, checkpoint_ns, tuple(row)))
+        yield from results
+
+    # -------------------------------------------------------------------------
+    # Escrita
+    # -------------------------------------------------------------------------
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Grava o checkpoint, compacta a thread e, periodicamente, expira threads inativas."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        type_, serialized = self.serde.dumps_typed(checkpoint)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                     type_, serialized, metadata_type, serialized_metadata)
+                )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO threads VALUES (?, ?)", (thread_id, time.time())
+                )
+                if self.keep_last > 0:
+                    self._compact(thread_id, checkpoint_ns)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+        self._maybe_evict()
+        return self._config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def _compact(self, thread_id: str, checkpoint_ns: str):
+        """Remove checkpoints (e suas escritas pendentes) além dos `keep_last` mais recentes."""
+        cutoff = self.conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep_last - 1)
+        ).fetchone()
+        if cutoff:
+            for table in ("checkpoints", "writes"):
+                self.conn.execute(
+                    f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                    (thread_id, checkpoint_ns, cutoff[0])
+                )
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Grava as escritas pendentes de uma tarefa associadas ao checkpoint."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            write_idx = WRITES_IDX_MAP.get(channel, idx)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, write_idx, channel,
+                         *self.serde.dumps_typed(value), task_path))
+
+        # Escritas especiais (erros, interrupções) substituem; as demais não sobrescrevem
+        replace = all(channel in WRITES_IDX_MAP for channel, _ in writes)
+        with self._lock:
+            self.conn.executemany(
+                f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Remove todos os checkpoints e escritas de uma thread."""
+        with self._lock:
+            self._delete_threads([thread_id])
+
+    def _delete_threads(self, thread_ids: List[str]):
+        if not thread_ids:
+            return
+        placeholders = ",".join("?" * len(thread_ids))
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in ("checkpoints", "writes", "threads"):
+                self.conn.execute(f"DELETE FROM {table} WHERE thread_id IN ({placeholders})", thread_ids)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    # -------------------------------------------------------------------------
+    # Manutenção
+    # -------------------------------------------------------------------------
+
+    def _maybe_evict(self):
+        if self.ttl_hours > 0 and time.time() - self._last_eviction >= EVICT_INTERVAL:
+            self.evict_idle_threads()
+
+    def evict_idle_threads(self, ttl_hours: Optional[float] = None) -> int:
+        """
+        Remove as threads sem novos checkpoints há mais de `ttl_hours`.
+
+        Returns:
+            Número de threads removidas
+        """
+        ttl_hours = self.ttl_hours if ttl_hours is None else ttl_hours
+        cutoff = time.time() - ttl_hours * 3600
+        with self._lock:
+            self._last_eviction = time.time()
+            expired = [row[0] for row in self.conn.execute(
+                "SELECT thread_id FROM threads WHERE last_access < ?", (cutoff,)
+            )]
+            # Lotes abaixo do limite de variáveis do SQLite
+            for start in range(0, len(expired), 500):
+                self._delete_threads(expired[start:start + 500])
+        return len(expired)
+
+    def get_stats(self) -> Dict:
+        """Threads, checkpoints e tamanho do banco de conversas."""
+        with self._lock:
+            threads = self.conn.execute("SELECT COUNT(*) FROM threads").fetchone()[0]
+            checkpoints = self.conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+        size = sum(
+            os.path.getsize(self.path + suffix)
+            for suffix in ("", "-wal") if os.path.exists(self.path + suffix)
+        )
+        return {"threads": threads, "checkpoints": checkpoints, "size_mb": round(size / 1024 / 1024, 2)}
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        # Versões em string ordenáveis (mesmo formato do MemorySaver)
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # -------------------------------------------------------------------------
+    # Async (graph.ainvoke/astream): o SQLite roda fora do event loop
+    # -------------------------------------------------------------------------
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        results = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in results:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
@@ -0,0 +1,288 @@
+"""
+Estratégias de chunking para a ingestão de documentos.
+
+Todas consomem o documento como um fluxo de partes (páginas, parágrafos) numa
+única passada, e são aplicadas igualmente a qualquer documento, pequeno ou grande:
+
+- character: janelas de N caracteres com sobreposição, cortando em quebras de linha
+- token: janelas limitadas pelo nº de tokens do tokenizer do modelo de embeddings
+- section: respeita a estrutura dos relatórios (títulos com ====, seções "TÍTULO:", bullets)
+"""
+
+import os
+import re
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+# Configurações
+CHUNKING_STRATEGY = os.getenv("CHUNKING_STRATEGY", "token")
+CHUNK_SIZE = 2000          # Tamanho base do chunk (caracteres)
+CHUNK_OVERLAP = 200        # Sobreposição entre chunks (caracteres)
+MAX_TOKENS = 256           # Janela do all-MiniLM-L6-v2
+TOKEN_OVERLAP = 32         # Sobreposição entre chunks (tokens)
+SECTION_CHUNK_SIZE = 1000  # Tamanho máximo de um chunk de seções (caracteres)
+
+_UNDERLINE = re.compile(r"^\s*(=+|-{3,})\s*$")
+_BULLET = re.compile(r"^\s*[•\-\*]\s")
+
+
+def _iter_lines(segments: Iterable[str]) -> Iterator[str]:
+    """Reconstrói linhas completas a partir de um fluxo de partes de texto."""
+    pending = ""
+    for segment in segments:
+        lines = (pending + segment).split('\n')
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+class Chunker:
+    """Interface base: `split` gera o corpo dos chunks, `chunk` adiciona o título."""
+
+    name = "base"
+
+    def split(self, segments: Iterable[str]) -> Iterator[str]:
+        raise NotImplementedError
+
+    def chunk(self, segments: Iterable[str], title: str = "") -> Iterator[str]:
+        """Gera os chunks do documento, cada um prefixado com título e número da parte."""
+        label = title or "Documento"
+        for chunk_num, body in enumerate(self.split(segments), 1):
+            yield f"{label} (Parte {chunk_num}):\n{body}"
+
+    @property
+    def signature(self) -> str:
+        """Identifica estratégia e parâmetros (mudou a assinatura, mudam os chunks)."""
+        params = ",".join(f"{k}={v}" for k, v in sorted(vars(self).items()) if not k.startswith("_"))
+        return f"{self.name}({params})"
+
+
+class CharacterChunker(Chunker):
+    """Janelas de caracteres com sobreposição, cortando preferencialmente em quebras de linha."""
+
+    name = "character"
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP):
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+
+    def split(self, segments: Iterable[str]) -> Iterator[str]:
+        chunk_size, overlap = self.chunk_size, self.overlap
+        min_break = max(chunk_size // 2, chunk_size - 200)
+        buffer = ""
+        pos = 0
+
+        for segment in segments:
+            buffer = buffer[pos:] + segment
+            pos = 0
+
+            while len(buffer) - pos > chunk_size:
+                end = pos + chunk_size
+                # Tentar quebrar em uma linha completa
+                newline = buffer.rfind('\n', pos + min_break + 1, end + 1)
+                if newline != -1:
+                    end = newline
+
+                chunk_content = buffer[pos:end].strip()
+                if chunk_content:
+                    yield chunk_content
+
+                # Próximo chunk com sobreposição
+                pos = end - overlap if end - pos > overlap else end
+
+        chunk_content = buffer[pos:].strip()
+        if chunk_content:
+            yield chunk_content
+
+
+class TokenChunker(Chunker):
+    """
+    Agrupa linhas até o limite de tokens do modelo de embeddings.
+
+    Usa o tokenizer do all-MiniLM-L6-v2 quando disponível; caso contrário
+    estima ~3 caracteres por token. O título do chunk entra na conta.
+    """
+
+    name = "token"
+
+    def __init__(self, max_tokens: int = MAX_TOKENS, overlap: int = TOKEN_OVERLAP,
+                 count_tokens: Optional[Callable[[str], int]] = None):
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+        self._tokenizer = None
+        self._count_tokens = count_tokens
+
+    def _load_tokenizer(self):
+        """Carrega o tokenizer do modelo padrão do ChromaDB (sem padding/truncation)."""
+        if self._tokenizer is None:
+            try:
+                from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+                from tokenizers import Tokenizer
+                model = ONNXMiniLM_L6_V2()
+                model._download_model_if_not_exists()
+                self._tokenizer = Tokenizer.from_file(
+                    os.path.join(model.DOWNLOAD_PATH, model.EXTRACTED_FOLDER_NAME, "tokenizer.json")
+                )
+            except Exception as e:
+                print(f"⚠️ Tokenizer indisponível, estimando tokens por caracteres: {e}")
+                self._tokenizer = False
+        return self._tokenizer
+
+    def count_tokens(self, text: str) -> int:
+        if self._count_tokens:
+            return self._count_tokens(text)
+        tokenizer = self._load_tokenizer()
+        if tokenizer:
+            return len(tokenizer.encode(text, add_special_tokens=False).ids)
+        return max(1, len(text) // 3)
+
+    def _split_long_line(self, line: str, budget: int) -> Iterator[Tuple[str, int]]:
+        """Divide uma linha maior que a janela em pedaços que cabem nela."""
+        tokenizer = self._load_tokenizer()
+        if tokenizer and not self._count_tokens:
+            encoding = tokenizer.encode(line, add_special_tokens=False)
+            offsets = encoding.offsets
+            for start in range(0, len(offsets), budget):
+                end = min(start + budget, len(offsets)) - 1
+                yield line[offsets[start][0]:offsets[end][1]], end - start + 1
+        else:
+            step = budget * 3
+            for start in range(0, len(line), step):
+                piece = line[start:start + step]
+                yield piece, self.count_tokens(piece)
+
+    def chunk(self, segments: Iterable[str], title: str = "") -> Iterator[str]:
+        # Reservar espaço para o cabeçalho "título (Parte N):"
+        label = title or "Documento"
+        budget = self.max_tokens - 2 - self.count_tokens(f"{label} (Parte 999):")
+        for chunk_num, body in enumerate(self._split(segments, max(16, budget)), 1):
+            yield f"{label} (Parte {chunk_num}):\n{body}"
+
+    def split(self, segments: Iterable[str]) -> Iterator[str]:
+        return self._split(segments, self.max_tokens - 2)  # [CLS] e [SEP]
+
+    def _split(self, segments: Iterable[str], budget: int) -> Iterator[str]:
+        window: List[Tuple[str, int]] = []
+        total = 0
+
+        for line in _iter_lines(segments):
+            line = line.strip()
+            if not line:
+                continue
+            tokens = self.count_tokens(line) + 1  # +1 pela quebra de linha
+            pieces = self._split_long_line(line, budget) if tokens > budget else [(line, tokens)]
+
+            for piece, piece_tokens in pieces:
+                if total + piece_tokens > budget and window:
+                    yield "\n".join(text for text, _ in window)
+
+                    # Manter as últimas linhas como sobreposição
+                    kept, kept_total = [], 0
+                    for text, count in reversed(window):
+                        if kept_total + count > self.overlap:
+                            break
+                        kept.append((text, count))
+                        kept_total += count
+                    window, total = kept[::-1], kept_total
+                    while window and total + piece_tokens > budget:
+                        total -= window.pop(0)[1]
+
+                window.append((piece, piece_tokens))
+                total += piece_tokens
+
+        if window:
+            yield "\n".join(text for text, _ in window)
+
+
+class SectionChunker(Chunker):
+    """
+    Chunking guiado pela estrutura dos relatórios em `documentos_exemplo/`.
+
+    Uma seção começa num título sublinhado por ==== ou numa linha curta terminada
+    em ':' ("PRINCIPAIS INDICADORES:", "Atacado:"). Seções pequenas consecutivas são
+    agrupadas até `chunk_size`; seções maiores são divididas entre bullets,
+    repetindo o título em cada parte.
+    """
+
+    name = "section"
+
+    def __init__(self, chunk_size: int = SECTION_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def _is_heading(line: str) -> bool:
+        return (
+            line.endswith(':')
+            and not _BULLET.match(line)
+            and (line.isupper() or len(line.split()) <= 5)
+        )
+
+    def _iter_sections(self, segments: Iterable[str]) -> Iterator[List[str]]:
+        section: List[str] = []
+        for line in _iter_lines(segments):
+            stripped = line.strip()
+            if not stripped:
+                continue
+            if _UNDERLINE.match(stripped):
+                # O título sublinhado abre uma nova seção
+                heading = section.pop() if section else ""
+                if section:
+                    yield section
+                section = [heading] if heading else []
+            elif self._is_heading(stripped):
+                if section:
+                    yield section
+                section = [stripped]
+            else:
+                section.append(stripped)
+        if section:
+            yield section
+
+    def split(self, segments: Iterable[str]) -> Iterator[str]:
+        chunk: List[str] = []
+        size = 0
+
+        for section in self._iter_sections(segments):
+            section_size = sum(len(line) + 1 for line in section)
+
+            if size + section_size > self.chunk_size and chunk:
+                yield "\n".join(chunk)
+                chunk, size = [], 0
+
+            if section_size <= self.chunk_size:
+                chunk.extend(section)
+                size += section_size
+                continue
+
+            # Seção maior que o chunk: dividir entre linhas, repetindo o título
+            heading = section[0] if self._is_heading(section[0]) else ""
+            for line in section:
+                if size + len(line) + 1 > self.chunk_size and chunk:
+                    yield "\n".join(chunk)
+                    chunk = [heading] if heading and line != heading else []
+                    size = len(heading) + 1 if chunk else 0
+                chunk.append(line)
+                size += len(line) + 1
+
+        if chunk:
+            yield "\n".join(chunk)
+
+
+CHUNKERS = {
+    CharacterChunker.name: CharacterChunker,
+    TokenChunker.name: TokenChunker,
+    SectionChunker.name: SectionChunker,
+}
+
+
+def get_chunker(strategy: str = CHUNKING_STRATEGY, **kwargs) -> Chunker:
+    """
+    Cria o chunker da estratégia pedida.
+
+    Args:
+        strategy: "character", "token" ou "section"
+        **kwargs: Parâmetros da estratégia (ex: chunk_size, max_tokens)
+    """
+    if strategy not in CHUNKERS:
+        raise ValueError(f"Estratégia de chunking desconhecida: {strategy} (opções: {', '.join(CHUNKERS)})")
+    return CHUNKERS[strategy](**kwargs)
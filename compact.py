@@ -0,0 +1,320 @@
+"""
+Armazenamento compacto dos embeddings: int8 em arquivos memory-mapped, com re-score exato.
+
+Com milhões de chunks, os vetores float32 do índice HNSW (384 dimensões, 1,5 KB
+por chunk) dominam disco e RAM. Este armazenamento guarda, ao lado do ChromaDB:
+
+- codes.i8: cada embedding quantizado em int8 por dimensão (escala calibrada
+  nos primeiros CALIBRATION_ROWS vetores), 4x menor que float32;
+- vectors.f32: os embeddings originais, lidos só para re-pontuar candidatos;
+- norms.f32, ids.s64, alive.u1: norma, id e marca de remoção de cada linha.
+
+A busca percorre só os códigos int8 (em blocos, via memmap: a memória usada é a
+do bloco, não a da coleção), separa os COMPACT_CANDIDATES melhores e recalcula
+a distância exata deles com os vetores float32, na mesma métrica do ChromaDB.
+
+Ativado com COMPACT_VECTORS=1 (o SimpleVectorDB passa a gravar aqui também e a
+usar este armazenamento na busca vetorial). Para montar a partir de uma coleção
+já existente (ou recalibrar a escala):
+
+    python compact.py
+"""
+
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+# Configurações
+COMPACT_VECTORS = os.getenv("COMPACT_VECTORS", "0") == "1"
+COMPACT_CANDIDATES = int(os.getenv("COMPACT_CANDIDATES", "100"))  # Candidatos re-pontuados em float32
+COMPACT_DIR = "compact_vectors"  # Pasta dentro de CHROMADB_PATH
+BLOCK_ROWS = 32768               # Linhas de int8 convertidas por vez na primeira passada
+CALIBRATION_MARGIN = 1.25        # Folga sobre o maior valor visto por dimensão na calibração
+CALIBRATION_ROWS = 2048          # Até aqui a escala é recalculada (e os códigos refeitos) a cada gravação
+ID_DTYPE = "S64"                 # Ids de até 64 bytes
+
+_FILES = {"codes": ("codes.i8", np.int8), "vectors": ("vectors.f32", np.float32),
+          "norms": ("norms.f32", np.float32), "ids": ("ids.s64", ID_DTYPE), "alive": ("alive.u1", np.uint8)}
+
+
+class CompactVectorStore:
+    """
+    Embeddings em int8 (primeira passada) + float32 (re-score), em arquivos memory-mapped.
+
+    Args:
+        directory: Pasta dos arquivos
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._maps: Optional[Dict[str, np.ndarray]] = None
+        self._meta: Optional[Dict] = None
+        meta_path = self.directory / "meta.json"
+        if meta_path.exists():
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                self._meta = json.load(f)
+        self.scale = np.asarray(self._meta["scale"], dtype=np.float32) if self._meta else None
+
+    def _path(self, name: str) -> Path:
+        return self.directory / _FILES[name][0]
+
+    def _rows(self) -> int:
+        if not self._meta or not self._path("codes").exists():
+            return 0
+        # Arquivos gravados em sequência: vale o menor (uma gravação interrompida não conta)
+        counts = [self._path("codes").stat().st_size // self._meta["dim"]]
+        for name in ("vectors", "norms", "ids", "alive"):
+            path = self._path(name)
+            item = np.dtype(_FILES[name][1]).itemsize * (self._meta["dim"] if name == "vectors" else 1)
+            counts.append(path.stat().st_size // item if path.exists() else 0)
+        return min(counts)
+
+    def _open(self) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Memmaps dos arquivos (reabertos após cada gravação) e a escala dos códigos.
+
+        Quem já tem os memmaps continua com os códigos e a escala de quando os
+        abriu: a recalibração troca codes.i8 por um arquivo novo, não o reescreve.
+        """
+        with self._lock:
+            if self._maps is None:
+                rows = self._rows()
+                if rows == 0:
+                    return None
+                dim = self._meta["dim"]
+                self._maps = {
+                    name: np.memmap(
+                        self._path(name), dtype=dtype, mode="r+" if name == "alive" else "r",
+                        shape=(rows, dim) if name in ("codes", "vectors") else (rows,)
+                    )
+                    for name, (_, dtype) in _FILES.items()
+                }
+                self._maps["scale"] = self.scale
+            return self._maps
+
+    def _save_meta(self):
+        tmp_path = self.directory / "meta.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._meta, f)
+        os.replace(tmp_path, self.directory / "meta.json")
+
+    @staticmethod
+    def _calibration_scale(sample: np.ndarray) -> np.ndarray:
+        sample = np.asarray(sample, dtype=np.float32)
+        return (np.maximum(np.abs(sample).max(axis=0), 1e-6) * CALIBRATION_MARGIN / 127).astype(np.float32)
+
+    def _set_scale(self, scale: np.ndarray):
+        self._meta = {"dim": int(len(scale)), "scale": scale.tolist(), "clipped": 0}
+        self.scale = scale
+        self._save_meta()
+
+    def calibrate(self, sample: np.ndarray):
+        """Define a escala int8 de cada dimensão a partir de uma amostra de embeddings."""
+        with self._lock:
+            self._maps = None
+            self._set_scale(self._calibration_scale(sample))
+
+    def quantize(self, vectors: np.ndarray, scale: Optional[np.ndarray] = None) -> Tuple[np.ndarray, int]:
+        """Códigos int8 dos vetores e quantos valores passaram da escala (saturados em ±127)."""
+        scaled = np.rint(vectors / (self.scale if scale is None else scale))
+        clipped = int(np.count_nonzero(np.abs(scaled) > 127))
+        return np.clip(scaled, -127, 127).astype(np.int8), clipped
+
+    def add(self, ids: Sequence[str], embeddings):
+        """Acrescenta vetores (enquanto houver menos de CALIBRATION_ROWS, a escala é recalibrada)."""
+        if not len(ids):
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        encoded_ids = np.array([doc_id.encode("utf-8") for doc_id in ids])
+        if encoded_ids.dtype.itemsize > np.dtype(ID_DTYPE).itemsize:
+            raise ValueError(f"Ids com mais de {np.dtype(ID_DTYPE).itemsize} bytes não são suportados")
+
+        with self._lock:
+            self._maps = None
+            rows = self._rows()
+            if self._meta is not None:
+                self._truncate(rows)
+            if rows < CALIBRATION_ROWS:
+                self._recalibrate(vectors, rows)
+            codes, clipped = self.quantize(vectors)
+            columns = {
+                "codes": codes,
+                "vectors": vectors,
+                "norms": np.linalg.norm(vectors, axis=1).astype(np.float32),
+                "ids": encoded_ids.astype(ID_DTYPE),
+                "alive": np.ones(len(ids), dtype=np.uint8),
+            }
+            for name, values in columns.items():
+                with open(self._path(name), "ab") as f:
+                    f.write(np.ascontiguousarray(values).tobytes())
+            if clipped:
+                self._meta["clipped"] += clipped
+                self._save_meta()
+
+    def _recalibrate(self, vectors: np.ndarray, rows: int):
+        """
+        Recalcula a escala com os vetores já gravados + os novos e refaz os códigos gravados.
+
+        Chamado com o lock. Os códigos novos são gravados num arquivo temporário que
+        substitui codes.i8 (os memmaps abertos antes seguem no arquivo antigo) e só
+        então a escala nova é publicada, junto com eles.
+        """
+        dim = vectors.shape[1]
+        existing = np.fromfile(self._path("vectors"), dtype=np.float32, count=rows * dim).reshape(rows, dim) \
+            if rows else np.empty((0, dim), dtype=np.float32)
+        scale = self._calibration_scale(np.vstack([existing, vectors]))
+        if rows:
+            codes, _ = self.quantize(existing, scale)
+            tmp_path = self.directory / "codes.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(codes.tobytes())
+            os.replace(tmp_path, self._path("codes"))
+        self._set_scale(scale)
+
+    def _truncate(self, rows: int):
+        """Descarta linhas de uma gravação interrompida (arquivos com tamanhos diferentes)."""
+        for name, (_, dtype) in _FILES.items():
+            path = self._path(name)
+            if path.exists():
+                item = np.dtype(dtype).itemsize * (self._meta["dim"] if name in ("codes", "vectors") else 1)
+                if path.stat().st_size != rows * item:
+                    os.truncate(path, rows * item)
+
+    def _mask(self, ids_map: np.ndarray, ids: Set[str]) -> np.ndarray:
+        wanted = np.array([doc_id.encode("utf-8") for doc_id in ids], dtype=ID_DTYPE)
+        return np.isin(ids_map, wanted)
+
+    def remove(self, ids: Sequence[str]):
+        """Marca as linhas desses ids como removidas (o espaço é recuperado ao reconstruir)."""
+        maps = self._open()
+        if maps is None or not len(ids):
+            return
+        with self._lock:
+            rows = np.flatnonzero(self._mask(maps["ids"], set(ids)))
+            if len(rows):
+                maps["alive"][rows] = 0
+                maps["alive"].flush()
+
+    def clear(self):
+        with self._lock:
+            self._maps = None
+            self._meta = None
+            self.scale = None
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    def __len__(self) -> int:
+        """Vetores ativos (não removidos)."""
+        maps = self._open()
+        return int(np.count_nonzero(maps["alive"])) if maps is not None else 0
+
+    def search(self, query, k: int, space: str = "l2", candidates: int = COMPACT_CANDIDATES,
+               allowed: Optional[Set[str]] = None, rescore: bool = True) -> List[Tuple[str, float]]:
+        """
+        Os k vizinhos mais próximos: primeira passada em int8, re-score exato em float32.
+
+        Args:
+            query: Embedding da consulta
+            k: Resultados devolvidos
+            space: Métrica do ChromaDB ("l2" ao quadrado, "cosine" ou "ip"), para distâncias comparáveis
+            candidates: Candidatos da primeira passada re-pontuados com os vetores originais
+            allowed: Só estes ids (pré-filtro de metadados)
+            rescore: False devolve a ordem e as distâncias aproximadas da primeira passada
+
+        Returns:
+            [(id, distância)] em ordem crescente de distância
+        """
+        maps = self._open()
+        if maps is None:
+            return []
+        query = np.asarray(query, dtype=np.float32).ravel()
+        query_norm = max(float(np.linalg.norm(query)), 1e-12)
+        # A escala de dequantização vai para a consulta: codes @ (q * escala) ~ x · q
+        scaled_query = query * maps["scale"]
+        codes, norms, alive = maps["codes"], maps["norms"], maps["alive"]
+        mask = alive.astype(bool)
+        if allowed is not None:
+            mask &= self._mask(maps["ids"], allowed)
+        pool = max(k, candidates)
+
+        best_rows, best_scores = [], []
+        for start in range(0, len(codes), BLOCK_ROWS):
+            block_mask = mask[start:start + BLOCK_ROWS]
+            if not block_mask.any():
+                continue
+            dots = codes[start:start + BLOCK_ROWS].astype(np.float32) @ scaled_query
+            block_norms = norms[start:start + BLOCK_ROWS]
+            # Menor = melhor, na mesma ordem da distância do ChromaDB
+            if space == "l2":
+                scores = block_norms ** 2 - 2 * dots + query_norm ** 2
+            elif space == "cosine":
+                scores = 1 - dots / (np.maximum(block_norms, 1e-12) * query_norm)
+            else:
+                scores = 1 - dots
+            rows = np.flatnonzero(block_mask)
+            scores = scores[rows]
+            if len(rows) > pool:
+                top = np.argpartition(scores, pool - 1)[:pool]
+                rows, scores = rows[top], scores[top]
+            best_rows.append(rows + start)
+            best_scores.append(scores)
+
+        if not best_rows:
+            return []
+        rows = np.concatenate(best_rows)
+        scores = np.concatenate(best_scores)
+        if len(rows) > pool:
+            top = np.argpartition(scores, pool - 1)[:pool]
+            rows, scores = rows[top], scores[top]
+
+        if rescore:
+            rows = np.sort(rows)  # Leitura sequencial do memmap
+            vectors = np.asarray(maps["vectors"][rows])
+            if space == "l2":
+                scores = np.sum((vectors - query) ** 2, axis=1)
+            elif space == "cosine":
+                scores = 1 - vectors @ query / (np.maximum(np.linalg.norm(vectors, axis=1), 1e-12) * query_norm)
+            else:
+                scores = 1 - vectors @ query
+
+        order = np.argsort(scores, kind="stable")[:k]
+        return [(maps["ids"][rows[i]].decode("utf-8"), float(scores[i])) for i in order]
+
+    def get_stats(self) -> Dict:
+        """Linhas, vetores ativos, tamanho dos arquivos e valores saturados na quantização."""
+        files = {
+            name: self._path(name).stat().st_size if self._path(name).exists() else 0
+            for name in _FILES
+        }
+        first_pass = files["codes"] + files["norms"] + files["alive"]
+        return {
+            "rows": self._rows(),
+            "alive": len(self),
+            "dim": self._meta["dim"] if self._meta else None,
+            "first_pass_mb": round(first_pass / 1024 / 1024, 2),
+            "total_mb": round(sum(files.values()) / 1024 / 1024, 2),
+            "clipped_values": self._meta["clipped"] if self._meta else 0,
+        }
+
+
+if __name__ == "__main__":
+    from tools import get_vector_db
+
+    print("🗜️ Armazenamento compacto de embeddings")
+    result = get_vector_db().build_compact_store()
+    if result["status"] == "info":
+        print(f"   ℹ️ {result['message']}: nada a compactar")
+        raise SystemExit(0)
+    if result["status"] != "success":
+        print(f"   ❌ {result['message']}")
+        raise SystemExit(1)
+    print(f"   ✅ {result['message']} em {result['seconds']}s: {result['stats']}")
+    if not COMPACT_VECTORS:
+        print("   ℹ️ Defina COMPACT_VECTORS=1 para o aplicativo usar (e manter atualizado) este armazenamento")
@@ -0,0 +1,116 @@
+"""
+Pipeline de embeddings em lote para ingestão em massa.
+
+Distribui os chunks em lotes por um pool de processos (uma sessão ONNX por worker)
+e devolve os embeddings à medida que ficam prontos, mantendo apenas um número
+limitado de lotes em memória.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# Configurações
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", str(os.cpu_count() or 1)))
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "512"))
+
+# Embedding function do processo worker (criada uma vez por processo)
+_worker_embedding_function = None
+
+
+def load_embedding_model(intra_op_threads: Optional[int] = None):
+    """
+    Modelo all-MiniLM-L6-v2 (ONNX) com sessão e tokenizer já carregados.
+
+    O DefaultEmbeddingFunction do chromadb 1.x cria um ONNXMiniLM_L6_V2 novo a
+    cada chamada, recarregando o modelo; a instância devolvida aqui mantém a
+    sessão ONNX e deve ser reutilizada.
+
+    Args:
+        intra_op_threads: Limite de threads da sessão (padrão: as do onnxruntime)
+    """
+    from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+
+    model = ONNXMiniLM_L6_V2()
+    model._download_model_if_not_exists()
+    if intra_op_threads:
+        options = model.ort.SessionOptions()
+        options.log_severity_level = 3
+        options.intra_op_num_threads = intra_op_threads
+        options.graph_optimization_level = model.ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        model_path = os.path.join(model.DOWNLOAD_PATH, model.EXTRACTED_FOLDER_NAME, "model.onnx")
+        # `model` é uma cached_property: a sessão gravada no __dict__ é a usada nas chamadas
+        model.__dict__["model"] = model.ort.InferenceSession(
+            model_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+    else:
+        model.model
+    model.tokenizer
+    return model
+
+
+def _init_worker(intra_op_threads: int):
+    """Carrega o modelo ONNX no worker, limitando as threads por sessão."""
+    global _worker_embedding_function
+    # Sem limite, cada sessão ONNX usaria todos os núcleos e os workers competiriam entre si
+    _worker_embedding_function = load_embedding_model(intra_op_threads)
+
+
+def _embed_batch(texts: List[str]):
+    """Gera os embeddings de um lote dentro do worker."""
+    return _worker_embedding_function(texts)
+
+
+def iter_batches(pairs: Iterable[Tuple[str, str]], batch_size: int) -> Iterator[Tuple[List[str], List[str]]]:
+    """Agrupa um fluxo de pares (id, texto) em lotes de tamanho fixo."""
+    iterator = iter(pairs)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        ids, texts = zip(*batch)
+        yield list(ids), list(texts)
+
+
+def embed_batches(
+    batches: Iterable[Tuple[List[str], List[str]]],
+    workers: int = EMBED_WORKERS
+) -> Iterator[Tuple[List[str], List[str], list]]:
+    """
+    Embeda lotes de chunks em paralelo num pool de processos.
+
+    Args:
+        batches: Iterável de lotes (ids, textos)
+        workers: Número de processos worker
+
+    Returns:
+        Iterador de (ids, textos, embeddings), na ordem em que os lotes terminam
+    """
+    workers = max(1, workers)
+    intra_op_threads = max(1, (os.cpu_count() or 1) // workers)
+    max_in_flight = workers * 2
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(intra_op_threads,)
+    ) as pool:
+        pending = {}
+        for batch_ids, batch_texts in batches:
+            # Limitar lotes em memória: esperar algum terminar antes de enviar mais
+            if len(pending) >= max_in_flight:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    done_ids, done_texts = pending.pop(future)
+                    yield done_ids, done_texts, future.result()
+            pending[pool.submit(_embed_batch, batch_texts)] = (batch_ids, batch_texts)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                done_ids, done_texts = pending.pop(future)
+                yield done_ids, done_texts, future.result()
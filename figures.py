@@ -0,0 +1,324 @@
+"""
+Tabela de números financeiros extraída dos relatórios na ingestão.
+
+Os relatórios trazem os indicadores em linhas regulares:
+
+    • Lucro líquido recorrente: R$ 7.891 milhões (+12,1% aa)
+    • ROE ajustado: 19,2%
+    • Patrimônio Líquido: R$ 164.5 bilhões
+
+Cada linha vira um registro (instituição, período, métrica, valor, unidade,
+variação) numa tabela SQLite ao lado do ChromaDB, e a ferramenta de números do
+agente responde consultas exatas e comparações entre instituições com uma
+consulta SQL, sem busca vetorial nem contexto longo.
+
+Valores em reais são normalizados para R$ milhões (bilhões x 1000, mil / 1000),
+para que métricas de relatórios diferentes sejam comparáveis.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+FIGURES_VERSION = 1  # Mudou a extração, os arquivos são reprocessados na próxima ingestão
+FIGURES_LIMIT = 20   # Linhas devolvidas por instituição em cada consulta
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS figures (
+    source TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    bank TEXT,
+    year INTEGER,
+    quarter INTEGER,
+    section TEXT,
+    metric TEXT NOT NULL,
+    metric_key TEXT NOT NULL,
+    value REAL NOT NULL,
+    unit TEXT NOT NULL,
+    value_text TEXT NOT NULL,
+    change REAL,
+    change_unit TEXT,
+    change_basis TEXT,
+    PRIMARY KEY (source, position)
+);
+CREATE INDEX IF NOT EXISTS figures_metric ON figures (metric_key);
+CREATE INDEX IF NOT EXISTS figures_bank ON figures (bank, year, quarter);
+"""
+
+_COLUMNS = ("source", "position", "bank", "year", "quarter", "section", "metric", "metric_key",
+            "value", "unit", "value_text", "change", "change_unit", "change_basis")
+
+_NUMBER = r"\d+(?:[.,]\d+)*"
+_FIGURE_LINE = re.compile(r"^\s*[•\-*]\s*(?P<metric>[^:]{2,80}?)\s*:\s*(?P<value>.+?)\s*$")
+_CURRENCY = re.compile(rf"R\$\s*(?P<number>{_NUMBER})\s*(?P<scale>milh(?:ões|ão)|bilh(?:ões|ão)|mil\b)?", re.I)
+_PERCENT = re.compile(rf"(?P<number>{_NUMBER})\s*%")
+_COUNT = re.compile(rf"(?P<number>{_NUMBER})\s*(?P<scale>milh(?:ões|ão)|bilh(?:ões|ão)|mil\b)", re.I)
+_CHANGE = re.compile(rf"\((?P<before>[^()]*?)(?P<sign>[+\-−]?)\s*(?P<number>{_NUMBER})\s*(?P<unit>%|p\.\s?p\.)(?P<after>[^()]*)\)")
+_PARENTHESES = re.compile(r"\([^()]*\)")
+_HEADING = re.compile(r"^\s*(?P<title>[^•\-*=:][^:]{1,78}):\s*$")
+_NON_WORD = re.compile(r"[\W_]+")
+
+# Escala de cada unidade para R$ milhões (ou milhões, em contagens)
+_SCALES = {"mil": 0.001, "milhao": 1.0, "milhoes": 1.0, "bilhao": 1000.0, "bilhoes": 1000.0}
+_STOP_WORDS = {"o", "a", "os", "as", "de", "do", "da", "dos", "das", "e", "em", "no", "na", "qual", "quanto"}
+
+
+def _fold(text: str) -> str:
+    """Minúsculas e sem acentos."""
+    normalized = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in normalized if not unicodedata.combining(char))
+
+
+def metric_key(metric: str) -> str:
+    """Forma normalizada do nome da métrica ("Lucro líquido" -> "lucro liquido")."""
+    return _NON_WORD.sub(" ", _fold(metric)).strip()
+
+
+def parse_number(text: str) -> float:
+    """
+    Número no formato dos relatórios: "7.891" (milhar), "164.5" e "19,2" (decimais).
+
+    Ponto seguido de exatamente três dígitos é separador de milhar; vírgula é decimal.
+    """
+    if "," in text:
+        return float(text.replace(".", "").replace(",", "."))
+    if re.fullmatch(r"\d{1,3}(?:\.\d{3})+", text):
+        return float(text.replace(".", ""))
+    return float(text)
+
+
+def parse_figure_line(line: str) -> Optional[Dict]:
+    """
+    Registro de uma linha "• Métrica: valor (variação)", ou None se a linha não tem valor numérico.
+
+    Returns:
+        {"metric", "value", "unit", "value_text", "change", "change_unit", "change_basis"}
+    """
+    match = _FIGURE_LINE.match(line)
+    if not match:
+        return None
+    metric, value_part = match.group("metric"), match.group("value")
+    main = _PARENTHESES.sub("", value_part)
+
+    figure = None
+    currency = _CURRENCY.search(main)
+    percent = _PERCENT.search(main)
+    count = _COUNT.search(main)
+    if currency:
+        scale = currency.group("scale")
+        if scale:
+            figure = (currency, parse_number(currency.group("number")) * _SCALES[_fold(scale)], "R$ milhões")
+        else:
+            per_share = "por ação" in main[currency.end():].lower()
+            figure = (currency, parse_number(currency.group("number")), "R$/ação" if per_share else "R$")
+    elif percent:
+        figure = (percent, parse_number(percent.group("number")), "%")
+    elif count:
+        figure = (count, parse_number(count.group("number")) * _SCALES[_fold(count.group("scale"))], "milhões")
+    if figure is None:
+        return None
+    value_match, value, unit = figure
+
+    # Texto antes do valor qualifica a métrica ("Banco de Varejo: Lucro de R$ 3.240 milhões")
+    qualifier = re.sub(r"\s+de$", "", main[:value_match.start()].strip(), flags=re.I)
+    if qualifier:
+        metric = f"{metric} - {qualifier}"
+
+    record = {
+        "metric": metric.strip(),
+        "value": value,
+        "unit": unit,
+        "value_text": value_part.strip(),
+        "change": None,
+        "change_unit": None,
+        "change_basis": None,
+    }
+    change = _CHANGE.search(value_part)
+    if change:
+        sign = -1.0 if change.group("sign") in ("-", "−") else 1.0
+        record["change"] = sign * parse_number(change.group("number"))
+        record["change_unit"] = "p.p." if change.group("unit").startswith("p") else "%"
+        record["change_basis"] = " ".join(
+            part.strip() for part in (change.group("before"), change.group("after")) if part.strip()
+        ) or None
+    return record
+
+
+class FigureExtractor:
+    """
+    Extrai os números de um documento enquanto ele é lido (em fluxo, junto do chunker).
+
+    Uso:
+        extractor = FigureExtractor()
+        for segment in extractor.scan(iter_file_content(path)):
+            ...
+        extractor.figures  # registros na ordem do documento, com a seção de cada um
+    """
+
+    def __init__(self):
+        self.figures: List[Dict] = []
+        self._section: Optional[str] = None
+        self._partial = ""
+
+    def _feed_line(self, line: str):
+        heading = _HEADING.match(line)
+        if heading:
+            self._section = heading.group("title").strip()
+            return
+        figure = parse_figure_line(line)
+        if figure:
+            figure["section"] = self._section
+            figure["position"] = len(self.figures)
+            self.figures.append(figure)
+
+    def scan(self, segments: Iterable[str]) -> Iterator[str]:
+        """Repassa os segmentos sem alterá-los, processando as linhas completas."""
+        for segment in segments:
+            lines = (self._partial + segment).split("\n")
+            self._partial = lines.pop()
+            for line in lines:
+                self._feed_line(line)
+            yield segment
+        if self._partial:
+            self._feed_line(self._partial)
+            self._partial = ""
+
+
+class FiguresTable:
+    """
+    Números dos relatórios em SQLite (WAL), um conjunto de linhas por arquivo.
+
+    Args:
+        path: Arquivo do banco SQLite
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def replace(self, source: str, document: Dict, figures: Sequence[Dict]):
+        """Substitui os números de um arquivo (document: instituição e período do arquivo)."""
+        rows = [
+            (
+                source, figure["position"], document.get("bank"), document.get("year"), document.get("quarter"),
+                figure["section"], figure["metric"], metric_key(figure["metric"]), figure["value"], figure["unit"],
+                figure["value_text"], figure["change"], figure["change_unit"], figure["change_basis"]
+            )
+            for figure in figures
+        ]
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute("DELETE FROM figures WHERE source = ?", (source,))
+                self.conn.executemany(
+                    f"INSERT INTO figures ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})", rows
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def sources(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self.conn.execute("SELECT DISTINCT source FROM figures")]
+
+    def delete_sources(self, sources: Iterable[str]):
+        with self._lock:
+            self.conn.executemany("DELETE FROM figures WHERE source = ?", [(source,) for source in sources])
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM figures")
+
+    def lookup(self, metric: str, bank: Optional[str] = None, year: Optional[int] = None,
+               quarter: Optional[int] = None, limit: int = FIGURES_LIMIT) -> List[Dict]:
+        """
+        Números cuja métrica contém todas as palavras de `metric` (sem acentos).
+
+        Dentro de cada instituição/período, as métricas que aparecem primeiro no
+        relatório (os indicadores principais) vêm antes das de seções detalhadas.
+        O limite vale por instituição, para que uma comparação entre bancos não
+        fique só com o primeiro em ordem alfabética.
+        """
+        words = [word for word in metric_key(metric).split() if word not in _STOP_WORDS]
+        if not words:
+            return []
+        conditions = ["metric_key LIKE ?"] * len(words)
+        params: List = [f"%{word}%" for word in words]
+        for column, value in (("bank", bank), ("year", year), ("quarter", quarter)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        columns = ', '.join(_COLUMNS)
+        query = (
+            f"SELECT {columns} FROM ("
+            f"SELECT {columns}, ROW_NUMBER() OVER ("
+            "PARTITION BY bank ORDER BY year DESC, quarter DESC, position) AS bank_row "
+            f"FROM figures WHERE {' AND '.join(conditions)}"
+            ") WHERE bank_row <= ? ORDER BY bank, year DESC, quarter DESC, position"
+        )
+        with self._lock:
+            rows = self.conn.execute(query, [*params, limit]).fetchall()
+        return [dict(zip(_COLUMNS, row)) for row in rows]
+
+    def get_stats(self) -> Dict:
+        """Registros, arquivos e instituições na tabela."""
+        with self._lock:
+            figures, sources, banks = self.conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT source), COUNT(DISTINCT bank) FROM figures"
+            ).fetchone()
+        return {"figures": figures, "sources": sources, "banks": banks}
+
+
+def _period(figure: Dict) -> str:
+    if figure["quarter"]:
+        return f"{figure['quarter']}T{figure['year']}"
+    return str(figure["year"] or "-")
+
+
+def format_figures(metric: str, figures: List[Dict]) -> str:
+    """
+    Tabela markdown dos números encontrados.
+
+    Havendo mais de uma instituição, acrescenta a comparação entre a primeira
+    métrica encontrada de cada instituição/período (mesma unidade).
+    """
+    if not figures:
+        return (f"**❌ Nenhum número encontrado para:** \"{metric}\"\n\n"
+                "Use financial_reports_retriever_tool para buscar no texto dos relatórios.")
+
+    lines = [
+        f"**📊 Números encontrados para \"{metric}\":**",
+        "",
+        "| Instituição | Período | Métrica | Valor | Seção | Arquivo |",
+        "|---|---|---|---|---|---|",
+    ]
+    for figure in figures:
+        lines.append(
+            f"| {figure['bank'] or '-'} | {_period(figure)} | {figure['metric']} | {figure['value_text']} "
+            f"| {figure['section'] or '-'} | {figure['source']} |"
+        )
+
+    # Indicador principal de cada instituição/período: o primeiro do relatório
+    headline: Dict = {}
+    for figure in figures:
+        headline.setdefault((figure["bank"], figure["year"], figure["quarter"]), figure)
+    units = {figure["unit"] for figure in headline.values()}
+    if len({bank for bank, _, _ in headline}) > 1 and len(units) == 1:
+        unit = units.pop()
+        ranking = sorted(headline.values(), key=lambda figure: figure["value"], reverse=True)
+        lines += ["", f"**🏆 Comparação ({unit}):**"]
+        for position, figure in enumerate(ranking, 1):
+            value = f"{figure['value']:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
+            lines.append(f"{position}. {figure['bank']} ({_period(figure)}) — {figure['metric']}: {value}")
+    return "\n".join(lines)
@@ -1,54 +1,204 @@
+from typing import AsyncIterator, Dict
+
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
 from langgraph.graph import END, StateGraph, START
-from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.runnables import RunnableLambda
 
 from agent_state import AgentState
+from checkpointer import SQLiteCheckpointer
+from metrics import traced_node
 from nodes import (
     agent, 
+    aagent,
     should_continue, 
-    should_summarize, 
     summarize_conversation,
+    asummarize_conversation,
+    check_answer_cache,
+    route_after_cache,
+    store_answer,
+    retrieve_context,
+    aretrieve_context,
+    route_fast_path,
+    generate,
+    agenerate,
     financial_tool_node
 )
 
 import os
+import time
 
 # =============================================================================
 # SIMPLE FINANCIAL RAG GRAPH  
 # =============================================================================
 
-# Graph simplificado - apenas Financial RAG
-builder = StateGraph(AgentState)
-
-# Nós principais
-builder.add_node("summarize_conversation", summarize_conversation)
-builder.add_node("agent", agent)
-builder.add_node("financial_tools", financial_tool_node)
-
-# Fluxo inicial - verificar se precisa resumir
-builder.add_conditional_edges(
-    START, 
-    should_summarize,
-    {
-        "summarize_conversation": "summarize_conversation",
-        "agent": "agent"
-    }
-)
+# "agent": uma chamada ao LLM só para decidir chamar o retriever, e a resposta é a saída da ferramenta;
+# "fast": busca direta pela pergunta e uma única chamada ao LLM, que gera a resposta do contexto
+GRAPH_MODES = ("agent", "fast")
+GRAPH_MODE = os.getenv("GRAPH_MODE", "agent")
 
-# Sempre voltar para o agente após resumir
-builder.add_edge("summarize_conversation", "agent")
-
-# Do agente, verificar se deve usar ferramentas ou terminar
-builder.add_conditional_edges(
-    "agent",
-    should_continue,
-    {
-        "continue": "financial_tools",
-        "end": END,
-    }
-)
 
-# Após usar ferramentas, terminar
-builder.add_edge("financial_tools", END)
+def _add_agent_path(builder: StateGraph):
+    """Agente com ferramentas: o LLM escolhe a busca (e os filtros) antes de responder."""
+    builder.add_node("agent", traced_node("agent", RunnableLambda(agent, afunc=aagent, name="agent")))
+    builder.add_node("financial_tools", traced_node("financial_tools", financial_tool_node))
+    
+    # Sem resposta no cache, verificar se precisa resumir
+    builder.add_conditional_edges(
+        "check_answer_cache", 
+        route_after_cache,
+        {
+            "summarize_conversation": "summarize_conversation",
+            "agent": "agent",
+            "end": END
+        }
+    )
+    
+    # Sempre voltar para o agente após resumir
+    builder.add_edge("summarize_conversation", "agent")
+    
+    # Do agente, verificar se deve usar ferramentas ou terminar
+    builder.add_conditional_edges(
+        "agent",
+        should_continue,
+        {
+            "continue": "financial_tools",
+            "end": "store_answer",
+        }
+    )
+    
+    # Após usar ferramentas, guardar a resposta no cache e terminar
+    builder.add_edge("financial_tools", "store_answer")
+
+
+def _add_fast_path(builder: StateGraph):
+    """
+    Busca direta pela mensagem do usuário (em paralelo com o resumo, se houver)
+    e uma única chamada ao LLM para gerar a resposta a partir do contexto.
+    """
+    builder.add_node(
+        "retrieve", traced_node("retrieve", RunnableLambda(retrieve_context, afunc=aretrieve_context, name="retrieve"))
+    )
+    builder.add_node("generate", traced_node("generate", RunnableLambda(generate, afunc=agenerate, name="generate")))
+    
+    builder.add_conditional_edges(
+        "check_answer_cache",
+        route_fast_path,
+        {
+            "retrieve": "retrieve",
+            "summarize_conversation": "summarize_conversation",
+            "end": END
+        }
+    )
+    
+    # generate espera a busca e o resumo (mesmo passo do graph)
+    builder.add_edge("retrieve", "generate")
+    builder.add_edge("summarize_conversation", "generate")
+    builder.add_edge("generate", "store_answer")
+
+
+def build_graph(mode: str = GRAPH_MODE, checkpointer=None):
+    """
+    Monta o graph do agente.
+    
+    Args:
+        mode: "agent" (o LLM decide usar o retriever) ou "fast" (busca direta + uma geração)
+        checkpointer: Onde o histórico das conversas é gravado (padrão: SQLite)
+    """
+    if mode not in GRAPH_MODES:
+        raise ValueError(f"GRAPH_MODE inválido: {mode} (opções: {', '.join(GRAPH_MODES)})")
+    
+    builder = StateGraph(AgentState)
+    
+    # Nós comuns (sync para graph.invoke, async para graph.ainvoke/astream;
+    # o ToolNode já escolhe o caminho certo da ferramenta sozinho)
+    # traced_node mede cada nó (latência, tokens, ChromaDB, caches) -> retrieval_metrics
+    builder.add_node(
+        "summarize_conversation",
+        traced_node(
+            "summarize_conversation",
+            RunnableLambda(summarize_conversation, afunc=asummarize_conversation, name="summarize_conversation")
+        )
+    )
+    
+    # Cache semântico de respostas: perguntas já respondidas não passam pelo LLM
+    builder.add_node("check_answer_cache", traced_node("check_answer_cache", check_answer_cache))
+    builder.add_node("store_answer", traced_node("store_answer", store_answer))
+    builder.add_edge(START, "check_answer_cache")
+    builder.add_edge("store_answer", END)
+    
+    if mode == "fast":
+        _add_fast_path(builder)
+    else:
+        _add_agent_path(builder)
+    
+    # Histórico das conversas persistido em SQLite, fora da RAM
+    return builder.compile(checkpointer=checkpointer or SQLiteCheckpointer())
+
+
+graph = build_graph()
+checkpointer = graph.checkpointer
+
+
+# =============================================================================
+# STREAMING
+# =============================================================================
+
+STREAM_NODES = ("agent", "generate")  # Nós cujos tokens são exibidos ao usuário (não o resumo)
+CACHE_NODE = "check_answer_cache"  # Resposta pronta vinda do cache (sem tokens para transmitir)
+
 
-# Compilar o graph
-graph = builder.compile(checkpointer=MemorySaver())
\ No newline at end of file
+async def astream_answer(inputs: Dict, config: Dict) -> AsyncIterator[Dict]:
+    """
+    Executa o graph em modo streaming, emitindo eventos à medida que são produzidos.
+    
+    Eventos:
+        {"type": "token", "content": str}              token da resposta do agente (ou a resposta inteira, do cache)
+        {"type": "tool_start", "name": str, "args": dict}
+        {"type": "tool_end", "name": str, "content": str}
+        {"type": "done", "state": dict, "ttft_ms": float, "total_ms": float}
+    
+    ttft_ms (time-to-first-token) é o tempo até o primeiro conteúdo visível
+    (token do agente ou resultado de ferramenta); total_ms, até o fim do graph.
+    """
+    start_time = time.perf_counter()
+    ttft_ms = None
+    
+    def elapsed_ms() -> float:
+        return round((time.perf_counter() - start_time) * 1000, 1)
+    
+    async for mode, chunk in graph.astream(inputs, config, stream_mode=["messages", "updates"]):
+        if mode == "messages":
+            message, metadata = chunk
+            if (
+                metadata.get("langgraph_node") in STREAM_NODES
+                and isinstance(message, AIMessageChunk)
+                and isinstance(message.content, str)
+                and message.content
+            ):
+                if ttft_ms is None:
+                    ttft_ms = elapsed_ms()
+                yield {"type": "token", "content": message.content}
+            continue
+        
+        for node, update in chunk.items():
+            for message in (update or {}).get("messages", []):
+                if node == CACHE_NODE and isinstance(message, AIMessage):
+                    if ttft_ms is None:
+                        ttft_ms = elapsed_ms()
+                    yield {"type": "token", "content": message.content}
+                elif isinstance(message, AIMessage) and message.tool_calls:
+                    for tool_call in message.tool_calls:
+                        yield {"type": "tool_start", "name": tool_call["name"], "args": tool_call["args"]}
+                elif isinstance(message, ToolMessage):
+                    if ttft_ms is None:
+                        ttft_ms = elapsed_ms()
+                    yield {"type": "tool_end", "name": message.name, "content": message.content}
+    
+    snapshot = await graph.aget_state(config)
+    total_ms = elapsed_ms()
+    yield {
+        "type": "done",
+        "state": snapshot.values,
+        "ttft_ms": ttft_ms if ttft_ms is not None else total_ms,
+        "total_ms": total_ms
+    }
\ No newline at end of file
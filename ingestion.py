@@ -0,0 +1,348 @@
+"""
+Fila de ingestão de documentos enviados pelo Streamlit.
+
+O upload só grava o arquivo (os bytes do buffer do Streamlit) numa fila SQLite e
+volta na hora; um worker em background lê a fila, extrai o texto direto dos
+bytes (sem arquivo temporário), embeda e grava na coleção, atualizando o
+progresso de cada job (chunks gravados) para a barra lateral consultar.
+
+- Um job por arquivo: status queued -> running -> done | error, com a mensagem
+  do erro (ex: formato não suportado) sem derrubar os demais;
+- reenviar o mesmo arquivo (nome + hash) enquanto ele está na fila não cria
+  outro job;
+- o conteúdo é apagado da fila quando o job termina, e jobs terminados há mais
+  de INGEST_JOB_TTL_HOURS são removidos;
+- jobs que estavam em execução num processo que morreu voltam para a fila
+  quando um worker inicia.
+
+O worker roda como thread no processo do aplicativo: o cliente do ChromaDB, o
+índice BM25 e os caches de busca são por processo, e só assim o aplicativo
+enxerga os documentos novos sem reabrir o banco. A extração de PDFs e DOCX, que
+seguraria o GIL, roda num processo à parte (parsing.iter_upload_content); a
+thread só recebe as páginas, gera os chunks e grava. Para esvaziar a fila com o
+aplicativo parado:
+
+    python ingestion.py
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+# Configurações
+INGEST_QUEUE_DB = os.getenv("INGEST_QUEUE_DB", "./ingest_queue.sqlite")
+INGEST_JOB_TTL_HOURS = float(os.getenv("INGEST_JOB_TTL_HOURS", "24"))  # Jobs terminados são removidos
+INGEST_POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", "2"))     # Espera do worker com a fila vazia
+
+JOB_STATUSES = ("queued", "running", "done", "error")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    filename TEXT NOT NULL,
+    file_hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    payload BLOB,
+    status TEXT NOT NULL DEFAULT 'queued',
+    chunks INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    worker_pid INTEGER,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+"""
+
+_JOB_COLUMNS = ("id", "filename", "file_hash", "size", "status", "chunks", "message",
+                "created_at", "started_at", "finished_at")
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class IngestionQueue:
+    """
+    Fila de jobs de ingestão persistida em SQLite (WAL, compartilhada entre processos).
+
+    Args:
+        path: Arquivo do banco SQLite
+        ttl_hours: Horas até um job terminado ser removido (0 desativa)
+    """
+
+    def __init__(self, path: str = INGEST_QUEUE_DB, ttl_hours: float = INGEST_JOB_TTL_HOURS):
+        self.path = path
+        self.ttl_hours = ttl_hours
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def submit(self, filename: str, data: bytes) -> int:
+        """
+        Enfileira um arquivo; devolve o id do job.
+
+        Se o mesmo arquivo (nome + conteúdo) já está na fila ou em execução,
+        devolve o job existente.
+        """
+        file_hash = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT id FROM jobs WHERE filename = ? AND file_hash = ? AND status IN ('queued', 'running')",
+                    (filename, file_hash)
+                ).fetchone()
+                if row:
+                    job_id = row[0]
+                else:
+                    job_id = self.conn.execute(
+                        "INSERT INTO jobs (filename, file_hash, size, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                        (filename, file_hash, len(data), sqlite3.Binary(data), time.time())
+                    ).lastrowid
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def claim(self) -> Optional[Dict]:
+        """
+        Reserva o job mais antigo da fila para este processo.
+
+        Returns:
+            {"id", "filename", "data"} ou None se a fila está vazia
+        """
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT id, filename, payload FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1"
+                ).fetchone()
+                if row:
+                    self.conn.execute(
+                        "UPDATE jobs SET status = 'running', worker_pid = ?, started_at = ?, chunks = 0 WHERE id = ?",
+                        (os.getpid(), time.time(), row[0])
+                    )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return {"id": row[0], "filename": row[1], "data": bytes(row[2])}
+
+    def progress(self, job_id: int, chunks: int):
+        """Registra quantos chunks do job já foram gravados."""
+        with self._lock:
+            self.conn.execute("UPDATE jobs SET chunks = ? WHERE id = ?", (chunks, job_id))
+
+    def finish(self, job_id: int, status: str, message: str, chunks: Optional[int] = None):
+        """Encerra o job ('done' ou 'error') e descarta o conteúdo do arquivo."""
+        with self._lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, chunks = COALESCE(?, chunks), payload = NULL, "
+                "finished_at = ? WHERE id = ?",
+                (status, message, chunks, time.time(), job_id)
+            )
+
+    def requeue_interrupted(self) -> int:
+        """
+        Devolve à fila os jobs 'running' cujo processo não existe mais.
+
+        Returns:
+            Número de jobs reenfileirados
+        """
+        with self._lock:
+            running = self.conn.execute("SELECT id, worker_pid FROM jobs WHERE status = 'running'").fetchall()
+            orphans = [job_id for job_id, pid in running if not _pid_alive(pid)]
+            for job_id in orphans:
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'queued', worker_pid = NULL, chunks = 0 WHERE id = ?", (job_id,)
+                )
+        return len(orphans)
+
+    def jobs(self, ids: Optional[Sequence[int]] = None, limit: int = 50) -> List[Dict]:
+        """Status dos jobs informados (ou dos mais recentes), sem o conteúdo dos arquivos."""
+        columns = ", ".join(_JOB_COLUMNS)
+        with self._lock:
+            if ids is not None:
+                ids = list(ids)
+                if not ids:
+                    return []
+                placeholders = ",".join("?" * len(ids))
+                rows = self.conn.execute(
+                    f"SELECT {columns} FROM jobs WHERE id IN ({placeholders}) ORDER BY id", ids
+                ).fetchall()
+            else:
+                rows = self.conn.execute(
+                    f"SELECT {columns} FROM jobs ORDER BY id DESC LIMIT ?", (limit,)
+                ).fetchall()
+        return [dict(zip(_JOB_COLUMNS, row)) for row in rows]
+
+    def purge(self, ttl_hours: Optional[float] = None) -> int:
+        """
+        Remove jobs terminados há mais de `ttl_hours`.
+
+        Returns:
+            Número de jobs removidos
+        """
+        ttl_hours = self.ttl_hours if ttl_hours is None else ttl_hours
+        if ttl_hours <= 0:
+            return 0
+        cutoff = time.time() - ttl_hours * 3600
+        with self._lock:
+            return self.conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'error') AND finished_at < ?", (cutoff,)
+            ).rowcount
+
+    def get_stats(self) -> Dict:
+        """Número de jobs por status."""
+        with self._lock:
+            counts = dict(self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in JOB_STATUSES}
+
+
+class IngestionWorker:
+    """
+    Consome a fila em uma thread daemon, um job por vez.
+
+    Args:
+        queue: Fila de jobs
+        db: SimpleVectorDB de destino (padrão: o global de tools.get_vector_db)
+        poll_seconds: Espera entre consultas à fila quando ela está vazia
+    """
+
+    def __init__(self, queue: IngestionQueue, db=None, poll_seconds: float = INGEST_POLL_SECONDS):
+        self.queue = queue
+        self.db = db
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "IngestionWorker":
+        """Reenfileira jobs interrompidos e inicia a thread (uma vez)."""
+        if self._thread is None or not self._thread.is_alive():
+            requeued = self.queue.requeue_interrupted()
+            if requeued:
+                print(f"🔁 {requeued} jobs de ingestão interrompidos voltaram para a fila")
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="ingestion-worker")
+            self._thread.start()
+        return self
+
+    def notify(self):
+        """Acorda o worker (chamado após enfileirar um arquivo)."""
+        self._wake.set()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                if self.run_once():
+                    continue
+                self.queue.purge()
+            except Exception as e:
+                print(f"⚠️ Erro no worker de ingestão: {e}")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def run_once(self) -> bool:
+        """
+        Processa o próximo job da fila.
+
+        Returns:
+            False se a fila estava vazia
+        """
+        job = self.queue.claim()
+        if job is None:
+            return False
+
+        if self.db is None:
+            from tools import get_vector_db
+            self.db = get_vector_db()
+
+        job_id, filename = job["id"], job["filename"]
+        print(f"📥 Indexando {filename} (job {job_id})")
+        try:
+            result = self.db.add_uploads(
+                [(filename, job["data"])], progress=lambda written: self.queue.progress(job_id, written)
+            )
+        except Exception as e:
+            result = {"status": "error", "message": str(e)}
+
+        if result["status"] == "success" and result["errors"]:
+            result = {"status": "error", "message": result["errors"][0]["message"]}
+        if result["status"] == "success":
+            if result["files_unchanged"]:
+                message = "Arquivo já indexado"
+            else:
+                message = f"{result['documents_added']} chunks adicionados ({result['chunks_skipped']} já existentes)"
+            self.queue.finish(job_id, "done", message, chunks=result["documents_added"])
+        else:
+            print(f"❌ Erro ao indexar {filename}: {result['message']}")
+            self.queue.finish(job_id, "error", result["message"])
+        return True
+
+    def drain(self) -> int:
+        """Processa a fila até esvaziar (no processo atual); devolve o número de jobs."""
+        processed = 0
+        while self.run_once():
+            processed += 1
+        return processed
+
+
+# Instâncias globais, criadas sob demanda
+_queue: Optional[IngestionQueue] = None
+_worker: Optional[IngestionWorker] = None
+_ingestion_lock = threading.Lock()
+
+
+def get_ingestion_queue() -> IngestionQueue:
+    """Retorna a fila de ingestão global."""
+    global _queue
+    if _queue is None:
+        with _ingestion_lock:
+            if _queue is None:
+                _queue = IngestionQueue()
+    return _queue
+
+
+def get_ingestion_worker() -> IngestionWorker:
+    """Retorna o worker global, já iniciado (um por processo)."""
+    global _worker
+    if _worker is None:
+        queue = get_ingestion_queue()
+        with _ingestion_lock:
+            if _worker is None:
+                _worker = IngestionWorker(queue).start()
+    return _worker
+
+
+if __name__ == "__main__":
+    queue = get_ingestion_queue()
+    requeued = queue.requeue_interrupted()
+    print(f"📋 Fila de ingestão: {queue.get_stats()} ({requeued} jobs interrompidos reenfileirados)")
+    processed = IngestionWorker(queue).drain()
+    print(f"✅ {processed} jobs processados")
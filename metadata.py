@@ -0,0 +1,285 @@
+"""
+Metadados estruturados dos chunks, gravados no ChromaDB na ingestão.
+
+Cada chunk recebe:
+
+- source: nome do arquivo (o mesmo do manifesto)
+- bank: instituição normalizada ("itau", "bradesco", ...), do nome do arquivo ou do cabeçalho
+- year / quarter: período do relatório ("q3_2024", "3º Trimestre 2024", "3T24", ...)
+- chunk_index: posição do chunk no documento (0, 1, ...)
+- start_byte / end_byte: trecho do chunk no texto extraído (offsets em bytes UTF-8)
+- preview: início do conteúdo do chunk, para listar documentos sem ler os textos
+
+As buscas usam esses campos como pré-filtro (`where` do ChromaDB), reduzindo o
+conjunto de candidatos a uma instituição/período antes da busca por similaridade.
+"""
+
+import re
+import unicodedata
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+METADATA_VERSION = 2     # Mudou o esquema, os arquivos são reprocessados na próxima ingestão
+PREVIEW_CHARS = 200      # Tamanho do preview gravado em cada chunk
+HEAD_CHARS = 2000        # Início do documento usado para identificar instituição e período
+MAX_LOCATE_BUFFER = 1 << 20  # Texto mantido para localizar os chunks (caracteres)
+
+# Apelidos (sem acento, minúsculos) -> identificador da instituição
+BANK_ALIASES = {
+    "itau": ("itau unibanco", "itau"),
+    "bradesco": ("bradesco",),
+    "santander": ("santander",),
+    "banco_do_brasil": ("banco do brasil", "bb"),
+    "caixa": ("caixa economica",),
+    "btg": ("btg pactual", "btg"),
+    "nubank": ("nubank", "nu holdings"),
+    "inter": ("banco inter",),
+    "safra": ("banco safra",),
+}
+
+_ORDINAL_QUARTERS = {"primeiro": 1, "segundo": 2, "terceiro": 3, "quarto": 4}
+
+# Padrões de período, aplicados ao texto sem acentos e em minúsculas
+_PERIOD_PATTERNS = (
+    (re.compile(r"\bq([1-4])[\s_\-/]*((?:19|20)\d\d)\b"), "quarter_year"),                 # Q3 2024, q3_2024
+    (re.compile(r"\b((?:19|20)\d\d)[\s_\-/]*q([1-4])\b"), "year_quarter"),                 # 2024Q3, 2024_q3
+    (re.compile(r"\b([1-4])\s*[o°º]?\s*trimestre\s*(?:de\s*)?((?:19|20)\d\d)\b"), "quarter_year"),  # 3º Trimestre 2024
+    (re.compile(r"\b(primeiro|segundo|terceiro|quarto)\s+trimestre\s*(?:de\s*)?((?:19|20)\d\d)\b"), "ordinal_year"),
+    (re.compile(r"\b([1-4])[tq](\d\d)\b"), "quarter_short_year"),                          # 3T24, 3Q24
+)
+_YEAR = re.compile(r"\b((?:19|20)\d\d)\b")
+_SEPARATORS = re.compile(r"[_\-.]+")
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def _fold(text: str) -> str:
+    """Minúsculas e sem acentos ("Itaú 3º Trimestre" -> "itau 3º trimestre")."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def normalize_bank(text: Optional[str]) -> Optional[str]:
+    """
+    Identifica a instituição citada num texto ou nome de arquivo.
+
+    Aceita tanto o identificador ("itau") quanto nomes livres ("Itaú Unibanco",
+    "itau_q3_2024.txt"). Retorna None se nenhuma instituição conhecida aparecer.
+    """
+    if not text:
+        return None
+    folded = f" {_SEPARATORS.sub(' ', _fold(text))} "
+    best: Optional[Tuple[int, str]] = None
+    for bank, aliases in BANK_ALIASES.items():
+        if folded.strip() == bank:
+            return bank
+        for alias in aliases:
+            position = folded.find(f" {alias} ")
+            if position != -1 and (best is None or position < best[0]):
+                best = (position, bank)
+    return best[1] if best else None
+
+
+def _period_matches(folded: str) -> Iterator[Tuple[int, int, int]]:
+    """(posição, ano, trimestre) de cada período com trimestre citado no texto já normalizado."""
+    for pattern, kind in _PERIOD_PATTERNS:
+        for match in pattern.finditer(folded):
+            first, second = match.groups()
+            if kind == "quarter_year":
+                yield match.start(), int(second), int(first)
+            elif kind == "year_quarter":
+                yield match.start(), int(first), int(second)
+            elif kind == "ordinal_year":
+                yield match.start(), int(second), _ORDINAL_QUARTERS[first]
+            else:
+                yield match.start(), 2000 + int(second), int(first)
+
+
+def parse_period(text: str) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Extrai (ano, trimestre) de um texto ou nome de arquivo.
+
+    Reconhece "Q3 2024", "q3_2024", "2024Q3", "3º Trimestre 2024",
+    "Terceiro Trimestre 2024" e "3T24" (vale o primeiro citado); sem trimestre,
+    devolve só o primeiro ano citado.
+    """
+    folded = _SEPARATORS.sub(" ", _fold(text))
+    matches = list(_period_matches(folded))
+    if matches:
+        # O período citado primeiro é o do relatório ("Q3 2024 ... vs Q3 2023")
+        _, year, quarter = min(matches)
+        return year, quarter
+    match = _YEAR.search(folded)
+    return (int(match.group(1)) if match else None), None
+
+
+def document_metadata(source: str, head: str) -> Dict:
+    """
+    Metadados comuns a todos os chunks de um documento.
+
+    O nome do arquivo tem prioridade; o início do conteúdo completa o que faltar.
+    Campos não identificados ficam de fora (o ChromaDB não aceita valores nulos).
+    """
+    metadata: Dict = {"source": source}
+    bank = normalize_bank(source) or normalize_bank(head)
+    if bank:
+        metadata["bank"] = bank
+
+    year, quarter = parse_period(source)
+    if quarter is None:
+        head_year, head_quarter = parse_period(head)
+        if head_quarter is not None and (year is None or year == head_year):
+            year, quarter = head_year, head_quarter
+        elif year is None:
+            year = head_year
+    if year is not None:
+        metadata["year"] = year
+    if quarter is not None:
+        metadata["quarter"] = quarter
+    return metadata
+
+
+def chunk_preview(chunk: str) -> str:
+    """Início do corpo de um chunk "título (Parte N):\ncorpo", com "..." se foi cortado."""
+    body = chunk.split('\n', 1)[-1].strip()
+    return body[:PREVIEW_CHARS] + "..." if len(body) > PREVIEW_CHARS else body
+
+
+def build_where(source: Optional[str] = None, bank: Optional[str] = None,
+                year: Optional[int] = None, quarter: Optional[int] = None) -> Optional[Dict]:
+    """
+    Monta o filtro `where` do ChromaDB a partir dos campos informados.
+
+    Args:
+        source: Nome do arquivo
+        bank: Instituição (identificador ou nome livre, ex: "Itaú")
+        year: Ano do relatório
+        quarter: Trimestre (1-4)
+
+    Raises:
+        ValueError: Instituição desconhecida ou trimestre fora de 1-4
+    """
+    conditions = []
+    if source:
+        conditions.append({"source": source})
+    if bank:
+        bank_id = normalize_bank(bank)
+        if bank_id is None:
+            raise ValueError(f"Instituição desconhecida: {bank} (opções: {', '.join(BANK_ALIASES)})")
+        conditions.append({"bank": bank_id})
+    if year is not None:
+        conditions.append({"year": int(year)})
+    if quarter is not None:
+        if not 1 <= int(quarter) <= 4:
+            raise ValueError(f"Trimestre inválido: {quarter} (use 1 a 4)")
+        conditions.append({"quarter": int(quarter)})
+
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def question_where(question: str) -> Optional[Dict]:
+    """
+    Filtro `where` deduzido de uma pergunta em texto livre (caminho rápido do graph).
+
+    Só filtra pela instituição, ou pelo período, quando a pergunta cita exatamente
+    um(a): comparações ("Itaú vs Bradesco", "Q3 2024 vs Q3 2023") buscam em todos
+    os documentos.
+    """
+    words = f" {_NON_WORD.sub(' ', _fold(question))} "
+    banks = {bank for bank, aliases in BANK_ALIASES.items() if any(f" {alias} " in words for alias in aliases)}
+
+    folded = _SEPARATORS.sub(" ", _fold(question))
+    periods = {(year, quarter) for _, year, quarter in _period_matches(folded)}
+    years = {int(year) for year in _YEAR.findall(folded)}
+
+    # Outro ano citado além do período ("... comparado a 2023") também é comparação
+    year = quarter = None
+    if len(periods) == 1 and years <= {year for year, _ in periods}:
+        year, quarter = next(iter(periods))
+    elif not periods and len(years) == 1:
+        year = next(iter(years))
+    return build_where(bank=banks.pop() if len(banks) == 1 else None, year=year, quarter=quarter)
+
+
+class ChunkAnnotator:
+    """
+    Acompanha o fluxo de texto de um documento para anotar os chunks gerados dele.
+
+    O chunker consome o documento através do anotador (`for segment in annotator`),
+    que guarda o início do documento (instituição e período) e uma janela do texto
+    já lido, onde cada chunk é localizado para obter seus offsets.
+
+    Uso:
+        annotator = ChunkAnnotator("itau_q3_2024.txt", iter_file_content(path))
+        for chunk, metadata in annotator.annotate(chunker.chunk(annotator, title)):
+            ...
+    """
+
+    def __init__(self, source: str, segments: Iterable[str]):
+        self.source = source
+        self._segments = segments
+        self._head = ""
+        self._document: Optional[Dict] = None
+        self._buffer = ""
+        self._buffer_start_byte = 0  # Offset (bytes) do primeiro caractere do buffer
+        self._search_from = 0        # Próximo chunk começa depois do início do anterior
+
+    def __iter__(self) -> Iterator[str]:
+        for segment in self._segments:
+            if len(self._head) < HEAD_CHARS:
+                self._head += segment[:HEAD_CHARS - len(self._head)]
+            self._buffer += segment
+            if len(self._buffer) > MAX_LOCATE_BUFFER:
+                self._trim(len(self._buffer) - MAX_LOCATE_BUFFER)
+            yield segment
+
+    def _trim(self, chars: int):
+        self._buffer_start_byte += len(self._buffer[:chars].encode("utf-8"))
+        self._buffer = self._buffer[chars:]
+        self._search_from = max(0, self._search_from - chars)
+
+    def _byte_offset(self, position: int) -> int:
+        return self._buffer_start_byte + len(self._buffer[:position].encode("utf-8"))
+
+    def locate(self, body: str) -> Optional[Tuple[int, int]]:
+        """
+        Offsets (início, fim) em bytes do corpo de um chunk no texto original.
+
+        Os chunkers removem espaços nas pontas e linhas vazias, então o corpo é
+        localizado pela primeira linha encontrada e pela última linha do chunk.
+        """
+        lines = body.split('\n')
+        start, skipped = -1, 0
+        for skipped, line in enumerate(lines):
+            start = self._buffer.find(line, self._search_from)
+            if start != -1:
+                break
+        if start == -1:
+            return None
+
+        last = lines[-1]
+        min_last = start + sum(len(line) for line in lines[skipped:-1])
+        last_position = self._buffer.find(last, min_last) if len(lines) - skipped > 1 else start
+        end = (last_position if last_position != -1 else start) + len(last)
+
+        offsets = self._byte_offset(start), self._byte_offset(max(end, start + len(lines[skipped])))
+        # O texto antes do início deste chunk não será mais necessário
+        self._trim(start)
+        self._search_from = 1
+        return offsets
+
+    @property
+    def document(self) -> Dict:
+        """Metadados comuns aos chunks do documento (calculados do início já lido)."""
+        if self._document is None:
+            self._document = document_metadata(self.source, self._head)
+        return self._document
+
+    def annotate(self, chunks: Iterable[str]) -> Iterator[Tuple[str, Dict]]:
+        """Gera (chunk, metadados) para os chunks "título (Parte N):\\ncorpo" do documento."""
+        for chunk_index, chunk in enumerate(chunks):
+            metadata = {**self.document, "chunk_index": chunk_index, "preview": chunk_preview(chunk)}
+            offsets = self.locate(chunk.split('\n', 1)[-1])
+            if offsets:
+                metadata["start_byte"], metadata["end_byte"] = offsets
+            yield chunk, metadata
@@ -0,0 +1,340 @@
+"""
+Instrumentação do pipeline: latência por nó, tokens do LLM, tempos do ChromaDB e
+acertos de cache.
+
+Cada medição vai para dois lugares:
+
+- o registro em processo (`registry`): histogramas de janela móvel e contadores,
+  exportáveis em texto Prometheus ou JSON para os dashboards;
+- o trace da execução atual (contextvar aberto por `traced_node`), que é copiado
+  para `retrieval_metrics` no estado do graph ao fim de cada nó.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableLambda
+
+# Configurações
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "1000"))  # Amostras mantidas por histograma
+METRICS_PORT = os.getenv("METRICS_PORT")                   # Porta do endpoint HTTP (opcional)
+METRICS_PREFIX = "financial_rag"
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Faixas de confiança (as mesmas de nodes.confidence_grade)
+HIGH_CONFIDENCE = 0.8
+MEDIUM_CONFIDENCE = 0.6
+
+_current_trace: ContextVar[Optional[Dict[str, float]]] = ContextVar("current_trace", default=None)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class RollingHistogram:
+    """Últimas `window` amostras de uma métrica, mais contagem e soma desde o início."""
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.values: Deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.values.append(value)
+        self.count += 1
+        self.total += value
+
+    def snapshot(self) -> Dict[str, float]:
+        values = np.fromiter(self.values, dtype=np.float64)
+        summary = {"count": self.count, "sum": round(self.total, 3)}
+        if len(values):
+            summary["mean"] = round(float(values.mean()), 3)
+            for q in QUANTILES:
+                summary[f"p{int(q * 100)}"] = round(float(np.quantile(values, q)), 3)
+        return summary
+
+
+class MetricsRegistry:
+    """Histogramas e contadores em processo, identificados por nome + labels."""
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.window = window
+        self.histograms: Dict[Tuple[str, Labels], RollingHistogram] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = RollingHistogram(self.window)
+            histogram.observe(value)
+
+    def increment(self, name: str, value: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def samples(self, name: str, **labels: str) -> list:
+        """Amostras da janela atual dos histogramas `name` que têm os labels dados (todos, se nenhum)."""
+        wanted = set(labels.items())
+        with self._lock:
+            return [
+                value
+                for (histogram_name, histogram_labels), histogram in self.histograms.items()
+                if histogram_name == name and wanted.issubset(histogram_labels)
+                for value in histogram.values
+            ]
+
+    def clear(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def to_json(self) -> Dict[str, Any]:
+        """Snapshot serializável: {"histograms": [...], "counters": [...]}."""
+        with self._lock:
+            histograms = [
+                {"name": name, "labels": dict(labels), **histogram.snapshot()}
+                for (name, labels), histogram in sorted(self.histograms.items())
+            ]
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+        return {"histograms": histograms, "counters": counters}
+
+    def to_prometheus(self) -> str:
+        """Exposição em texto Prometheus (histogramas como summary com quantis da janela)."""
+        lines = []
+        snapshot = self.to_json()
+
+        def label_text(labels: Dict[str, str], **extra: str) -> str:
+            items = {**labels, **extra}
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(items.items())) + "}"
+
+        declared = set()
+        for item in snapshot["histograms"]:
+            name = f"{METRICS_PREFIX}_{item['name']}"
+            if name not in declared:
+                lines.append(f"# TYPE {name} summary")
+                declared.add(name)
+            for q in QUANTILES:
+                value = item.get(f"p{int(q * 100)}")
+                if value is not None:
+                    lines.append(f"{name}{label_text(item['labels'], quantile=str(q))} {value}")
+            lines.append(f"{name}_sum{label_text(item['labels'])} {item['sum']}")
+            lines.append(f"{name}_count{label_text(item['labels'])} {item['count']}")
+
+        for item in snapshot["counters"]:
+            name = f"{METRICS_PREFIX}_{item['name']}_total"
+            if name not in declared:
+                lines.append(f"# TYPE {name} counter")
+                declared.add(name)
+            lines.append(f"{name}{label_text(item['labels'])} {item['value']}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+# =============================================================================
+# MEDIÇÕES
+# =============================================================================
+
+def _trace_add(key: str, value: float):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace[key] = round(trace.get(key, 0) + value, 3)
+
+
+def observe(name: str, value: float, **labels: str):
+    """Registra uma amostra (ex: latência em ms) no histograma e no trace atual."""
+    registry.observe(name, value, **labels)
+    _trace_add(name, value)
+
+
+def increment(name: str, value: float = 1, **labels: str):
+    """Incrementa um contador (ex: tokens, acertos de cache) e o trace atual."""
+    registry.increment(name, value, **labels)
+    _trace_add(name, value)
+
+
+@contextmanager
+def timer(name: str, **labels: str) -> Iterator[None]:
+    """Mede o bloco em milissegundos: `with timer("chroma_query_ms"): ...`."""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, (time.perf_counter() - start_time) * 1000, **labels)
+
+
+class _TokenUsageCallback(BaseCallbackHandler):
+    """Soma os tokens de entrada/saída de cada chamada ao LLM dentro de um nó."""
+
+    run_inline = True
+
+    def __init__(self, node: str, trace: Dict[str, float]):
+        self.node = node
+        self.trace = trace
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if not usage:
+                    continue
+                for field, metric in (("input_tokens", "llm_tokens_in"), ("output_tokens", "llm_tokens_out")):
+                    registry.increment(metric, usage.get(field, 0), node=self.node)
+                    self.trace[metric] = self.trace.get(metric, 0) + usage.get(field, 0)
+
+
+def _with_callback(config: Optional[Dict], callback: BaseCallbackHandler) -> Dict:
+    config = dict(config or {})
+    callbacks = config.get("callbacks")
+    if callbacks is None:
+        config["callbacks"] = [callback]
+    elif isinstance(callbacks, list):
+        config["callbacks"] = callbacks + [callback]
+    else:
+        callbacks = callbacks.copy()
+        callbacks.add_handler(callback, inherit=True)
+        config["callbacks"] = callbacks
+    return config
+
+
+def _finish_node(name: str, state: Dict, result: Any, trace: Dict[str, float], elapsed_ms: float) -> Any:
+    """Registra a latência do nó e copia o trace para `retrieval_metrics` no estado."""
+    registry.observe("node_latency_ms", elapsed_ms, node=name)
+    if not isinstance(result, dict):
+        return result
+
+    # Cada chave reflete a última execução do nó ("agent_ms", "financial_tools_chroma_query_ms", ...):
+    # as de execuções anteriores vão como None e merge_metrics as remove do estado
+    prefix = f"{name}_"
+    retrieval_metrics = {key: None for key in (state.get("retrieval_metrics") or {}) if key.startswith(prefix)}
+    retrieval_metrics[f"{name}_ms"] = round(elapsed_ms, 3)
+    for key, value in trace.items():
+        retrieval_metrics[f"{name}_{key}"] = value
+    return {**result, "retrieval_metrics": retrieval_metrics}
+
+
+def traced_node(name: str, node) -> RunnableLambda:
+    """
+    Envolve um nó do graph (função, RunnableLambda ou ToolNode) com tracing.
+
+    Mede o tempo de parede do nó, coleta os tokens do LLM via callback e as
+    medições feitas dentro dele (ChromaDB, embeddings, caches), e grava tudo no
+    histograma e em `retrieval_metrics`. Mantém os caminhos sync e async do nó.
+    """
+    runnable = node if hasattr(node, "invoke") else RunnableLambda(node, name=name)
+
+    def run(state, config):
+        trace: Dict[str, float] = {}
+        token = _current_trace.set(trace)
+        start_time = time.perf_counter()
+        try:
+            result = runnable.invoke(state, _with_callback(config, _TokenUsageCallback(name, trace)))
+        finally:
+            _current_trace.reset(token)
+        return _finish_node(name, state, result, trace, (time.perf_counter() - start_time) * 1000)
+
+    async def arun(state, config):
+        trace: Dict[str, float] = {}
+        token = _current_trace.set(trace)
+        start_time = time.perf_counter()
+        try:
+            result = await runnable.ainvoke(state, _with_callback(config, _TokenUsageCallback(name, trace)))
+        finally:
+            _current_trace.reset(token)
+        return _finish_node(name, state, result, trace, (time.perf_counter() - start_time) * 1000)
+
+    return RunnableLambda(run, afunc=arun, name=name)
+
+
+# =============================================================================
+# EXPORTAÇÃO
+# =============================================================================
+
+def retrieval_summary():
+    """
+    RetrievalMetrics (agent_state.py) calculado da janela atual de buscas.
+
+    semantic_precision: fração das buscas cujo melhor resultado tem similaridade > 0.6
+    """
+    from agent_state import RetrievalMetrics
+
+    similarities = registry.samples("top_similarity")
+    latencies = registry.samples("search_ms")
+    distribution = {"alta": 0, "média": 0, "baixa": 0}
+    for similarity in similarities:
+        if similarity > HIGH_CONFIDENCE:
+            distribution["alta"] += 1
+        elif similarity > MEDIUM_CONFIDENCE:
+            distribution["média"] += 1
+        else:
+            distribution["baixa"] += 1
+
+    return RetrievalMetrics(
+        semantic_precision=(
+            round(sum(1 for s in similarities if s > MEDIUM_CONFIDENCE) / len(similarities), 4)
+            if similarities else None
+        ),
+        retrieval_latency=round(float(np.mean(latencies)), 3) if latencies else None,
+        confidence_distribution=distribution
+    )
+
+
+def export_metrics(fmt: str = "json") -> str:
+    """Métricas do processo em "json" ou "prometheus"."""
+    if fmt == "prometheus":
+        return registry.to_prometheus()
+    if fmt == "json":
+        payload = registry.to_json()
+        payload["retrieval"] = retrieval_summary().model_dump()
+        return json.dumps(payload, ensure_ascii=False, indent=2)
+    raise ValueError(f"Formato desconhecido: {fmt} (opções: json, prometheus)")
+
+
+def serve_metrics(port: int) -> threading.Thread:
+    """
+    Sobe um endpoint HTTP em background: /metrics (Prometheus) e /metrics.json.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = export_metrics("prometheus"), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = export_metrics("json"), "application/json"
+            else:
+                self.send_error(404)
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass  # Sem log por requisição de scrape
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True, name="metrics")
+    thread.start()
+    print(f"📈 Métricas em http://localhost:{port}/metrics")
+    return thread
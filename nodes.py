@@ -1,58 +1,247 @@
+import json
+import os
+import time
+
 from langchain_core.messages import AIMessage, HumanMessage, ToolMessage, SystemMessage, RemoveMessage
 from langgraph.prebuilt import ToolNode
 
+import metrics
+from answer_cache import ANSWER_CACHE_ENABLED, get_answer_cache
+from cache import LRUCache
 from config import llm
 from agent_state import AgentState
+from metadata import question_where
 from prompts import RAG_FORMATTER_PROMPT, FINANCIAL_AGENT_PROMPT
 from tools import (
     financial_reports_retriever_tool,
+    financial_figures_tool,
     vectorize_financial_reports,
     semantic_search,
-    get_retrieval_metrics
+    get_retrieval_metrics,
+    get_vector_db,
+    CONTEXT_CHUNKS,
+    aretrieve,
+    build_context,
+    retrieve
 )
 
 # Remover CustomToolNode - usar ToolNode padrão
 
 # Configuração
 financial_agent_msg = SystemMessage(content=FINANCIAL_AGENT_PROMPT)
-tools = [financial_reports_retriever_tool]
+tools = [financial_reports_retriever_tool, financial_figures_tool]
 llm_with_tools = llm.bind_tools(tools)
 
+# Resumo da conversa por orçamento de tokens
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "3000"))  # Resumir quando o histórico passar disso
+SUMMARY_KEEP_TOKENS = int(os.getenv("SUMMARY_KEEP_TOKENS", "1000"))    # Mensagens recentes mantidas na íntegra
+_token_encoder = None
+_token_counts = LRUCache(4096)
+
 # =============================================================================
 # NODES PRINCIPAIS  
 # =============================================================================
 
+def _encoder():
+    """Tokenizer do modelo (tiktoken); False se indisponível (ex: sem rede para baixar o encoding)."""
+    global _token_encoder
+    if _token_encoder is None:
+        try:
+            import tiktoken
+            _token_encoder = tiktoken.encoding_for_model(llm.model_name)
+        except Exception as e:
+            print(f"⚠️ Tokenizer indisponível, estimando tokens por caracteres: {e}")
+            _token_encoder = False
+    return _token_encoder
+
+def _message_text(message) -> str:
+    text = message.content if isinstance(message.content, str) else json.dumps(message.content, ensure_ascii=False)
+    if getattr(message, "tool_calls", None):
+        text += json.dumps(message.tool_calls, ensure_ascii=False)
+    return text
+
+def count_tokens(text: str) -> int:
+    encoder = _encoder()
+    return len(encoder.encode(text)) if encoder else max(1, len(text) // 4)
+
+def message_tokens(message) -> int:
+    """Tokens de uma mensagem (cacheado por id: o histórico é recontado a cada turno)."""
+    text = _message_text(message)
+    key = (message.id, len(text))
+    tokens = _token_counts.get(key)
+    if tokens is None:
+        tokens = count_tokens(text) + 4  # +4 pelo envelope (papel, separadores)
+        _token_counts.put(key, tokens)
+    return tokens
+
 def should_summarize(state: AgentState):
-    """Decide se deve resumir a conversa."""
+    """Decide se deve resumir a conversa: o histórico passou do orçamento de tokens."""
     messages = state["messages"]
-    return "summarize_conversation" if len(messages) > 5 else "agent"
+    total = sum(message_tokens(m) for m in messages)
+    return "summarize_conversation" if total > SUMMARY_TOKEN_BUDGET and len(messages) > 1 else "agent"
 
-def summarize_conversation(state: AgentState):
-    """Resume a conversa quando muito longa."""
+def _split_history(messages):
+    """
+    Separa o histórico em (removidas, mantidas).
+    
+    Mantém as mensagens mais recentes até SUMMARY_KEEP_TOKENS (sempre ao menos a
+    última) e nunca deixa uma resposta de ferramenta sem a chamada que a originou.
+    """
+    cut = len(messages) - 1
+    kept_tokens = message_tokens(messages[-1])
+    while cut > 0:
+        tokens = message_tokens(messages[cut - 1])
+        if kept_tokens + tokens > SUMMARY_KEEP_TOKENS:
+            break
+        kept_tokens += tokens
+        cut -= 1
+    while cut < len(messages) - 1 and isinstance(messages[cut], ToolMessage):
+        cut += 1
+    return messages[:cut], messages[cut:]
+
+_ROLES = {"human": "Usuário", "ai": "Assistente", "tool": "Ferramenta"}
+
+def _summary_request(state: AgentState, evicted):
+    """Prompt de resumo incremental: resumo atual + apenas as mensagens que saem do histórico."""
+    transcript = "\n".join(
+        f"{_ROLES.get(m.type, m.type)}: {_message_text(m)}" for m in evicted
+    )
     summary = state.get("summary", "")
     if summary:
-        summary_message = (
-            f"Resumo atual: {summary}\\n\\n"
-            "Atualize o resumo com as novas mensagens:"
-        )
+        instruction = "Atualize o resumo atual incorporando as mensagens abaixo."
+        context = f"Resumo atual: {summary}\n\n"
     else:
-        summary_message = "Crie um resumo da conversa:"
-        
-    messages = state["messages"] + [HumanMessage(content=summary_message)]
-    response = llm.invoke(messages)
-    delete_messages = [RemoveMessage(id=m.id) for m in state["messages"][:-5]]
-    return {"summary": response.content, "messages": delete_messages}
+        instruction = "Crie um resumo da conversa abaixo."
+        context = ""
+    return [HumanMessage(content=(
+        f"{instruction} Preserve números, períodos e instituições citados.\n\n"
+        f"{context}Mensagens:\n{transcript}"
+    ))]
 
-def agent(state: AgentState):
-    """Agente principal que processa mensagens."""
+def _summary_update(state: AgentState, evicted, response):
+    evicted_tokens = sum(message_tokens(m) for m in evicted)
+    previous_summary = state.get("summary", "")
+    summary_growth = count_tokens(response.content) - (count_tokens(previous_summary) if previous_summary else 0)
+    
+    # Métricas acumuladas da thread: tokens tirados do contexto de cada turno seguinte
+    summary_metrics = dict(state.get("summary_metrics") or {"summaries": 0, "tokens_evicted": 0, "tokens_saved": 0})
+    summary_metrics["summaries"] += 1
+    summary_metrics["tokens_evicted"] += evicted_tokens
+    summary_metrics["tokens_saved"] += evicted_tokens - summary_growth
+    
+    return {
+        "summary": response.content,
+        "messages": [RemoveMessage(id=m.id) for m in evicted],
+        "summary_metrics": summary_metrics
+    }
+
+def summarize_conversation(state: AgentState):
+    """Resume incrementalmente as mensagens que excedem o orçamento de tokens."""
+    evicted, _ = _split_history(state["messages"])
+    if not evicted:
+        return {}
+    response = llm.invoke(_summary_request(state, evicted))
+    return _summary_update(state, evicted, response)
+
+async def asummarize_conversation(state: AgentState):
+    """Versão async de summarize_conversation (usada por graph.ainvoke/astream)."""
+    evicted, _ = _split_history(state["messages"])
+    if not evicted:
+        return {}
+    response = await llm.ainvoke(_summary_request(state, evicted))
+    return _summary_update(state, evicted, response)
+
+def _history(state: AgentState):
+    """Resumo (se houver) + histórico."""
     summary = state.get("summary", "")
     if summary:
         summary_text = f"Resumo da conversa: {summary}"
-        messages = [AIMessage(content=summary_text)] + state["messages"]
-    else:
-        messages = state["messages"]
+        return [AIMessage(content=summary_text)] + state["messages"]
+    return state["messages"]
+
+def _agent_messages(state: AgentState):
+    """Prompt do agente: instruções + resumo (se houver) + histórico."""
+    return [financial_agent_msg] + _history(state)
+
+def agent(state: AgentState):
+    """Agente principal que processa mensagens."""
+    return {"messages": [llm_with_tools.invoke(_agent_messages(state))]}
+
+async def aagent(state: AgentState):
+    """Versão async do agente (usada por graph.ainvoke/astream)."""
+    return {"messages": [await llm_with_tools.ainvoke(_agent_messages(state))]}
+
+# =============================================================================
+# CACHE SEMÂNTICO DE RESPOSTAS
+# =============================================================================
+
+def _standalone_question(state: AgentState):
+    """
+    Pergunta que abre a conversa (sem histórico nem resumo), ou None.
     
-    return {"messages": [llm_with_tools.invoke([financial_agent_msg] + messages)]}
+    Só essas entram no cache de respostas: num follow-up ("e no trimestre
+    anterior?") a mesma frase pede respostas diferentes conforme o histórico.
+    """
+    messages = state["messages"]
+    if state.get("summary") or len(messages) != 1 or not isinstance(messages[0], HumanMessage):
+        return None
+    question = messages[0].content
+    return question.strip() if isinstance(question, str) and question.strip() else None
+
+def check_answer_cache(state: AgentState, config=None):
+    """
+    Responde direto do cache semântico quando uma pergunta equivalente já foi respondida
+    com a versão atual da coleção (sem chamar o LLM).
+    
+    `config["configurable"]["bypass_answer_cache"] = True` ignora o cache nesta
+    pergunta (a resposta nova substitui a guardada).
+    """
+    question = _standalone_question(state)
+    if not ANSWER_CACHE_ENABLED or question is None:
+        return {"answer_cache": {"status": "skip"}}
+    
+    db = get_vector_db()
+    embedding = db.embed_query(question)
+    cache_state = {"query": question, "version": list(db.manifest.version)}
+    if ((config or {}).get("configurable") or {}).get("bypass_answer_cache"):
+        metrics.increment("answer_cache_lookups", result="bypass")
+        return {"answer_cache": {**cache_state, "status": "bypass"}}
+    
+    hit = get_answer_cache().lookup(embedding, tuple(cache_state["version"]))
+    if hit is None:
+        return {"answer_cache": {**cache_state, "status": "miss"}}
+    return {
+        "messages": [AIMessage(content=hit["answer"])],
+        "answer_cache": {**cache_state, "status": "hit", "cached_query": hit["query"],
+                         "similarity": hit["similarity"], "age_s": hit["age_s"]}
+    }
+
+def route_after_cache(state: AgentState):
+    """Encerra se a resposta veio do cache; senão segue o fluxo normal (resumo ou agente)."""
+    if (state.get("answer_cache") or {}).get("status") == "hit":
+        return "end"
+    return should_summarize(state)
+
+def store_answer(state: AgentState):
+    """Guarda no cache a resposta final (do agente ou do retriever) de uma pergunta que abriu a conversa."""
+    cache_state = state.get("answer_cache") or {}
+    if cache_state.get("status") not in ("miss", "bypass"):
+        return {}
+    
+    last_message = state["messages"][-1]
+    answer = last_message.content
+    if (
+        getattr(last_message, "tool_calls", None)
+        or not isinstance(answer, str)
+        or not answer.strip()
+        or answer.lstrip("*").startswith("❌")  # Erros e buscas sem resultado não são reaproveitados
+    ):
+        return {}
+    
+    # Versão lida antes da geração: se a coleção mudou no meio, a resposta já nasce desatualizada
+    embedding = get_vector_db().embed_query(cache_state["query"])
+    get_answer_cache().store(cache_state["query"], embedding, answer, tuple(cache_state["version"]))
+    return {"answer_cache": {**cache_state, "status": "stored"}}
 
 def should_continue(state: AgentState):
     """Decide se deve continuar ou terminar."""
@@ -68,10 +257,9 @@ def grade_documents(state: AgentState):
         "index": state.get("index", "")
     }
 
-def generate(state: AgentState):
-    """Gera resposta final baseada nos documentos recuperados."""
+def _generate_messages(state: AgentState):
+    """Prompt da geração final a partir do que foi recuperado; None se não há contexto."""
     docs = state.get("docs", [])
-    messages = state.get("messages", [])
     retrieved_doc = state.get("retrieved_doc", "")
     similarity_score = state.get("similarity_score", 0.0)
     confidence = state.get("confidence", "baixa")
@@ -84,17 +272,79 @@ def generate(state: AgentState):
             confidence=confidence,
             similarity_score=similarity_score
         )
-        response = llm.invoke([SystemMessage(content=prompt)] + messages)
     elif docs:
         # Sistema tradicional (fallback)
         docs_string = "\\n".join([f"Documento: {doc.page_content}" for doc in docs])
         prompt = f"Baseado nos documentos: {docs_string}\\n\\nResponda à pergunta do usuário."
-        response = llm.invoke([SystemMessage(content=prompt)] + messages)
     else:
-        response = AIMessage(content="Não encontrei informações suficientes para responder.")
-   
+        return None
+    return [SystemMessage(content=prompt)] + _history(state)
+
+_NO_CONTEXT_ANSWER = "Não encontrei informações suficientes para responder."
+
+def generate(state: AgentState):
+    """Gera resposta final baseada nos documentos recuperados."""
+    messages = _generate_messages(state)
+    response = llm.invoke(messages) if messages else AIMessage(content=_NO_CONTEXT_ANSWER)
+    return {"messages": [response]}
+
+async def agenerate(state: AgentState):
+    """Versão async de generate (usada por graph.ainvoke/astream)."""
+    messages = _generate_messages(state)
+    response = await llm.ainvoke(messages) if messages else AIMessage(content=_NO_CONTEXT_ANSWER)
     return {"messages": [response]}
 
+# =============================================================================
+# CAMINHO RÁPIDO (GRAPH_MODE=fast)
+# =============================================================================
+
+def _last_question(state: AgentState) -> str:
+    question = next((m.content for m in reversed(state["messages"]) if isinstance(m, HumanMessage)), "")
+    return question if isinstance(question, str) else ""
+
+def _retrieval_update(question: str, chunks):
+    """Contexto montado dos chunks + confiança do melhor resultado (confidence_grade)."""
+    if not chunks:
+        return {"query": question, "retrieved_doc": "", "similarity_score": 0.0, "confidence": "baixa"}
+    graded = confidence_grade({"similarity_score": chunks[0]["similarity"]})
+    return {
+        "query": question,
+        "retrieved_doc": build_context(question, chunks),
+        "similarity_score": graded["similarity_score"],
+        "confidence": graded["confidence"]
+    }
+
+def retrieve_context(state: AgentState):
+    """
+    Busca direto pela mensagem do usuário, sem uma chamada ao LLM para decidir usar o retriever.
+    
+    Instituição e período citados na pergunta viram pré-filtro (question_where);
+    se o filtro não encontrar nada, busca em todos os documentos.
+    """
+    question = _last_question(state)
+    where = question_where(question)
+    chunks = retrieve(question, k=CONTEXT_CHUNKS, where=where)
+    if not chunks and where:
+        chunks = retrieve(question, k=CONTEXT_CHUNKS)
+    return _retrieval_update(question, chunks)
+
+async def aretrieve_context(state: AgentState):
+    """Versão async de retrieve_context (busca no pool de threads do retriever)."""
+    question = _last_question(state)
+    where = question_where(question)
+    chunks = await aretrieve(question, k=CONTEXT_CHUNKS, where=where)
+    if not chunks and where:
+        chunks = await aretrieve(question, k=CONTEXT_CHUNKS)
+    return _retrieval_update(question, chunks)
+
+def route_fast_path(state: AgentState):
+    """Resposta do cache encerra; senão busca e, se o histórico passou do orçamento, resume em paralelo."""
+    if (state.get("answer_cache") or {}).get("status") == "hit":
+        return "end"
+    if should_summarize(state) == "summarize_conversation":
+        return ["retrieve", "summarize_conversation"]
+    return ["retrieve"]
+
 # =============================================================================
 # NODES RAG FINANCEIRO
 # =============================================================================
@@ -115,14 +365,22 @@ def semantic_retrieve(state: AgentState):
     if not query:
         return {"retrieved_doc": "", "similarity_score": 0.0, "confidence": "baixa"}
     
-    result = semantic_search.invoke({"query": query})
+    start_time = time.perf_counter()
+    chunks = semantic_search.invoke({"query": query})
+    retrieval_ms = (time.perf_counter() - start_time) * 1000
+    
+    if not chunks:
+        return {"query": query, "retrieved_doc": "", "similarity_score": 0.0, "confidence": "baixa",
+                "retrieval_metrics": {"retrieval_ms": round(retrieval_ms, 3)}}
     
+    best_chunk = chunks[0]
+    graded = confidence_grade({"similarity_score": best_chunk["similarity"]})
     return {
         "query": query,
-        "retrieved_doc": result["document"],
-        "similarity_score": result["similarity_score"],
-        "confidence": result["confidence"],
-        "retrieval_metrics": {"retrieval_time": result["retrieval_time"]}
+        "retrieved_doc": best_chunk["content"],
+        "similarity_score": best_chunk["similarity"],
+        "confidence": graded["confidence"],
+        "retrieval_metrics": {"retrieval_ms": round(retrieval_ms, 3)}
     }
 
 def confidence_grade(state: AgentState):
@@ -151,5 +409,5 @@ def confidence_grade(state: AgentState):
 
 # Usar ToolNode padrão do LangGraph
 tool_node = ToolNode(tools)
-financial_tools = [financial_reports_retriever_tool] 
+financial_tools = [financial_reports_retriever_tool, financial_figures_tool]
 financial_tool_node = ToolNode(financial_tools)
\ No newline at end of file
@@ -0,0 +1,271 @@
+"""
+Extração de texto dos arquivos (TXT, MD, PDF, DOCX) para a ingestão.
+
+Fica fora de tools.py para que os processos do pool de extração (spawn) não
+precisem importar ChromaDB, LangChain e o restante da aplicação.
+
+Em pastas grandes, PDFs e DOCX (os formatos caros) são extraídos por um pool de
+processos e chegam à indexação em lotes de páginas por uma fila limitada: a
+memória fica limitada a alguns lotes por arquivo em andamento, qualquer que seja
+o tamanho dos documentos. TXT e MD são lidos em fluxo no próprio processo.
+
+Uploads (bytes em memória) de PDF e DOCX também são extraídos fora do processo
+do aplicativo, num processo dedicado: o PyPDF2 é Python puro e, numa thread,
+disputaria o GIL com o Streamlit durante toda a extração.
+"""
+
+import io
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional, Tuple
+
+# Configurações
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))
+PARSE_BATCH_PAGES = 16     # Páginas (PDF) ou parágrafos (DOCX) por lote enviado pelo pool
+PARSE_QUEUE_BATCHES = 4    # Lotes prontos por arquivo antes de o worker esperar a indexação
+POOL_FORMATS = ('.pdf', '.docx', '.doc')        # Extraídos no pool de processos
+SUPPORTED_FORMATS = ('.txt', '.md', '.pdf', '.docx')  # Padrões da indexação de pastas
+
+
+class ParseError(Exception):
+    """Falha na extração de um arquivo (a mensagem já identifica o arquivo)."""
+
+
+def iter_file_content(file_path, data: Optional[bytes] = None) -> Iterator[str]:
+    """
+    Lê um arquivo em partes, sem montar o documento inteiro em memória.
+    
+    PDFs são lidos página a página; DOCX, TXT e MD parágrafo a parágrafo.
+    
+    Args:
+        file_path: Caminho para o arquivo (com `data`, só o nome, que define o formato)
+        data: Conteúdo já em memória (ex: upload do Streamlit); lido do buffer, sem tocar o disco
+        
+    Returns:
+        Iterador com as partes do texto (cada uma terminada em quebra de linha)
+        
+    Raises:
+        ImportError: Biblioteca do formato não instalada
+        ValueError: Formato de arquivo não suportado
+    """
+    file_path = Path(file_path)
+    suffix = file_path.suffix.lower()
+    
+    if suffix in ['.txt', '.md']:
+        if data is not None:
+            stream = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8')
+        else:
+            stream = open(file_path, 'r', encoding='utf-8')
+        with stream as f:
+            paragraph = []
+            for line in f:
+                paragraph.append(line)
+                # Fechar parágrafo em linha em branco (ou a cada 100 linhas)
+                if not line.strip() or len(paragraph) >= 100:
+                    yield "".join(paragraph)
+                    paragraph = []
+            if paragraph:
+                yield "".join(paragraph)
+                
+    elif suffix == '.pdf':
+        try:
+            import PyPDF2
+        except ImportError:
+            raise ImportError("PyPDF2 não instalado. Para processar PDFs: pip install PyPDF2")
+        with (io.BytesIO(data) if data is not None else open(file_path, 'rb')) as f:
+            reader = PyPDF2.PdfReader(f)
+            for page in reader.pages:
+                extracted = page.extract_text()
+                if extracted:  # Verificar se extraiu texto
+                    yield extracted + "\n"
+                    
+    elif suffix in ['.docx', '.doc']:
+        try:
+            import docx
+        except ImportError:
+            raise ImportError("python-docx não instalado. Para processar Word: pip install python-docx")
+        doc = docx.Document(io.BytesIO(data) if data is not None else file_path)
+        for paragraph in doc.paragraphs:
+            yield paragraph.text + "\n"
+            
+    else:
+        raise ValueError(f"Formato de arquivo não suportado: {file_path.suffix}")
+
+
+def _error_message(file_path: Path, error: Exception) -> str:
+    if isinstance(error, (ImportError, ValueError)):
+        return str(error)
+    return f"Erro ao ler {file_path.name}: {type(error).__name__}: {error}"
+
+
+def _parse_to_queue(file_path, batches, batch_pages: int, data: Optional[bytes] = None):
+    """Extrai um arquivo no worker do pool, enviando lotes de partes pela fila (None encerra)."""
+    try:
+        batch = []
+        for part in iter_file_content(file_path, data=data):
+            batch.append(part)
+            if len(batch) >= batch_pages:
+                batches.put(batch)  # Fila cheia: espera a indexação consumir
+                batch = []
+        if batch:
+            batches.put(batch)
+    finally:
+        batches.put(None)
+
+
+def _iter_local(file_path: Path, data: Optional[bytes] = None) -> Iterator[str]:
+    """Partes de um arquivo lido no próprio processo; erros de leitura viram ParseError."""
+    try:
+        yield from iter_file_content(file_path, data=data)
+    except Exception as e:
+        raise ParseError(_error_message(file_path, e)) from e
+
+
+def _iter_batches(future: Future, batches, file_path: Path) -> Iterator[str]:
+    """Partes de um arquivo extraído no pool, à medida que os lotes chegam pela fila."""
+    while True:
+        try:
+            batch = batches.get(timeout=1)
+        except queue.Empty:
+            if future.done() and future.exception() is not None:
+                # Worker morreu (ou falhou antes de encerrar a fila)
+                raise ParseError(_error_message(file_path, future.exception()))
+            continue
+        if batch is None:
+            break
+        yield from batch
+    try:
+        future.result()
+    except Exception as e:
+        raise ParseError(_error_message(file_path, e)) from e
+
+
+def iter_parsed_files(
+    items: Iterable[Tuple[Any, Path, bool]],
+    workers: int = PARSE_WORKERS
+) -> Iterator[Tuple[Any, Path, Optional[Iterator[str]]]]:
+    """
+    Extrai o texto de vários arquivos, PDFs e DOCX em paralelo.
+
+    Cada arquivo é entregue como um iterador das partes do texto, consumido
+    enquanto a extração continua. Arquivos do pool ficam limitados a
+    PARSE_QUEUE_BATCHES lotes de PARSE_BATCH_PAGES partes prontos; com
+    workers=1 ou em TXT/MD, as partes são lidas em fluxo no próprio processo.
+
+    Args:
+        items: (chave, caminho, extrair?) — itens com extrair=False são repassados sem leitura
+        workers: Processos do pool de extração (1 = tudo no próprio processo)
+
+    Returns:
+        Iterador de (chave, caminho, partes do texto ou None). Consumir as partes
+        pode levantar ParseError (o arquivo não pôde ser lido, inteiro ou a partir
+        de alguma página); arquivos já extraídos por inteiro são entregues primeiro
+    """
+    workers = max(1, workers)
+    max_in_flight = workers * 2
+    pool: Optional[ProcessPoolExecutor] = None
+    manager = None
+    pending = {}  # future -> (chave, caminho, fila de lotes), na ordem de envio
+
+    def new_pool() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def next_ready() -> Tuple[Any, Path, Iterator[str]]:
+        # Um arquivo já extraído por inteiro, senão o mais antigo (os lotes dele chegam em fluxo)
+        future = next((future for future in pending if future.done()), next(iter(pending)))
+        key, file_path, batches = pending.pop(future)
+        return key, file_path, _iter_batches(future, batches, file_path)
+
+    try:
+        for key, file_path, parse in items:
+            file_path = Path(file_path)
+            if not parse:
+                yield key, file_path, None
+                continue
+
+            if workers == 1 or file_path.suffix.lower() not in POOL_FORMATS:
+                yield key, file_path, _iter_local(file_path)
+                continue
+
+            if pool is None:
+                pool = new_pool()
+                manager = multiprocessing.get_context("spawn").Manager()
+            # Limitar arquivos em andamento: entregar um antes de enviar mais
+            if len(pending) >= max_in_flight:
+                yield next_ready()
+            batches = manager.Queue(maxsize=PARSE_QUEUE_BATCHES)
+            try:
+                future = pool.submit(_parse_to_queue, file_path, batches, PARSE_BATCH_PAGES)
+            except BrokenProcessPool:
+                # Um worker morreu (ex: arquivo que derruba o parser): os arquivos que estavam
+                # nele saem com erro e a extração segue num pool novo
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = new_pool()
+                future = pool.submit(_parse_to_queue, file_path, batches, PARSE_BATCH_PAGES)
+            pending[future] = (key, file_path, batches)
+
+        while pending:
+            yield next_ready()
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        if manager is not None:
+            # Libera workers ainda bloqueados numa fila que ninguém vai consumir
+            manager.shutdown()
+
+
+# Processo de extração dos uploads, criado sob demanda
+_upload_pool: Optional[ProcessPoolExecutor] = None
+_upload_manager = None
+_upload_lock = threading.Lock()
+
+
+def _submit_upload(file_path: Path, data: bytes) -> Tuple[Future, Any]:
+    global _upload_pool, _upload_manager
+    with _upload_lock:
+        if _upload_manager is None:
+            _upload_manager = multiprocessing.get_context("spawn").Manager()
+        batches = _upload_manager.Queue(maxsize=PARSE_QUEUE_BATCHES)
+        for _ in range(2):
+            if _upload_pool is None:
+                _upload_pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+            try:
+                return _upload_pool.submit(_parse_to_queue, file_path, batches, PARSE_BATCH_PAGES, data), batches
+            except BrokenProcessPool:
+                # O processo morreu num upload anterior: recriar
+                _upload_pool.shutdown(wait=False, cancel_futures=True)
+                _upload_pool = None
+        raise ParseError(f"Erro ao ler {file_path.name}: processo de extração indisponível")
+
+
+def iter_upload_content(file_path, data: bytes) -> Iterator[str]:
+    """
+    Partes do texto de um arquivo em memória (ex: upload do Streamlit).
+
+    PDFs e DOCX são extraídos no processo dedicado aos uploads e chegam em
+    lotes pela fila limitada; TXT e MD são lidos do buffer no próprio processo.
+
+    Raises:
+        ParseError: O arquivo não pôde ser lido (inteiro ou a partir de alguma página)
+    """
+    file_path = Path(file_path)
+    if file_path.suffix.lower() not in POOL_FORMATS:
+        yield from _iter_local(file_path, data)
+        return
+    future, batches = _submit_upload(file_path, data)
+    try:
+        yield from _iter_batches(future, batches, file_path)
+    finally:
+        # Consumo interrompido: o worker não fica preso numa fila que ninguém lê
+        if not future.done():
+            future.cancel()
+            while not future.done():
+                try:
+                    batches.get(timeout=1)
+                except queue.Empty:
+                    pass
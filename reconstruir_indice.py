@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+🔁 Reconstrução do Índice HNSW
+==============================
+
+Recria a coleção do ChromaDB com novos parâmetros HNSW (distância, M,
+ef_construction, ef_search) copiando documentos, metadados e embeddings da
+coleção atual: os arquivos de origem não são relidos nem re-embedados.
+
+Sem argumentos, aplica a configuração de tools.py (variáveis HNSW_SPACE, HNSW_M,
+HNSW_EF_CONSTRUCTION e HNSW_EF_SEARCH). Se só o ef_search mudou, a coleção é
+apenas ajustada, sem cópia.
+
+Uso:
+    python reconstruir_indice.py --space cosine --m 32 --ef-construction 200 --ef-search 64
+    python reconstruir_indice.py --ef-search 200     # só ajusta a busca
+
+Para escolher os valores: python -m benchmarks.hnsw_sweep
+"""
+
+import argparse
+import sys
+
+CONFIG_NOTE = ("   ℹ️ Defina HNSW_SPACE/HNSW_M/HNSW_EF_CONSTRUCTION/HNSW_EF_SEARCH com os novos valores: "
+               "ao abrir o banco o aplicativo reaplica o ef_search configurado e avisa das demais diferenças")
+
+
+def main():
+    from tools import (
+        HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH, HNSW_M, HNSW_SPACE, HNSW_SPACES, WRITE_BATCH_SIZE, get_vector_db
+    )
+
+    parser = argparse.ArgumentParser(description="Reconstrói a coleção com novos parâmetros HNSW")
+    parser.add_argument("--space", choices=HNSW_SPACES, default=HNSW_SPACE, help="Distância do índice")
+    parser.add_argument("--m", type=int, default=HNSW_M, help="Vizinhos por nó do grafo")
+    parser.add_argument("--ef-construction", type=int, default=HNSW_EF_CONSTRUCTION, help="Candidatos na inserção")
+    parser.add_argument("--ef-search", type=int, default=HNSW_EF_SEARCH, help="Candidatos na busca")
+    parser.add_argument("--batch-size", type=int, default=WRITE_BATCH_SIZE, help="Chunks copiados por lote")
+    parser.add_argument("--yes", action="store_true", help="Não pedir confirmação")
+    args = parser.parse_args()
+
+    print("🔁 Reconstrução do Índice HNSW")
+    print("=" * 40)
+
+    db = get_vector_db()
+    stats = db.get_stats()
+    current = stats["hnsw"]
+    wanted = {"space": args.space, "max_neighbors": args.m,
+              "ef_construction": args.ef_construction, "ef_search": args.ef_search}
+    configured = (args.space, args.m, args.ef_construction, args.ef_search) == (
+        HNSW_SPACE, HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH
+    )
+
+    print(f"\n📊 Coleção '{stats['collection_name']}': {stats['total_documents']} documentos")
+    for key, value in wanted.items():
+        marker = "" if current.get(key) == value else "  ⬅️ muda"
+        print(f"   {key}: {current.get(key)} -> {value}{marker}")
+
+    if current == {**current, **wanted}:
+        print("\n✅ Índice já está com essa configuração")
+        return
+
+    if all(current.get(key) == wanted[key] for key in ("space", "max_neighbors", "ef_construction")):
+        db.set_ef_search(args.ef_search)
+        print(f"\n✅ ef_search ajustado para {args.ef_search} (sem reconstruir)")
+        if not configured:
+            print(CONFIG_NOTE)
+        return
+
+    if not args.yes:
+        confirm = input(f"\n⚠️ Copiar {stats['total_documents']} chunks para um novo índice? (s/N): ").strip().lower()
+        if confirm not in ['s', 'sim', 'y', 'yes']:
+            print("   ⏹️ Operação cancelada")
+            return
+
+    print("\n🔨 Reconstruindo...")
+    result = db.rebuild_collection(
+        space=args.space, m=args.m, ef_construction=args.ef_construction,
+        ef_search=args.ef_search, batch_size=args.batch_size
+    )
+    if result["status"] != "success":
+        print(f"   ❌ {result['message']}")
+        sys.exit(1)
+    print(f"   ✅ {result['message']} em {result['seconds']}s")
+    if not configured:
+        print(CONFIG_NOTE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Reranking dos candidatos da busca com um cross-encoder local (ONNX, CPU).
+
+A busca (vetorial, BM25 ou híbrida) traz RERANK_CANDIDATES candidatos e o
+cross-encoder pontua cada par (pergunta, chunk) lendo os dois textos juntos, o que
+é mais preciso que comparar embeddings; os candidatos são então reordenados. Todos
+os pares vão numa única chamada ao modelo.
+
+Desligado por padrão: com RERANK=1 o modelo é baixado do Hugging Face (ou lido
+de RERANKER_MODEL_DIR) no primeiro uso. O reranking tem orçamento de latência
+(RERANK_BUDGET_MS): se estourar, ou se o modelo não estiver disponível, a ordem
+original da busca é mantida.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import metrics
+from cache import LRUCache
+
+# Configurações
+RERANK_ENABLED = os.getenv("RERANK", "0") == "1"  # Opcional: baixa o modelo do Hugging Face no primeiro uso
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")  # Repositório no Hugging Face
+RERANKER_MODEL_DIR = os.getenv("RERANKER_MODEL_DIR")  # Pasta com model.onnx e tokenizer.json (sem download)
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "30"))      # Candidatos buscados para reordenar
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "250"))     # Acima disso, fica a ordem da busca
+RERANK_WORKERS = int(os.getenv("RERANK_WORKERS", "2"))             # Inferências simultâneas
+RERANK_MAX_LENGTH = 256    # Tokens por par (pergunta + chunk)
+RERANK_CACHE_SIZE = 256    # Scores por (pergunta, candidatos)
+
+ScoreFn = Callable[[str, Sequence[str]], np.ndarray]
+
+
+class CrossEncoderReranker:
+    """
+    Cross-encoder ONNX (padrão: ms-marco-MiniLM-L-6-v2) carregado no primeiro uso.
+
+    Args:
+        model: Repositório do modelo no Hugging Face (onnx/model.onnx + tokenizer.json)
+        model_dir: Pasta local com model.onnx e tokenizer.json; dispensa o download
+        budget_ms: Orçamento de latência do reranking (inclui a espera por um worker)
+        score_pairs: Função de score alternativa (pergunta, textos) -> scores
+    """
+
+    def __init__(self, model: str = RERANKER_MODEL, model_dir: Optional[str] = RERANKER_MODEL_DIR,
+                 budget_ms: float = RERANK_BUDGET_MS, max_length: int = RERANK_MAX_LENGTH,
+                 workers: int = RERANK_WORKERS, score_pairs: Optional[ScoreFn] = None):
+        self.model = model
+        self.model_dir = model_dir
+        self.budget_ms = budget_ms
+        self.max_length = max_length
+        self._score_pairs = score_pairs
+        self._session = None
+        self._tokenizer = None
+        self._input_names: Tuple[str, ...] = ()
+        self._available: Optional[bool] = True if score_pairs else None
+        self._load_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(workers)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rerank")
+        self._cache = LRUCache(RERANK_CACHE_SIZE)
+
+    def _model_files(self) -> Tuple[Path, Path]:
+        if self.model_dir:
+            return Path(self.model_dir) / "model.onnx", Path(self.model_dir) / "tokenizer.json"
+        from huggingface_hub import hf_hub_download
+        return (
+            Path(hf_hub_download(self.model, "onnx/model.onnx")),
+            Path(hf_hub_download(self.model, "tokenizer.json"))
+        )
+
+    def available(self) -> bool:
+        """
+        True se o modelo já está carregado.
+
+        Nunca bloqueia a consulta: na primeira chamada o carregamento (que pode
+        incluir o download) começa em background e as buscas seguem sem reranking
+        até ele terminar.
+        """
+        if self._available is None and not self._load_lock.locked():
+            threading.Thread(target=self.load, daemon=True, name="rerank-load").start()
+        return bool(self._available)
+
+    def load(self) -> bool:
+        """Carrega modelo e tokenizer (uma vez); False se não for possível (ex: sem rede nem cache)."""
+        if self._available is not None:
+            return self._available
+        with self._load_lock:
+            if self._available is None:
+                try:
+                    import onnxruntime as ort
+                    from tokenizers import Tokenizer
+
+                    model_path, tokenizer_path = self._model_files()
+                    options = ort.SessionOptions()
+                    options.log_severity_level = 3
+                    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                    self._session = ort.InferenceSession(
+                        str(model_path), sess_options=options, providers=["CPUExecutionProvider"]
+                    )
+                    self._input_names = tuple(node.name for node in self._session.get_inputs())
+
+                    tokenizer = Tokenizer.from_file(str(tokenizer_path))
+                    tokenizer.enable_truncation(max_length=self.max_length, strategy="only_second")
+                    pad_id = tokenizer.token_to_id("[PAD]") or 0
+                    tokenizer.enable_padding(pad_id=pad_id, pad_token="[PAD]")
+                    self._tokenizer = tokenizer
+                    self._available = True
+                except Exception as e:
+                    print(f"⚠️ Reranker indisponível, mantendo a ordem da busca: {e}")
+                    self._available = False
+        return self._available
+
+    def score(self, query: str, passages: Sequence[str]) -> np.ndarray:
+        """Score de relevância de cada texto para a pergunta (uma inferência para todos os pares)."""
+        if self._score_pairs:
+            return np.asarray(self._score_pairs(query, passages), dtype=np.float32)
+
+        encodings = self._tokenizer.encode_batch([(query, passage) for passage in passages])
+        features = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+        }
+        logits = self._session.run(None, {name: features[name] for name in self._input_names})[0]
+        # Modelos de um logit (ms-marco) ou de duas classes (usa a classe "relevante")
+        return logits.reshape(len(passages), -1)[:, -1]
+
+    def _timed_score(self, query: str, passages: Sequence[str]) -> np.ndarray:
+        try:
+            with metrics.timer("rerank_ms"):
+                return self.score(query, passages)
+        finally:
+            self._slots.release()
+
+    def rerank(self, query: str, chunks: List[Dict], top_k: int) -> List[Dict]:
+        """
+        Reordena os chunks pelo cross-encoder e devolve os top_k.
+
+        Se o modelo não estiver disponível, se não houver worker livre ou se a
+        inferência não terminar dentro do orçamento, devolve os top_k na ordem
+        da busca (a inferência atrasada termina em background e libera o worker).
+        """
+        if len(chunks) <= 1 or not self.available():
+            return chunks[:top_k]
+
+        cache_key = (query, tuple(chunk["id"] for chunk in chunks))
+        scores = self._cache.get(cache_key)
+        if scores is None:
+            deadline = time.perf_counter() + self.budget_ms / 1000
+            if not self._slots.acquire(timeout=self.budget_ms / 1000):
+                metrics.increment("rerank_fallbacks", reason="busy")
+                return chunks[:top_k]
+            # Copiar o contexto: a latência do reranking entra no trace do nó
+            future = self._executor.submit(
+                contextvars.copy_context().run, self._timed_score, query, [chunk["content"] for chunk in chunks]
+            )
+            try:
+                scores = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+            except FutureTimeout:
+                metrics.increment("rerank_fallbacks", reason="budget")
+                return chunks[:top_k]
+            except Exception as e:
+                print(f"⚠️ Erro no reranking, mantendo a ordem da busca: {e}")
+                metrics.increment("rerank_fallbacks", reason="error")
+                return chunks[:top_k]
+            self._cache.put(cache_key, scores)
+
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return [
+            {**chunks[index], "rerank_score": float(scores[index]), "rank": rank}
+            for rank, index in enumerate(order, 1)
+        ]
+
+
+# Instância global, criada sob demanda
+_reranker: Optional[CrossEncoderReranker] = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> CrossEncoderReranker:
+    """Retorna o reranker global (o modelo só é carregado no primeiro reranking)."""
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = CrossEncoderReranker()
+    return _reranker
@@ -0,0 +1,38 @@
+"""
+Configuração comum dos testes.
+
+Os módulos do projeto ficam na raiz do repositório (sem pacote); os testes nunca
+tocam ./chromadb_storage nem os bancos SQLite locais, e não acessam a rede.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Antes de qualquer import do projeto: caminhos padrão num diretório temporário
+_TMP = tempfile.mkdtemp(prefix="rag_tests_")
+os.environ.setdefault("CHROMADB_PATH", os.path.join(_TMP, "chromadb"))
+os.environ.setdefault("CHECKPOINT_DB", os.path.join(_TMP, "checkpoints.sqlite"))
+os.environ.setdefault("INGEST_QUEUE_DB", os.path.join(_TMP, "ingest_queue.sqlite"))
+os.environ.setdefault("OPENAI_API_KEY", "test")  # O LLM nunca é chamado
+os.environ["RERANK"] = "0"
+os.environ["COMPACT_VECTORS"] = "0"
+
+
+@pytest.fixture
+def vector_db(tmp_path, monkeypatch):
+    """SimpleVectorDB num diretório próprio, com embeddings por hashing (sem baixar o modelo)."""
+    import tools
+    from benchmarks.retrieval import HashingEmbeddingFunction
+    from chunking import get_chunker
+
+    monkeypatch.setattr(tools, "CHROMADB_PATH", str(tmp_path / "chromadb"))
+    db = tools.SimpleVectorDB(chunker=get_chunker("section"))
+    db.embedding_function = HashingEmbeddingFunction()
+    return db
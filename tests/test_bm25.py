@@ -0,0 +1,86 @@
+"""BM25Index e reciprocal_rank_fusion: ordenação, atualização incremental e persistência."""
+
+import pytest
+
+from bm25 import RRF_K, BM25Index, reciprocal_rank_fusion, tokenize
+
+DOCUMENTS = [
+    ("itau", "Itaú: Inadimplência 90+ dias: 2,9%. Coverage ratio: 285%. Lucro líquido recorrente."),
+    ("bradesco", "Bradesco: lucro líquido ajustado de R$ 5.624 milhões no trimestre."),
+    ("santander", "Santander: índice de eficiência de 38%, margem financeira em alta."),
+    ("nubank", "Nubank: clientes ativos e receita, sem menção a coverage."),
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25_index.pkl"))
+    index.add(DOCUMENTS)
+    return index
+
+
+def test_tokenize_folds_accents_and_drops_stop_words():
+    assert tokenize("Inadimplência 90+ dias do Itaú") == ["inadimplencia", "90", "dias", "itau"]
+
+
+def test_search_ranks_exact_terms_first(index):
+    ranking = [doc_id for doc_id, _ in index.search("coverage ratio", k=4)]
+
+    # "coverage" e "ratio" no Itaú; só "coverage" no Nubank; os demais não pontuam
+    assert ranking == ["itau", "nubank"]
+
+
+def test_rare_terms_weigh_more(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25_index.pkl"))
+    index.add([("a", "lucro trimestre"), ("b", "lucro eficiencia"), ("c", "lucro margem")])
+
+    ranking = index.search("lucro eficiencia", k=3)
+
+    # Mesmo tamanho e frequência: "eficiencia" (em um documento) decide; "lucro" (em todos) quase não pesa
+    assert ranking[0][0] == "b"
+    assert ranking[0][1] > 2 * ranking[1][1]
+
+
+def test_allowed_restricts_candidates(index):
+    assert [doc_id for doc_id, _ in index.search("lucro liquido", allowed={"bradesco"})] == ["bradesco"]
+    assert index.search("lucro liquido", allowed=set()) == []
+
+
+def test_add_replaces_and_remove_forgets(index):
+    index.add([("nubank", "Nubank: coverage ratio coverage ratio coverage ratio")])
+    assert index.search("coverage ratio", k=1)[0][0] == "nubank"
+    assert len(index) == len(DOCUMENTS)
+
+    index.remove(["nubank", "inexistente"])
+    assert [doc_id for doc_id, _ in index.search("coverage ratio")] == ["itau"]
+    assert len(index) == len(DOCUMENTS) - 1
+    assert index.total_length == sum(index.doc_lengths.values())
+
+
+def test_save_and_load(index, tmp_path):
+    index.save()
+
+    reloaded = BM25Index(str(tmp_path / "bm25_index.pkl"))
+
+    assert reloaded.search("coverage ratio") == index.search("coverage ratio")
+    assert len(reloaded) == len(index)
+
+
+def test_rrf_orders_by_summed_reciprocal_ranks():
+    fused = reciprocal_rank_fusion(["a", "b", "c"], ["b", "d"])
+
+    assert [doc_id for doc_id, _ in fused] == ["b", "a", "d", "c"]
+    scores = dict(fused)
+    assert scores["b"] == pytest.approx(1 / (RRF_K + 2) + 1 / (RRF_K + 1))
+    assert scores["a"] == pytest.approx(1 / (RRF_K + 1))
+    assert scores["c"] == pytest.approx(1 / (RRF_K + 3))
+
+
+def test_rrf_document_in_both_rankings_beats_single_top_hit():
+    fused = reciprocal_rank_fusion(["solo", "both"], ["both"], k=60)
+
+    assert fused[0][0] == "both"
+
+
+def test_rrf_single_ranking_keeps_order():
+    assert [doc_id for doc_id, _ in reciprocal_rank_fusion(["x", "y", "z"])] == ["x", "y", "z"]
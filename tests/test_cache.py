@@ -0,0 +1,93 @@
+"""LRUCache e os caches de busca do SimpleVectorDB, invalidados pela versão da coleção."""
+
+import os
+
+from benchmarks.retrieval import as_document
+from cache import LRUCache
+from tools import DocumentManifest
+
+ITAU = as_document("itau.txt", "PRINCIPAIS INDICADORES:\n• Coverage ratio: 285%\n• Inadimplência 90+ dias: 2,9%\n")
+BRADESCO = as_document("bradesco.txt", "RESULTADOS:\n• Lucro líquido ajustado: R$ 5.624 milhões\n")
+SANTANDER = as_document("santander.txt", "EFICIÊNCIA:\n• Coverage ratio: 210%\n• Índice de eficiência: 38%\n")
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "a" passa a ser o mais recente
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats() == {"size": 2, "maxsize": 2, "hits": 3, "misses": 1, "hit_rate": 0.75}
+
+
+def test_lru_persists_between_instances(tmp_path):
+    path = tmp_path / "query_cache.pkl"
+    cache = LRUCache(maxsize=2, path=str(path))
+    for key in ("a", "b", "c"):
+        cache.put(key, key.upper())
+    cache.save()
+
+    reloaded = LRUCache(maxsize=2, path=str(path))
+
+    assert len(reloaded) == 2
+    assert reloaded.get("a") is None
+    assert reloaded.get("c") == "C"
+
+
+def test_search_results_are_cached_per_version(vector_db):
+    vector_db.add_documents([ITAU, BRADESCO])
+    version = vector_db.manifest.version
+
+    first = vector_db.search("coverage ratio", k=2, mode="hybrid")
+    second = vector_db.search("coverage ratio", k=2, mode="hybrid")
+
+    assert second == first
+    assert vector_db.result_cache.hits == 1
+    assert vector_db.manifest.version == version
+
+
+def test_ingest_changes_version_and_invalidates_results(vector_db):
+    vector_db.add_documents([ITAU, BRADESCO])
+    before = vector_db.search("coverage ratio", k=3, mode="bm25")
+    version = vector_db.manifest.version
+
+    vector_db.add_documents([SANTANDER])
+    after = vector_db.search("coverage ratio", k=3, mode="bm25")
+
+    assert vector_db.manifest.version != version
+    assert vector_db.result_cache.hits == 0
+    assert {chunk["metadata"]["source"] for chunk in before} == {"itau.txt"}
+    assert {chunk["metadata"]["source"] for chunk in after} == {"itau.txt", "santander.txt"}
+
+
+def test_unchanged_reingest_keeps_version_and_cache(vector_db):
+    vector_db.add_documents([ITAU, BRADESCO])
+    vector_db.search("coverage ratio", k=2, mode="hybrid")
+    version = vector_db.manifest.version
+
+    result = vector_db.add_documents([ITAU, BRADESCO])
+    vector_db.search("coverage ratio", k=2, mode="hybrid")
+
+    assert result["files_unchanged"] == 2
+    assert vector_db.manifest.version == version
+    assert vector_db.result_cache.hits == 1
+
+
+def test_write_by_another_process_invalidates_results(vector_db):
+    vector_db.add_documents([ITAU, BRADESCO])
+    vector_db.search("coverage ratio", k=2, mode="vector")
+
+    # Outro processo grava o manifesto: só o arquivo muda (writes deste processo não)
+    other = DocumentManifest(str(vector_db.manifest.path))
+    other.save()
+    stat = os.stat(other.path)
+    os.utime(other.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    vector_db.search("coverage ratio", k=2, mode="vector")
+
+    assert vector_db.result_cache.hits == 0
+    assert vector_db.result_cache.misses == 2
@@ -0,0 +1,120 @@
+"""SQLiteCheckpointer: gravação, leitura, listagem, compactação e remoção de threads."""
+
+from typing import TypedDict
+
+import pytest
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.graph import END, START, StateGraph
+
+from checkpointer import SQLiteCheckpointer
+
+
+def _config(thread_id: str, checkpoint_id: str = None) -> dict:
+    configurable = {"thread_id": thread_id, "checkpoint_ns": ""}
+    if checkpoint_id:
+        configurable["checkpoint_id"] = checkpoint_id
+    return {"configurable": configurable}
+
+
+def _checkpoint(**channel_values) -> dict:
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = channel_values
+    return checkpoint
+
+
+@pytest.fixture
+def saver(tmp_path):
+    return SQLiteCheckpointer(str(tmp_path / "checkpoints.sqlite"), keep_last=0)
+
+
+def test_put_get_round_trip(saver):
+    checkpoint = _checkpoint(summary="resumo", count=3)
+    saved = saver.put(_config("t1"), checkpoint, {"source": "loop", "step": 1}, {})
+    saver.put_writes(saved, [("messages", ["olá"])], task_id="task-1")
+
+    loaded = saver.get_tuple(_config("t1"))
+
+    assert loaded.config == saved
+    assert loaded.checkpoint["id"] == checkpoint["id"]
+    assert loaded.checkpoint["channel_values"] == {"summary": "resumo", "count": 3}
+    assert loaded.metadata["source"] == "loop"
+    assert loaded.metadata["step"] == 1
+    assert loaded.pending_writes == [("task-1", "messages", ["olá"])]
+    assert saver.get_tuple(_config("outra")) is None
+
+
+def test_get_by_id_and_parent(saver):
+    first = saver.put(_config("t1"), _checkpoint(n=1), {"step": 1}, {})
+    second = saver.put(first, _checkpoint(n=2), {"step": 2}, {})
+
+    latest = saver.get_tuple(_config("t1"))
+    assert latest.config == second
+    assert latest.parent_config == first
+
+    older = saver.get_tuple(first)
+    assert older.checkpoint["channel_values"] == {"n": 1}
+    assert older.parent_config is None
+
+
+def test_list_newest_first_with_filters(saver):
+    configs = []
+    config = _config("t1")
+    for step in range(4):
+        config = saver.put(config, _checkpoint(n=step), {"step": step, "source": "loop"}, {})
+        configs.append(config)
+    saver.put(_config("t2"), _checkpoint(n=0), {"step": 0}, {})
+
+    listed = [item.config for item in saver.list(_config("t1"))]
+    assert listed == configs[::-1]
+
+    assert [item.config for item in saver.list(_config("t1"), limit=2)] == configs[:1:-1]
+    assert [item.config for item in saver.list(_config("t1"), before=configs[2])] == configs[1::-1]
+    assert [item.metadata["step"] for item in saver.list(_config("t1"), filter={"step": 1})] == [1]
+    assert len(list(saver.list(None))) == 5
+
+
+def test_compaction_keeps_last_checkpoints(tmp_path):
+    saver = SQLiteCheckpointer(str(tmp_path / "checkpoints.sqlite"), keep_last=2)
+    config = _config("t1")
+    configs = []
+    for step in range(5):
+        config = saver.put(config, _checkpoint(n=step), {"step": step}, {})
+        saver.put_writes(config, [("messages", step)], task_id=f"task-{step}")
+        configs.append(config)
+
+    assert [item.config for item in saver.list(_config("t1"))] == [configs[4], configs[3]]
+    assert saver.get_tuple(configs[0]) is None
+    assert saver.get_tuple(_config("t1")).checkpoint["channel_values"] == {"n": 4}
+
+
+def test_delete_thread(saver):
+    saver.put(_config("t1"), _checkpoint(n=1), {}, {})
+    saver.put(_config("t2"), _checkpoint(n=2), {}, {})
+
+    saver.delete_thread("t1")
+
+    assert saver.get_tuple(_config("t1")) is None
+    assert saver.get_tuple(_config("t2")) is not None
+
+
+class _CounterState(TypedDict):
+    count: int
+
+
+def test_graph_state_survives_reopening(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+
+    def build(checkpointer):
+        builder = StateGraph(_CounterState)
+        builder.add_node("increment", lambda state: {"count": state.get("count", 0) + 1})
+        builder.add_edge(START, "increment")
+        builder.add_edge("increment", END)
+        return builder.compile(checkpointer=checkpointer)
+
+    config = {"configurable": {"thread_id": "conversa"}}
+    build(SQLiteCheckpointer(path)).invoke({"count": 1}, config)
+
+    # Outro processo (ou um reinício) continua a mesma conversa
+    reopened = build(SQLiteCheckpointer(path))
+    assert reopened.get_state(config).values == {"count": 2}
+    assert reopened.invoke({"count": 10}, config) == {"count": 11}
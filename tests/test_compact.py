@@ -0,0 +1,142 @@
+"""CompactVectorStore: gravação, remoção, busca em int8 com re-score e reconstrução a partir da coleção."""
+
+import numpy as np
+import pytest
+
+import compact
+from benchmarks.retrieval import as_document
+from compact import CompactVectorStore
+
+
+def _vectors(rows: int, dim: int = 32, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _exact(vectors: np.ndarray, query: np.ndarray, k: int) -> list:
+    return list(np.argsort(np.sum((vectors - query) ** 2, axis=1), kind="stable")[:k])
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CompactVectorStore(str(tmp_path / "compact_vectors"))
+
+
+def test_empty_store(store):
+    assert len(store) == 0
+    assert store.search(_vectors(1)[0], 5) == []
+
+
+def test_search_matches_exact_neighbours(store):
+    vectors = _vectors(300)
+    store.add([f"id{i}" for i in range(300)], vectors)
+
+    for query in _vectors(10, seed=1):
+        hits = store.search(query, 5, "l2", candidates=50)
+        assert [doc_id for doc_id, _ in hits] == [f"id{i}" for i in _exact(vectors, query, 5)]
+        # Com re-score, a distância é a exata em float32 (a mesma do ChromaDB)
+        expected = np.sum((vectors[int(hits[0][0][2:])] - query) ** 2)
+        assert hits[0][1] == pytest.approx(float(expected), rel=1e-5)
+
+
+@pytest.mark.parametrize("space", ["l2", "cosine", "ip"])
+def test_each_vector_finds_itself(store, space):
+    vectors = _vectors(100)
+    store.add([f"id{i}" for i in range(100)], vectors)
+
+    for i in (0, 42, 99):
+        assert store.search(vectors[i], 1, space)[0][0] == f"id{i}"
+        assert store.search(vectors[i], 1, space, rescore=False)[0][0] == f"id{i}"
+
+
+def test_remove_hides_rows(store):
+    vectors = _vectors(50)
+    store.add([f"id{i}" for i in range(50)], vectors)
+
+    store.remove(["id7", "id8", "inexistente"])
+
+    assert len(store) == 48
+    hits = store.search(vectors[7], 50, candidates=50)
+    assert "id7" not in {doc_id for doc_id, _ in hits}
+    assert len(hits) == 48
+
+
+def test_allowed_restricts_results(store):
+    vectors = _vectors(50)
+    store.add([f"id{i}" for i in range(50)], vectors)
+
+    hits = store.search(vectors[0], 5, allowed={"id3", "id4"})
+
+    assert {doc_id for doc_id, _ in hits} == {"id3", "id4"}
+
+
+def test_recalibration_keeps_codes_consistent(store, monkeypatch):
+    monkeypatch.setattr(compact, "CALIBRATION_ROWS", 40)
+    small = _vectors(20) * 0.1
+    store.add([f"small{i}" for i in range(20)], small)
+    scale = store.scale.copy()
+
+    # Vetores maiores antes de CALIBRATION_ROWS: a escala cresce e os códigos antigos são refeitos
+    large = _vectors(20, seed=2)
+    store.add([f"large{i}" for i in range(20)], large)
+
+    assert np.all(store.scale >= scale)
+    assert store.get_stats()["clipped_values"] == 0
+    for i in (0, 10, 19):
+        assert store.search(small[i], 1, "cosine", rescore=False)[0][0] == f"small{i}"
+        assert store.search(large[i], 1, "cosine", rescore=False)[0][0] == f"large{i}"
+
+    # Depois de CALIBRATION_ROWS a escala fica fixa
+    scale = store.scale.copy()
+    store.add(["extra"], _vectors(1, seed=3) * 10)
+    assert np.array_equal(store.scale, scale)
+    assert store.get_stats()["clipped_values"] > 0
+
+
+def test_recalibration_leaves_open_maps_intact(store, monkeypatch):
+    monkeypatch.setattr(compact, "CALIBRATION_ROWS", 40)
+    small = _vectors(20) * 0.1
+    store.add([f"small{i}" for i in range(20)], small)
+    opened = store._open()  # Memmaps de uma busca em andamento
+
+    store.add([f"large{i}" for i in range(20)], _vectors(20, seed=2))
+
+    # Os códigos abertos antes continuam os antigos, coerentes com a escala que veio com eles
+    decoded = opened["codes"].astype(np.float32) * opened["scale"]
+    assert np.allclose(decoded, small, atol=float(opened["scale"].max()))
+    assert not np.array_equal(opened["scale"], store.scale)
+
+
+def test_persists_and_clears(store, tmp_path):
+    vectors = _vectors(20)
+    store.add([f"id{i}" for i in range(20)], vectors)
+    store.remove(["id0"])
+
+    reopened = CompactVectorStore(str(tmp_path / "compact_vectors"))
+    assert len(reopened) == 19
+    assert reopened.search(vectors[5], 1)[0][0] == "id5"
+
+    reopened.clear()
+    assert len(reopened) == 0
+    assert reopened.scale is None
+
+
+def test_rebuild_into_empty_live_store(vector_db, tmp_path):
+    vector_db.compact = CompactVectorStore(str(tmp_path / "chromadb" / compact.COMPACT_DIR))
+    vector_db.add_documents([as_document("itau.txt", "INDICADORES:\n• Coverage ratio: 285%\n")])
+    vector_db.compact.clear()  # Armazenamento vazio (e falso) com a coleção cheia
+    assert not vector_db.compact
+
+    result = vector_db.build_compact_store()
+
+    assert result["status"] == "success"
+    assert vector_db._compact_ready()
+    vector_db.add_documents([as_document("bradesco.txt", "RESULTADOS:\n• Lucro líquido: R$ 5.624 milhões\n")])
+    assert len(vector_db.compact) == vector_db.collection.count()
+    assert vector_db._compact_ready()
+    hits = vector_db.search("lucro líquido bradesco", k=1, mode="vector")
+    assert hits[0]["metadata"]["source"] == "bradesco.txt"
+
+
+def test_rebuild_empty_collection(vector_db):
+    assert vector_db.build_compact_store()["status"] == "info"
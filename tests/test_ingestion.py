@@ -0,0 +1,138 @@
+"""IngestionQueue e IngestionWorker: transições de status dos jobs e processamento da fila."""
+
+import time
+
+import pytest
+
+from ingestion import JOB_STATUSES, IngestionQueue, IngestionWorker
+
+REPORT = "RESULTADOS:\n• Lucro líquido ajustado: R$ 5.624 milhões\n• Coverage ratio: 285%\n".encode("utf-8")
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return IngestionQueue(str(tmp_path / "ingest_queue.sqlite"), ttl_hours=1)
+
+
+def _status(queue: IngestionQueue, job_id: int) -> dict:
+    return queue.jobs([job_id])[0]
+
+
+def test_submit_claim_finish(queue):
+    job_id = queue.submit("bradesco.txt", REPORT)
+    assert _status(queue, job_id)["status"] == "queued"
+    assert _status(queue, job_id)["size"] == len(REPORT)
+
+    job = queue.claim()
+    assert job == {"id": job_id, "filename": "bradesco.txt", "data": REPORT}
+    assert _status(queue, job_id)["status"] == "running"
+    assert queue.claim() is None
+
+    queue.progress(job_id, 3)
+    assert _status(queue, job_id)["chunks"] == 3
+
+    queue.finish(job_id, "done", "3 chunks adicionados", chunks=4)
+    job = _status(queue, job_id)
+    assert (job["status"], job["message"], job["chunks"]) == ("done", "3 chunks adicionados", 4)
+    assert job["finished_at"] >= job["started_at"] >= job["created_at"]
+    assert queue.conn.execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()[0] is None
+
+
+def test_claim_is_fifo(queue):
+    first = queue.submit("a.txt", b"a")
+    second = queue.submit("b.txt", b"b")
+
+    assert queue.claim()["id"] == first
+    assert queue.claim()["id"] == second
+    assert queue.claim() is None
+
+
+def test_submit_deduplicates_pending_jobs(queue):
+    job_id = queue.submit("bradesco.txt", REPORT)
+    assert queue.submit("bradesco.txt", REPORT) == job_id
+    assert queue.submit("outro.txt", REPORT) != job_id  # Mesmo conteúdo, outro nome
+
+    queue.claim()
+    assert queue.submit("bradesco.txt", REPORT) == job_id  # Ainda em execução
+
+    queue.finish(job_id, "done", "ok")
+    assert queue.submit("bradesco.txt", REPORT) != job_id  # Terminado: novo job
+
+
+def test_requeue_interrupted_only_dead_workers(queue):
+    alive = queue.submit("vivo.txt", b"a")
+    dead = queue.submit("morto.txt", b"b")
+    queue.claim()
+    queue.claim()
+    queue.progress(dead, 5)
+    # O processo que reservou o segundo job morreu
+    queue.conn.execute("UPDATE jobs SET worker_pid = ? WHERE id = ?", (2 ** 22 + 1, dead))
+
+    assert queue.requeue_interrupted() == 1
+
+    assert _status(queue, alive)["status"] == "running"
+    job = _status(queue, dead)
+    assert (job["status"], job["chunks"]) == ("queued", 0)
+    assert queue.claim()["id"] == dead
+
+
+def test_purge_removes_only_old_finished_jobs(queue):
+    old = queue.submit("antigo.txt", b"a")
+    recent = queue.submit("recente.txt", b"b")
+    pending = queue.submit("pendente.txt", b"c")
+    queue.claim()
+    queue.claim()
+    queue.finish(old, "error", "falhou")
+    queue.finish(recent, "done", "ok")
+    queue.conn.execute("UPDATE jobs SET finished_at = ? WHERE id = ?", (time.time() - 2 * 3600, old))
+
+    assert queue.purge() == 1
+    assert [job["id"] for job in queue.jobs()] == [pending, recent]
+    assert queue.purge(ttl_hours=0) == 0
+
+
+def test_stats_and_listing(queue):
+    ids = [queue.submit(f"{i}.txt", bytes([i])) for i in range(3)]
+    queue.claim()
+    queue.finish(ids[0], "done", "ok")
+    queue.claim()
+
+    stats = queue.get_stats()
+    assert set(stats) == set(JOB_STATUSES)
+    assert (stats["queued"], stats["running"], stats["done"], stats["error"]) == (1, 1, 1, 0)
+    assert [job["id"] for job in queue.jobs(limit=2)] == ids[:0:-1]
+    assert queue.jobs([]) == []
+    assert "payload" not in queue.jobs()[0]
+
+
+def test_worker_indexes_upload(queue, vector_db):
+    worker = IngestionWorker(queue, db=vector_db)
+    job_id = queue.submit("bradesco.txt", REPORT)
+
+    assert worker.drain() == 1
+
+    job = _status(queue, job_id)
+    assert job["status"] == "done"
+    assert job["chunks"] == vector_db.collection.count() > 0
+    assert vector_db.search("lucro líquido", k=1, mode="bm25")[0]["metadata"]["source"] == "bradesco.txt"
+
+    # O mesmo arquivo de novo: job novo, concluído sem gravar nada
+    again = queue.submit("bradesco.txt", REPORT)
+    assert worker.run_once()
+    assert _status(queue, again)["status"] == "done"
+    assert _status(queue, again)["message"] == "Arquivo já indexado"
+    assert not worker.run_once()
+
+
+@pytest.mark.parametrize("filename, data", [("planilha.xlsx", b"PK\x03\x04"), ("corrompido.pdf", b"%PDF-1.4 lixo")])
+def test_worker_records_errors(queue, vector_db, filename, data):
+    worker = IngestionWorker(queue, db=vector_db)
+    failed = queue.submit(filename, data)
+    ok = queue.submit("bradesco.txt", REPORT)
+
+    assert worker.drain() == 2
+
+    job = _status(queue, failed)
+    assert job["status"] == "error"
+    assert job["message"]
+    assert _status(queue, ok)["status"] == "done"  # Um erro não trava a fila
@@ -1,215 +1,1279 @@
 from langchain_core.tools import tool
+import asyncio
+import contextvars
 import time
-import chromadb
-from chromadb.config import Settings
-from typing import List, Dict
+import threading
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
 from pathlib import Path
+from datetime import datetime
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import accumulate, islice
+import hashlib
+import heapq
+import json
 import os
+import re
+
+import numpy as np
+
+import metrics
+from bm25 import BM25Index, reciprocal_rank_fusion
+from cache import LRUCache
+from chunking import Chunker, get_chunker
+from embeddings import (EMBED_BATCH_SIZE, EMBED_WORKERS, WRITE_BATCH_SIZE, embed_batches, iter_batches,
+                        load_embedding_model)
+from parsing import (PARSE_WORKERS, SUPPORTED_FORMATS, ParseError, iter_file_content, iter_parsed_files,
+                     iter_upload_content)
+from answer_cache import get_answer_cache
+from compact import COMPACT_DIR, COMPACT_VECTORS, CompactVectorStore
+from figures import FIGURES_VERSION, FigureExtractor, FiguresTable, format_figures
+from metadata import BANK_ALIASES, METADATA_VERSION, ChunkAnnotator, build_where, chunk_preview, normalize_bank
+from rerank import RERANK_CANDIDATES, RERANK_ENABLED, get_reranker
 
 # Configurar tokenizers para evitar warnings
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 # Configurações
-CHROMADB_PATH = "./chromadb_storage"
+CHROMADB_PATH = os.getenv("CHROMADB_PATH", "./chromadb_storage")
 COLLECTION_NAME = "financial_reports"
+REBUILD_COLLECTION_NAME = f"{COLLECTION_NAME}_rebuild"  # Coleção temporária de reconstruir_indice.py
+MANIFEST_FILE = "manifest.json"
+CHUNK_ID_VERSION = 2       # Como _chunk_id é calculado (mudou, os arquivos são reprocessados)
+QUERY_CACHE_SIZE = 1024    # Embeddings de consultas em memória
+RESULT_CACHE_SIZE = 256    # Resultados de busca em memória
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH")  # ex: ./chromadb_storage/query_cache.pkl
+BM25_FILE = "bm25_index.pkl"
+FIGURES_FILE = "figures.sqlite"  # Números dos relatórios extraídos na ingestão (figures.py)
+SEARCH_MODES = ("vector", "bm25", "hybrid")
+DEFAULT_SEARCH_MODE = os.getenv("SEARCH_MODE", "hybrid")  # Modo usado pelo retriever
+HYBRID_CANDIDATES = 20     # Candidatos de cada ranking antes da fusão
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "8"))  # Buscas simultâneas no ChromaDB (caminho async)
+FILTER_CACHE_SIZE = 64     # Conjuntos de IDs por filtro de metadados (pré-filtro do BM25)
+LISTING_CACHE_SIZE = 32    # Páginas da listagem de documentos em memória
+DOCUMENT_PAGE_SIZE = 20    # Chunks por página da listagem
+CONTEXT_CHUNKS = int(os.getenv("CONTEXT_CHUNKS", "5"))                # Chunks ranqueados que o retriever combina
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "400"))  # Tokens de evidência entregues ao LLM
+CONTEXT_TOKENIZER_MODEL = "gpt-4o-mini"  # Modelo do config.py (contagem com tiktoken)
+DEFAULT_FILE_PATTERNS = ",".join(f"*{suffix}" for suffix in SUPPORTED_FORMATS)  # Padrões do index_documents_from_path
+
+# Índice HNSW da coleção. space, M e ef_construction só valem na criação da coleção
+# (mudou, rode `python reconstruir_indice.py`); ef_search é aplicado ao abrir o banco.
+HNSW_SPACES = ("l2", "cosine", "ip")
+HNSW_SPACE = os.getenv("HNSW_SPACE", "l2")                                # Distância: "l2", "cosine" ou "ip"
+HNSW_M = int(os.getenv("HNSW_M", "16"))                                   # Vizinhos por nó do grafo
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "100"))      # Candidatos na inserção
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "100"))                  # Candidatos na busca (recall x latência)
+
+
+_CHUNK_HEADER = re.compile(r"^(?:📄\s*)?(?P<source>.+?):?\s*\(Parte (?P<part>\d+)\):$")
+
+
+def _hash_text(text: str) -> str:
+    """Hash SHA-256 de um texto (usado para arquivos e chunks)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _chunk_id(chunk: str) -> str:
+    """
+    ID determinístico de um chunk, derivado do seu conteúdo.
+    
+    O número da parte do cabeçalho "título (Parte N):" fica fora do hash (a
+    posição vai para os metadados, em chunk_index): um chunk cujo corpo não mudou
+    mantém o ID mesmo que passe a ser outra parte. Isso só poupa embeddings
+    quando as fronteiras dos chunks ficam onde estavam, como no chunker de seções
+    ao mudar uma seção; nos chunkers de tokens e de caracteres, um trecho
+    inserido no início desloca todas as janelas seguintes, e elas ganham IDs novos.
+    """
+    header, _, body = chunk.partition('\n')
+    match = _CHUNK_HEADER.match(header.strip())
+    key = f"{match.group('source')}\n{body}" if match else chunk
+    return f"chunk_{_hash_text(key)[:32]}"
+
+
+def _hash_bytes(data: bytes) -> str:
+    """Hash SHA-256 de um conteúdo em memória (ex: upload do Streamlit)."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _hash_file(file_path) -> str:
+    """Hash SHA-256 dos bytes de um arquivo, lido em blocos."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _similarity(distance: float, space: str = "l2") -> float:
+    """
+    Converte a distância do ChromaDB em similaridade (0-1).
+    
+    L2: 1 / (1 + d). Cosseno e produto interno: o ChromaDB devolve 1 - cos
+    (ou 1 - produto), então a similaridade é 1 - d, limitada a 0.
+    """
+    if space == "l2":
+        return 1.0 / (1.0 + distance)
+    return max(0.0, 1.0 - distance)
+
+
+def _distance(a: np.ndarray, b: np.ndarray, space: str = "l2") -> float:
+    """Distância entre dois embeddings na mesma métrica do índice HNSW (L2 ao quadrado, como o ChromaDB)."""
+    if space == "l2":
+        return float(np.sum((a - b) ** 2))
+    if space == "cosine":
+        norms = float(np.linalg.norm(a) * np.linalg.norm(b))
+        return 1.0 - float(np.dot(a, b)) / norms if norms else 1.0
+    return 1.0 - float(np.dot(a, b))
+
+
+def hnsw_configuration(space: str = HNSW_SPACE, m: int = HNSW_M,
+                       ef_construction: int = HNSW_EF_CONSTRUCTION, ef_search: int = HNSW_EF_SEARCH) -> Dict:
+    """Configuração HNSW no formato do ChromaDB (`configuration=` de create_collection)."""
+    if space not in HNSW_SPACES:
+        raise ValueError(f"Distância HNSW inválida: {space} (opções: {', '.join(HNSW_SPACES)})")
+    return {"hnsw": {"space": space, "max_neighbors": m, "ef_construction": ef_construction, "ef_search": ef_search}}
+
+
+def _normalize_query(query: str) -> str:
+    """Normaliza a consulta para o cache (caixa, espaços e pontuação final)."""
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+
+def _extract_source_name(document: str) -> Optional[str]:
+    """Extrai o nome do arquivo do cabeçalho '📄 nome:' do documento, se existir."""
+    title, _ = _split_header(document)
+    return title.replace('📄', '').strip().rstrip(':').strip() or None
+
+
+def _split_header(document: str) -> Tuple[str, str]:
+    """Separa o cabeçalho '📄 nome:' (se houver nas 5 primeiras linhas) do conteúdo."""
+    for i, line in enumerate(document.split('\n', 5)[:5]):
+        if '📄' in line:
+            return line.strip(), document.split('\n', i + 1)[-1]
+    return "", document
+
+
+class DocumentManifest:
+    """
+    Manifesto de arquivos indexados, persistido em JSON ao lado do ChromaDB.
+
+    Para cada fonte guarda o hash do arquivo e os hashes dos seus chunks, permitindo
+    pular arquivos inalterados e re-embedar apenas os chunks que mudaram.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.entries: Dict[str, Dict] = {}
+        self.writes = 0
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f).get("files", {})
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Manifesto ilegível, recriando: {e}")
+                self.entries = {}
+
+    def get(self, source: str) -> Optional[Dict]:
+        return self.entries.get(source)
+
+    def is_current(self, source: str, file_hash: str, chunker: str) -> bool:
+        """True se a fonte já foi indexada com o mesmo conteúdo e a mesma estratégia de chunking."""
+        entry = self.entries.get(source)
+        return bool(entry) and entry["file_hash"] == file_hash and entry.get("chunker") == chunker
+
+    def update(self, source: str, file_hash: str, chunk_hashes: List[str], chunker: str):
+        self.entries[source] = {
+            "source": source,
+            "file_hash": file_hash,
+            "chunker": chunker,
+            "chunk_hashes": chunk_hashes,
+            "updated_at": datetime.now().isoformat(timespec="seconds")
+        }
+
+    def referenced_chunks(self) -> Set[str]:
+        """Todos os chunks referenciados por algum arquivo do manifesto."""
+        return {h for entry in self.entries.values() for h in entry["chunk_hashes"]}
+
+    def remove_chunks(self, chunk_ids: Set[str]):
+        """Tira chunks removidos das fontes; fontes sem nenhum chunk saem do manifesto."""
+        for source, entry in list(self.entries.items()):
+            remaining = [h for h in entry["chunk_hashes"] if h not in chunk_ids]
+            if not remaining:
+                del self.entries[source]
+            elif len(remaining) != len(entry["chunk_hashes"]):
+                # Arquivo parcialmente removido: a próxima ingestão o reprocessa
+                entry["chunk_hashes"] = remaining
+                entry["file_hash"] = ""
+
+    def clear(self):
+        self.entries = {}
+        self.save()
+
+    def save(self):
+        """Grava o manifesto de forma atômica (arquivo temporário + rename)."""
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"files": self.entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self.writes += 1
+
+    @property
+    def version(self) -> Tuple[int, int]:
+        """
+        Versão da coleção: muda a cada gravação do manifesto, inclusive por outro processo.
+        
+        O manifesto só é gravado quando chunks são adicionados, removidos ou
+        reescritos; reindexar arquivos inalterados não muda a versão.
+        """
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except OSError:
+            mtime = 0
+        return self.writes, mtime
+
 
 class SimpleVectorDB:
     """Banco de vetores simplificado usando ChromaDB."""
     
-    def __init__(self):
-        """Inicializa o cliente ChromaDB."""
-        Path(CHROMADB_PATH).mkdir(exist_ok=True)
+    def __init__(self, chunker: Optional[Chunker] = None):
+        """
+        Inicializa o cliente ChromaDB.
         
-        self.client = chromadb.PersistentClient(
+        A coleção é aberta sem embedding function: os embeddings são sempre gerados
+        por `self.embedding_function`, que só carrega o modelo ONNX no primeiro uso.
+        """
+        Path(CHROMADB_PATH).mkdir(parents=True, exist_ok=True)
+        
+        self.client = self._connect()
+        self._embedding_function = None
+        
+        self.manifest = DocumentManifest(os.path.join(CHROMADB_PATH, MANIFEST_FILE))
+        self.chunker = chunker or get_chunker()
+        self.bm25 = BM25Index(os.path.join(CHROMADB_PATH, BM25_FILE))
+        self._bm25_build_lock = threading.Lock()
+        self.figures = FiguresTable(os.path.join(CHROMADB_PATH, FIGURES_FILE))
+        # Embeddings em int8 + float32 memory-mapped (compact.py), só com COMPACT_VECTORS=1
+        self.compact = CompactVectorStore(os.path.join(CHROMADB_PATH, COMPACT_DIR)) if COMPACT_VECTORS else None
+        self._compact_synced: Optional[Tuple[Tuple[int, int], bool]] = None  # (versão, em sincronia)
+        
+        # Caches de busca: consulta normalizada -> embedding, e (embedding, k, versão) -> resultados
+        self.query_cache = LRUCache(QUERY_CACHE_SIZE, path=QUERY_CACHE_PATH)
+        self.result_cache = LRUCache(RESULT_CACHE_SIZE)
+        self.filter_cache = LRUCache(FILTER_CACHE_SIZE)
+        self.listing_cache = LRUCache(LISTING_CACHE_SIZE)
+        
+        # Criar/carregar coleção
+        self._open_collection()
+    
+    @staticmethod
+    def _connect():
+        """Cliente persistente do ChromaDB em CHROMADB_PATH."""
+        import chromadb
+        from chromadb.config import Settings
+        
+        return chromadb.PersistentClient(
             path=CHROMADB_PATH,
             settings=Settings(anonymized_telemetry=False, allow_reset=True)
         )
+    
+    def _open_collection(self):
+        """
+        Carrega a coleção ou a cria com a configuração HNSW atual.
+        
+        Em coleções existentes só o ef_search pode mudar sem reconstruir; diferenças
+        de space, M ou ef_construction são apenas avisadas. Uma reconstrução
+        interrompida depois de apagar a coleção antiga é concluída aqui.
+        """
+        names = {collection.name for collection in self.client.list_collections()}
+        if COLLECTION_NAME not in names and REBUILD_COLLECTION_NAME in names:
+            rebuilt = self.client.get_collection(name=REBUILD_COLLECTION_NAME, embedding_function=None)
+            rebuilt.modify(name=COLLECTION_NAME)
+            print(f"🔁 Reconstrução interrompida concluída: {REBUILD_COLLECTION_NAME} -> {COLLECTION_NAME}")
         
-        # Criar/carregar coleção
         try:
-            self.collection = self.client.get_collection(
-                name=COLLECTION_NAME,
-                embedding_function=chromadb.utils.embedding_functions.DefaultEmbeddingFunction()
-            )
+            self.collection = self.client.get_collection(name=COLLECTION_NAME, embedding_function=None)
             print(f"📚 Coleção carregada: {self.collection.count()} documentos")
         except:
             self.collection = self.client.create_collection(
-                name=COLLECTION_NAME, 
-                embedding_function=chromadb.utils.embedding_functions.DefaultEmbeddingFunction()
+                name=COLLECTION_NAME, embedding_function=None, configuration=hnsw_configuration()
             )
             print(f"📚 Nova coleção criada")
+        
+        wanted = hnsw_configuration()["hnsw"]
+        current = self._hnsw_settings()
+        if current and current.get("ef_search") != wanted["ef_search"]:
+            self.set_ef_search(wanted["ef_search"])
+        differences = [
+            f"{key}={current.get(key)} (configurado: {wanted[key]})"
+            for key in ("space", "max_neighbors", "ef_construction")
+            if current and current.get(key) != wanted[key]
+        ]
+        if differences:
+            print(f"⚠️ Índice HNSW difere da configuração: {', '.join(differences)}. "
+                  f"Para aplicar: python reconstruir_indice.py")
+        self.space = current.get("space", "l2")
+    
+    def set_ef_search(self, ef_search: int):
+        """
+        Ajusta o ef_search da coleção, sem reconstruir o índice.
+        
+        O ChromaDB só lê a configuração ao abrir o cliente, então ele é reaberto
+        para que o novo valor já valha neste processo.
+        """
+        from chromadb.api.shared_system_client import SharedSystemClient
+        
+        self.collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+        SharedSystemClient.clear_system_cache()
+        self.client = self._connect()
+        self.collection = self.client.get_collection(name=COLLECTION_NAME, embedding_function=None)
+        self.result_cache.clear()
+    
+    def _hnsw_settings(self) -> Dict:
+        """Parâmetros HNSW efetivos da coleção aberta (space, max_neighbors, ef_*)."""
+        configuration = self.client.get_collection(name=self.collection.name, embedding_function=None).configuration
+        return dict((configuration or {}).get("hnsw") or {})
+    
+    @property
+    def embedding_function(self):
+        """Embedding function padrão (all-MiniLM-L6-v2), carregada no primeiro uso e mantida em memória."""
+        if self._embedding_function is None:
+            self._embedding_function = load_embedding_model()
+        return self._embedding_function
+    
+    @embedding_function.setter
+    def embedding_function(self, embedding_function):
+        # Trocar o modelo invalida os embeddings de consultas já cacheados
+        self._embedding_function = embedding_function
+        self.query_cache.clear()
+        self.result_cache.clear()
+    
+    def add_documents(self, documents: List[str], workers: int = 1, batch_size: int = EMBED_BATCH_SIZE) -> Dict:
+        """
+        Adiciona documentos à coleção de forma incremental.
+        
+        Os IDs dos chunks são derivados do hash do conteúdo: arquivos inalterados
+        (mesmo hash no manifesto) são ignorados, e em arquivos alterados apenas os
+        chunks novos são embedados. Chunks que deixaram de existir são removidos.
+        
+        Args:
+            documents: Documentos no formato "📄 nome:\nconteúdo"
+            workers: Processos para embedar em paralelo (1 = no próprio processo)
+            batch_size: Chunks por lote de embedding
+        """
+        sources = []
+        for doc in documents:
+            file_hash = _hash_text(doc)
+            source = _extract_source_name(doc) or f"doc_{file_hash[:12]}"
+            title, content = _split_header(doc)
+            make_chunks = (
+                lambda source=source, title=title, content=content: self._annotated_chunks(source, [content], title)
+            )
+            sources.append((source, file_hash, make_chunks))
+        
+        return self._ingest(sources, workers, batch_size)
+    
+    def add_files(self, file_paths: Iterable, workers: int = 1, batch_size: int = EMBED_BATCH_SIZE) -> Dict:
+        """
+        Indexa arquivos lendo-os em fluxo (página a página / parágrafo a parágrafo).
+        
+        O hash do arquivo é calculado sobre os bytes em disco, então arquivos
+        inalterados nem chegam a ser abertos pelo parser.
+        """
+        sources = (
+            (
+                Path(file_path).name,
+                _hash_file(file_path),
+                lambda file_path=file_path: self._annotated_chunks(
+                    Path(file_path).name, iter_file_content(file_path), title=f"📄 {Path(file_path).name}:"
+                )
+            )
+            for file_path in file_paths
+        )
+        return self._ingest(sources, workers, batch_size)
+    
+    def add_uploads(self, uploads: Iterable[Tuple[str, bytes]], workers: int = 1,
+                    batch_size: int = EMBED_BATCH_SIZE, progress: Optional[Callable[[int], None]] = None) -> Dict:
+        """
+        Indexa arquivos já em memória (nome, bytes), sem gravá-los em disco.
+        
+        Mesmo fluxo de add_files: o hash é calculado sobre os bytes e o parser
+        lê direto do buffer, com PDFs e DOCX extraídos num processo à parte
+        (parsing.iter_upload_content). `progress` recebe o total de chunks
+        gravados após cada lote.
+        """
+        sources = (
+            (
+                name,
+                _hash_bytes(data),
+                lambda name=name, data=data: self._annotated_chunks(
+                    name, iter_upload_content(name, data), title=f"📄 {name}:"
+                )
+            )
+            for name, data in uploads
+        )
+        return self._ingest(sources, workers, batch_size, progress)
+    
+    def add_file_tree(self, files: Iterable[Tuple[str, Path]], workers: int = 1,
+                      batch_size: int = EMBED_BATCH_SIZE, parse_workers: int = PARSE_WORKERS) -> Dict:
+        """
+        Indexa muitos arquivos (nome, caminho), extraindo PDFs e DOCX em paralelo.
+        
+        Arquivos inalterados no manifesto não são extraídos; os demais entram na
+        indexação em fluxo, página a página, enquanto a extração continua. Um
+        arquivo com erro de leitura fica de fora (e fora do manifesto) sem
+        interromper os outros.
+        
+        Returns:
+            Resultado de _ingest com "errors" ([{"file", "message"}]), "files_parsed",
+            "files_per_sec" e "mb_per_sec"
+        """
+        signature = self._ingest_signature
+        scanned = {"files": 0, "bytes": 0, "parsed": 0}
+        start_time = time.perf_counter()
+        
+        def candidates() -> Iterator[Tuple[Tuple[str, str], Path, bool]]:
+            for name, path in files:
+                file_hash = _hash_file(path)
+                scanned["files"] += 1
+                scanned["bytes"] += os.path.getsize(path)
+                yield (name, file_hash), path, not self.manifest.is_current(name, file_hash, signature)
+        
+        def sources() -> Iterator[Tuple[str, str, Callable]]:
+            for (name, file_hash), _, segments in iter_parsed_files(candidates(), parse_workers):
+                if segments is not None:
+                    scanned["parsed"] += 1
+                yield (
+                    name,
+                    file_hash,
+                    lambda name=name, segments=segments: self._annotated_chunks(
+                        name, segments or [], title=f"📄 {name}:"
+                    )
+                )
+        
+        result = self._ingest(sources(), workers, batch_size)
+        elapsed = time.perf_counter() - start_time
+        if result["status"] == "success":
+            result.update({
+                "files_parsed": scanned["parsed"],
+                "seconds": round(elapsed, 2),
+                "files_per_sec": round(scanned["files"] / elapsed, 1) if elapsed > 0 else 0.0,
+                "mb_per_sec": round(scanned["bytes"] / 1024 / 1024 / elapsed, 2) if elapsed > 0 else 0.0
+            })
+            print(f"📂 {scanned['files']} arquivos ({scanned['bytes'] / 1024 / 1024:.1f} MB) em {elapsed:.1f}s: "
+                  f"{result['files_per_sec']} arquivos/s, {result['mb_per_sec']} MB/s, {len(result['errors'])} com erro")
+        return result
+    
+    @property
+    def _ingest_signature(self) -> str:
+        """Estratégia de chunking + versões dos IDs, metadados e números (mudou, os arquivos são reprocessados)."""
+        return (f"{self.chunker.signature}+ids={CHUNK_ID_VERSION}+metadata={METADATA_VERSION}"
+                f"+figures={FIGURES_VERSION}")
+    
+    def _annotated_chunks(self, source: str, segments: Iterable[str], title: str) -> Iterator[Tuple[str, Dict]]:
+        """
+        Chunks do documento com seus metadados (fonte, instituição, período, posição).
+        
+        Os números do documento (linhas "• Métrica: valor") são extraídos no mesmo
+        fluxo e gravados na tabela de números quando o documento termina.
+        """
+        extractor = FigureExtractor()
+        annotator = ChunkAnnotator(source, extractor.scan(segments))
+        yield from annotator.annotate(self.chunker.chunk(annotator, title))
+        self.figures.replace(source, annotator.document, extractor.figures)
     
-    def add_documents(self, documents: List[str]) -> Dict:
-        """Adiciona documentos à coleção, dividindo em chunks se necessário."""
+    def _ingest(self, sources: Iterable[Tuple[str, str, Callable]], workers: int, batch_size: int,
+                progress: Optional[Callable[[int], None]] = None) -> Dict:
+        """
+        Pipeline de ingestão: fontes -> chunks -> deduplicação -> embedding -> gravação.
+        
+        Cada fonte é (nome, hash do arquivo, função que gera (chunk, metadados)).
+        Os chunks fluem em lotes até o ChromaDB, então a memória fica limitada a
+        alguns lotes independentemente do tamanho dos arquivos. O manifesto só é
+        atualizado depois que os chunks foram gravados.
+        
+        Chunks que já existem na coleção não são embedados de novo, mas têm os
+        metadados atualizados (ex: coleções criadas antes dos metadados).
+        
+        Uma fonte que levanta ParseError no meio da leitura fica fora do manifesto
+        (os chunks dela já gravados são removidos) e entra em "errors"; as demais seguem.
+        """
         try:
-            existing_count = self.collection.count()
-            all_chunks = []
-            all_ids = []
+            write_batch_size = min(WRITE_BATCH_SIZE, self.client.get_max_batch_size())
+            self._ensure_bm25()
+            chunker = self._ingest_signature
+            stats = {"files_unchanged": 0, "chunks_skipped": 0}
+            errors: List[Dict] = []
+            manifest_updates = []
+            stale_ids = set()
+            seen_ids = set()
+            pending_metadata: Dict[str, Dict] = {}
+            
+            def new_chunks() -> Iterator[Tuple[str, str]]:
+                for source, file_hash, make_chunks in sources:
+                    if self.manifest.is_current(source, file_hash, chunker):
+                        stats["files_unchanged"] += 1
+                        continue
+                    entry = self.manifest.get(source)
+                    
+                    chunk_ids = []
+                    try:
+                        for chunk, chunk_metadata in make_chunks():
+                            chunk_id = _chunk_id(chunk)
+                            chunk_ids.append(chunk_id)
+                            if chunk_id not in seen_ids:
+                                seen_ids.add(chunk_id)
+                                pending_metadata[chunk_id] = chunk_metadata
+                                yield chunk_id, chunk
+                    except ParseError as e:
+                        print(f"❌ {source}: {e}")
+                        errors.append({"file": source, "message": str(e)})
+                        stale_ids.update(chunk_ids)  # Só o que nenhum arquivo do manifesto referencia
+                        continue
+                    
+                    if entry:
+                        stale_ids.update(set(entry["chunk_hashes"]) - set(chunk_ids))
+                    manifest_updates.append((source, file_hash, chunk_ids))
+            
+            def missing_chunks() -> Iterator[Tuple[str, str]]:
+                # Embedar apenas chunks que ainda não estão na coleção
+                for batch_ids, batch_texts in iter_batches(new_chunks(), write_batch_size):
+                    existing_ids = self._existing_ids(batch_ids)
+                    stats["chunks_skipped"] += len(existing_ids)
+                    if existing_ids:
+                        # Mesmo conteúdo, posição talvez diferente: cabeçalho "(Parte N)" e metadados
+                        # atualizados, com o embedding já gravado (o ChromaDB exige embeddings junto do texto)
+                        texts = dict(zip(batch_ids, batch_texts))
+                        current = self.collection.get(ids=list(existing_ids), include=["embeddings"])
+                        self.collection.update(
+                            ids=current['ids'], documents=[texts[i] for i in current['ids']],
+                            embeddings=current['embeddings'],
+                            metadatas=[pending_metadata.pop(i) for i in current['ids']]
+                        )
+                    for chunk_id, chunk in zip(batch_ids, batch_texts):
+                        if chunk_id not in existing_ids:
+                            yield chunk_id, chunk
+            
+            chunks_added, elapsed = self._write_chunks(
+                missing_chunks(), workers, batch_size, pending_metadata, progress
+            )
+            chunks_per_sec = chunks_added / elapsed if elapsed > 0 else 0.0
             
-            for i, doc in enumerate(documents):
-                # Se documento é muito grande (>10k chars), dividir em chunks
-                if len(doc) > 10000:
-                    chunks = self._split_into_chunks(doc)
-                    for j, chunk in enumerate(chunks):
-                        all_chunks.append(chunk)
-                        all_ids.append(f"doc_{existing_count + i}_chunk_{j}")
-                else:
-                    all_chunks.append(doc)
-                    all_ids.append(f"doc_{existing_count + i}")
+            for source, file_hash, chunk_ids in manifest_updates:
+                self.manifest.update(source, file_hash, chunk_ids, chunker)
             
-            self.collection.add(documents=all_chunks, ids=all_ids)
+            # Remover chunks antigos que nenhum arquivo referencia mais
+            stale_ids -= self.manifest.referenced_chunks()
+            stale_list = list(stale_ids)
+            for start in range(0, len(stale_list), write_batch_size):
+                self.collection.delete(ids=stale_list[start:start + write_batch_size])
+            self.bm25.remove(stale_list)
+            if self.compact is not None:
+                self.compact.remove(stale_list)
+            
+            if chunks_added or stale_list:
+                self.bm25.save()
+            # Só arquivos inalterados: a coleção não mudou, a versão (e os caches que dependem dela) fica
+            if manifest_updates or stale_list:
+                self.manifest.save()
+                self.result_cache.clear()
+                self.filter_cache.clear()
             total_docs = self.collection.count()
             
-            print(f"✅ {len(all_chunks)} chunks adicionados. Total: {total_docs}")
-            return {"status": "success", "documents_added": len(all_chunks), "total_documents": total_docs}
+            print(f"✅ {chunks_added} chunks adicionados "
+                  f"({stats['chunks_skipped']} já existentes, {stats['files_unchanged']} arquivos inalterados, "
+                  f"{chunks_per_sec:.1f} chunks/s). Total: {total_docs}")
+            return {
+                "status": "success",
+                "documents_added": chunks_added,
+                "chunks_per_sec": round(chunks_per_sec, 1),
+                "chunks_skipped": stats["chunks_skipped"],
+                "chunks_removed": len(stale_ids),
+                "files_unchanged": stats["files_unchanged"],
+                "errors": errors,
+                "total_documents": total_docs
+            }
             
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
-    def _split_into_chunks(self, document: str, chunk_size: int = 2000, overlap: int = 200) -> List[str]:
-        """Divide um documento grande em chunks menores com sobreposição."""
-        chunks = []
+    def _write_chunks(self, chunks: Iterable[Tuple[str, str]], workers: int, batch_size: int,
+                      metadatas: Optional[Dict[str, Dict]] = None,
+                      progress: Optional[Callable[[int], None]] = None) -> Tuple[int, float]:
+        """
+        Embeda e grava chunks (id, texto) na coleção em lotes limitados.
         
-        # Extrair título do documento se existir
-        lines = document.split('\n')
-        title = ""
-        content_start = 0
+        Com workers > 1 os embeddings são gerados num pool de processos e gravados
+        em lotes de até WRITE_BATCH_SIZE; caso contrário cada lote é embedado no
+        próprio processo. Os metadados de cada chunk são retirados de `metadatas`
+        (id -> metadados) no momento da gravação; `progress`, se informado, recebe
+        o total gravado após cada lote. Retorna (chunks gravados, tempo gasto em
+        segundos).
+        """
+        def batch_metadatas(ids: List[str]) -> Optional[List[Dict]]:
+            return [metadatas.pop(chunk_id) for chunk_id in ids] if metadatas is not None else None
         
-        for i, line in enumerate(lines[:5]):
-            if '📄' in line:
-                title = line.strip()
-                content_start = i + 1
-                break
+        start_time = time.perf_counter()
+        write_batch_size = min(WRITE_BATCH_SIZE, self.client.get_max_batch_size())
+        written = 0
         
-        # Juntar o conteúdo restante
-        content = '\n'.join(lines[content_start:])
+        if workers <= 1:
+            for batch_ids, batch_texts in iter_batches(chunks, write_batch_size):
+                self._add_batch(
+                    batch_ids, batch_texts, self.embedding_function(batch_texts), batch_metadatas(batch_ids)
+                )
+                written += len(batch_ids)
+                if progress:
+                    progress(written)
+            return written, time.perf_counter() - start_time
         
-        # Dividir em chunks
-        start = 0
-        chunk_num = 0
+        buffer_ids, buffer_texts, buffer_embeddings = [], [], []
+        for batch_ids, batch_texts, batch_embeddings in embed_batches(iter_batches(chunks, batch_size), workers):
+            buffer_ids.extend(batch_ids)
+            buffer_texts.extend(batch_texts)
+            buffer_embeddings.extend(batch_embeddings)
+            if len(buffer_ids) >= write_batch_size:
+                self._add_batch(buffer_ids, buffer_texts, buffer_embeddings, batch_metadatas(buffer_ids))
+                written += len(buffer_ids)
+                buffer_ids, buffer_texts, buffer_embeddings = [], [], []
+                if progress:
+                    progress(written)
+        if buffer_ids:
+            self._add_batch(buffer_ids, buffer_texts, buffer_embeddings, batch_metadatas(buffer_ids))
+            written += len(buffer_ids)
+            if progress:
+                progress(written)
         
-        while start < len(content):
-            end = start + chunk_size
-            
-            # Se não é o último chunk, tentar quebrar em uma linha completa
-            if end < len(content):
-                # Procurar por quebra de linha próxima
-                for i in range(end, max(start + chunk_size//2, end - 200), -1):
-                    if content[i] == '\n':
-                        end = i
-                        break
+        return written, time.perf_counter() - start_time
+    
+    def _add_batch(self, ids: List[str], texts: List[str], embeddings, metadatas: Optional[List[Dict]]):
+        """Grava um lote na coleção, no índice BM25 e no armazenamento compacto (se ativo)."""
+        self.collection.add(ids=ids, documents=texts, embeddings=embeddings, metadatas=metadatas)
+        self.bm25.add(zip(ids, texts))
+        if self.compact is not None:
+            self.compact.add(ids, embeddings)
+    
+    def _existing_ids(self, ids: List[str], batch_size: int = 1000) -> Set[str]:
+        """Retorna quais IDs já existem na coleção (consulta em lotes)."""
+        existing = set()
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            existing.update(self.collection.get(ids=batch, include=[])["ids"])
+        return existing
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embedding da consulta, reaproveitado do cache quando a consulta já foi feita."""
+        key = _normalize_query(query)
+        embedding = self.query_cache.get(key)
+        if embedding is None:
+            metrics.increment("query_cache_misses")
+            with metrics.timer("embedding_ms"):
+                embedding = np.asarray(self.embedding_function([key])[0], dtype=np.float32)
+            self.query_cache.put(key, embedding)
+        else:
+            metrics.increment("query_cache_hits")
+        return embedding
+    
+    def search(self, query: str, k: int = 3, mode: str = "vector", where: Optional[Dict] = None) -> List[Dict]:
+        """
+        Busca e retorna os chunks mais relevantes.
+        
+        Args:
+            query: Consulta do usuário
+            k: Número de chunks retornados
+            mode: "vector" (embeddings), "bm25" (termos exatos) ou "hybrid"
+                  (fusão dos dois rankings por Reciprocal Rank Fusion)
+            where: Pré-filtro de metadados no formato do ChromaDB, aplicado antes
+                   do ranking (ex: metadata.build_where(bank="itau", year=2024))
+        """
+        try:
+            if mode not in SEARCH_MODES:
+                raise ValueError(f"Modo de busca inválido: {mode} (opções: {', '.join(SEARCH_MODES)})")
             
-            chunk_content = content[start:end].strip()
+            with metrics.timer("search_ms", mode=mode):
+                chunks = self._search(query, k, mode, where)
+            if chunks:
+                metrics.registry.observe("top_similarity", chunks[0]["similarity"])
+            return chunks
             
-            if chunk_content:
-                # Adicionar título se existir + número do chunk
-                if title:
-                    chunk_title = f"{title} (Parte {chunk_num + 1})"
-                else:
-                    chunk_title = f"Documento (Parte {chunk_num + 1})"
-                
-                full_chunk = f"{chunk_title}:\n{chunk_content}"
-                chunks.append(full_chunk)
-                chunk_num += 1
+        except Exception as e:
+            print(f"Erro na busca: {e}")
+            return []
+    
+    def _search(self, query: str, k: int, mode: str, where: Optional[Dict] = None) -> List[Dict]:
+        """Busca propriamente dita (com cache de resultados), instrumentada por search()."""
+        embedding = self.embed_query(query)
+        where_key = json.dumps(where, sort_keys=True) if where else None
+        cache_key = (embedding.tobytes(), k, mode, where_key, self.manifest.version)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            metrics.increment("result_cache_hits")
+            return [dict(chunk) for chunk in cached]
+        metrics.increment("result_cache_misses")
+        
+        if mode == "vector":
+            chunks = self._vector_search(embedding, k, where)
+        else:
+            self._ensure_bm25()
+            allowed = self._filtered_ids(where, where_key) if where else None
+            pool = max(k * 4, HYBRID_CANDIDATES)
+            with metrics.timer("bm25_ms"):
+                lexical = self.bm25.search(query, k if mode == "bm25" else pool, allowed=allowed)
             
-            # Próximo chunk com sobreposição
-            start = end - overlap if end > overlap else end
+            if mode == "bm25":
+                vector_hits = {}
+                ranking = lexical
+            else:
+                vector_hits = {chunk["id"]: chunk for chunk in self._vector_search(embedding, pool, where)}
+                ranking = reciprocal_rank_fusion(list(vector_hits), [doc_id for doc_id, _ in lexical])[:k]
             
-            # Evitar loop infinito
-            if start >= len(content):
-                break
+            chunks = self._chunks_from_ranking(ranking, embedding, vector_hits)
         
+        self.result_cache.put(cache_key, [dict(chunk) for chunk in chunks])
         return chunks
     
-    def search(self, query: str, k: int = 3) -> List[Dict]:
-        """Busca e retorna os chunks mais relevantes."""
+    def _vector_search(self, embedding: np.ndarray, k: int, where: Optional[Dict] = None) -> List[Dict]:
+        """Busca por similaridade de embeddings no ChromaDB (com pré-filtro de metadados)."""
+        if self._compact_ready():
+            return self._compact_search(embedding, k, where)
+        
+        with metrics.timer("chroma_query_ms"):
+            results = self.collection.query(
+                query_embeddings=[embedding], n_results=k, where=where,
+                include=["documents", "metadatas", "distances"]
+            )
+        
+        chunks = []
+        if results['documents'] and results['documents'][0]:
+            for i, (doc_id, doc, metadata, distance) in enumerate(
+                zip(results['ids'][0], results['documents'][0], results['metadatas'][0], results['distances'][0])
+            ):
+                chunks.append({
+                    "id": doc_id,
+                    "content": doc,
+                    "metadata": metadata or {},
+                    "similarity": _similarity(distance, self.space),
+                    "rank": i + 1
+                })
+        return chunks
+    
+    def _compact_ready(self) -> bool:
+        """
+        Se a busca vetorial pode usar o armazenamento compacto.
+        
+        Só quando ele tem os mesmos chunks da coleção (conferido uma vez por
+        versão do manifesto); fora de sincronia, a busca volta para o HNSW.
+        """
+        if self.compact is None:
+            return False
+        version = self.manifest.version
+        if self._compact_synced is None or self._compact_synced[0] != version:
+            synced = len(self.compact) == self.collection.count()
+            if not synced:
+                print("⚠️ Armazenamento compacto fora de sincronia com a coleção (rode `python compact.py`); "
+                      "usando o índice HNSW")
+            self._compact_synced = (version, synced)
+        return self._compact_synced[1]
+    
+    def _compact_search(self, embedding: np.ndarray, k: int, where: Optional[Dict] = None) -> List[Dict]:
+        """Busca vetorial no armazenamento compacto (int8 + re-score exato); textos lidos da coleção."""
+        allowed = self._filtered_ids(where, json.dumps(where, sort_keys=True)) if where else None
+        with metrics.timer("compact_query_ms"):
+            hits = self.compact.search(embedding, k, self.space, allowed=allowed)
+        if not hits:
+            return []
+        
+        with metrics.timer("chroma_get_ms"):
+            results = self.collection.get(ids=[doc_id for doc_id, _ in hits], include=["documents", "metadatas"])
+        found = {
+            doc_id: (doc, metadata)
+            for doc_id, doc, metadata in zip(results['ids'], results['documents'], results['metadatas'])
+        }
+        
+        chunks = []
+        for doc_id, distance in hits:
+            if doc_id not in found:  # Removido da coleção por outro processo
+                continue
+            doc, metadata = found[doc_id]
+            chunks.append({
+                "id": doc_id,
+                "content": doc,
+                "metadata": metadata or {},
+                "similarity": _similarity(distance, self.space),
+                "rank": len(chunks) + 1
+            })
+        return chunks
+    
+    def build_compact_store(self, batch_size: int = WRITE_BATCH_SIZE) -> Dict:
+        """
+        Monta o armazenamento compacto a partir dos embeddings da coleção.
+        
+        Os embeddings são lidos em lotes; a escala int8 é recalibrada com o
+        primeiro lote (o armazenamento anterior é descartado). Serve para coleções indexadas antes de COMPACT_VECTORS=1
+        e para recuperar o espaço de chunks removidos.
+        """
         try:
-            results = self.collection.query(query_texts=[query], n_results=k)
-            
-            chunks = []
-            if results['documents'] and results['documents'][0]:
-                for i, (doc, distance) in enumerate(zip(results['documents'][0], results['distances'][0])):
-                    similarity = 1.0 / (1.0 + distance)  # Converter distância para similaridade
-                    chunks.append({
-                        "content": doc,
-                        "similarity": similarity,
-                        "rank": i + 1
-                    })
+            start_time = time.perf_counter()
+            # Vazio, o armazenamento é falso (__len__ == 0): comparar com None
+            store = self.compact if self.compact is not None else CompactVectorStore(
+                os.path.join(CHROMADB_PATH, COMPACT_DIR)
+            )
+            store.clear()
+            batch_size = min(batch_size, self.client.get_max_batch_size())
             
-            return chunks
+            total = self.collection.count()
+            copied = 0
+            while copied < total:
+                page = self.collection.get(limit=batch_size, offset=copied, include=["embeddings"])
+                if not page['ids']:
+                    break
+                store.add(page['ids'], page['embeddings'])
+                copied += len(page['ids'])
+                print(f"   {copied:,}/{total:,} embeddings compactados...", end="\r")
+            if self.compact is not None:
+                # Recarregar do disco: escala e linhas passam a ser as da reconstrução
+                self.compact = CompactVectorStore(store.directory)
+            self._compact_synced = None
             
+            if not copied:
+                return {"status": "info", "message": "Coleção vazia"}
+            elapsed = time.perf_counter() - start_time
+            return {
+                "status": "success",
+                "message": f"{copied} embeddings compactados",
+                "seconds": round(elapsed, 2),
+                "stats": store.get_stats()
+            }
         except Exception as e:
-            print(f"Erro na busca: {e}")
-            return []
+            return {"status": "error", "message": f"Erro ao montar armazenamento compacto: {str(e)}"}
+    
+    def _filtered_ids(self, where: Dict, where_key: str) -> Set[str]:
+        """IDs dos chunks que passam no filtro (cacheados por filtro e versão da coleção)."""
+        cache_key = (where_key, self.manifest.version)
+        ids = self.filter_cache.get(cache_key)
+        if ids is None:
+            with metrics.timer("chroma_filter_ms"):
+                ids = set(self.collection.get(where=where, include=[])["ids"])
+            self.filter_cache.put(cache_key, ids)
+        return ids
+    
+    def _chunks_from_ranking(self, ranking: List[Tuple[str, float]], embedding: np.ndarray,
+                             known: Dict[str, Dict]) -> List[Dict]:
+        """
+        Monta os resultados de um ranking (id, score) vindo do BM25 ou da fusão.
+        
+        Chunks que não vieram da busca vetorial são lidos da coleção com seus
+        embeddings, para que todos os resultados tenham similaridade comparável.
+        """
+        missing = [doc_id for doc_id, _ in ranking if doc_id not in known]
+        fetched = {}
+        if missing:
+            with metrics.timer("chroma_get_ms"):
+                results = self.collection.get(ids=missing, include=["documents", "metadatas", "embeddings"])
+            for doc_id, doc, metadata, doc_embedding in zip(
+                results['ids'], results['documents'], results['metadatas'], results['embeddings']
+            ):
+                distance = _distance(np.asarray(doc_embedding, dtype=np.float32), embedding, self.space)
+                fetched[doc_id] = {
+                    "id": doc_id, "content": doc, "metadata": metadata or {},
+                    "similarity": _similarity(distance, self.space)
+                }
+        
+        chunks = []
+        for doc_id, score in ranking:
+            hit = known.get(doc_id) or fetched.get(doc_id)
+            if hit is None:  # Índice BM25 à frente da coleção (ex: removido por outro processo)
+                continue
+            chunks.append({**hit, "score": score, "rank": len(chunks) + 1})
+        return chunks
+    
+    def _ensure_bm25(self):
+        """Sincroniza o índice BM25 com o disco e o reconstrói se estiver vazio (coleções antigas)."""
+        self.bm25.reload_if_changed()
+        if len(self.bm25) or not self.collection.count():
+            return
+        
+        # Buscas concorrentes (pool de threads) não devem reconstruir o índice em paralelo
+        with self._bm25_build_lock:
+            if len(self.bm25):
+                return
+            print("🔤 Construindo índice BM25 a partir da coleção...")
+            offset = 0
+            while True:
+                page = self.collection.get(limit=WRITE_BATCH_SIZE, offset=offset, include=["documents"])
+                if not page['ids']:
+                    break
+                self.bm25.add(zip(page['ids'], page['documents']))
+                offset += len(page['ids'])
+            self.bm25.save()
     
     def get_stats(self) -> Dict:
         """Retorna estatísticas do banco."""
         return {
             "total_documents": self.collection.count(),
             "collection_name": COLLECTION_NAME,
-            "storage_path": CHROMADB_PATH
+            "storage_path": CHROMADB_PATH,
+            "hnsw": self._hnsw_settings(),
+            "figures": self.figures.get_stats(),
+            "compact": self.compact.get_stats() if self.compact is not None else None
         }
     
+    def list_documents(self, offset: int = 0, limit: int = DOCUMENT_PAGE_SIZE,
+                       where: Optional[Dict] = None) -> Dict:
+        """
+        Uma página dos chunks indexados (ids e metadados, sem os textos).
+        
+        O preview de cada chunk vem dos metadados gravados na ingestão; só chunks
+        de coleções anteriores ao preview têm o texto lido (os da própria página).
+        Páginas ficam em cache até a coleção mudar.
+        
+        Args:
+            offset: Posição do primeiro chunk da página
+            limit: Chunks por página
+            where: Filtro de metadados (ex: metadata.build_where(source="itau_q3_2024.txt"))
+        
+        Returns:
+            {"status", "documents": [{"id", "source", "preview", ...metadados}], "offset", "limit", "total"}
+        """
+        try:
+            where_key = json.dumps(where, sort_keys=True) if where else None
+            cache_key = (offset, limit, where_key, self.manifest.version)
+            page = self.listing_cache.get(cache_key)
+            if page is not None:
+                return page
+            
+            results = self.collection.get(where=where, limit=limit, offset=offset, include=["metadatas"])
+            documents = [
+                {"id": doc_id, **(metadata or {})}
+                for doc_id, metadata in zip(results['ids'], results['metadatas'])
+            ]
+            missing = [document["id"] for document in documents if "preview" not in document]
+            if missing:
+                texts = self.collection.get(ids=missing, include=["documents"])
+                previews = {doc_id: chunk_preview(text) for doc_id, text in zip(texts['ids'], texts['documents'])}
+                for document in documents:
+                    if "preview" not in document:
+                        document["preview"] = previews.get(document["id"], "")
+            for document in documents:
+                document.setdefault("source", None)
+            
+            total = len(self._filtered_ids(where, where_key)) if where else self.collection.count()
+            page = {"status": "success", "documents": documents, "offset": offset, "limit": limit, "total": total}
+            self.listing_cache.put(cache_key, page)
+            return page
+        except Exception as e:
+            return {"status": "error", "message": f"Erro ao listar documentos: {str(e)}"}
+    
+    def _delete_where(self, where: Optional[Dict], on_batch: Optional[Callable[[List[str]], None]] = None,
+                      batch_size: int = WRITE_BATCH_SIZE) -> int:
+        """
+        Apaga da coleção, em lotes, os chunks que passam no filtro (todos, sem filtro).
+        
+        Só os ids de um lote ficam em memória; `on_batch` recebe cada lote apagado.
+        Retorna o número de chunks apagados.
+        """
+        batch_size = min(batch_size, self.client.get_max_batch_size())
+        deleted = 0
+        while True:
+            ids = self.collection.get(where=where, limit=batch_size, include=[])["ids"]
+            if not ids:
+                break
+            self.collection.delete(ids=ids)
+            if self.compact is not None and where is not None:  # Sem filtro, quem chama limpa tudo
+                self.compact.remove(ids)
+            if on_batch:
+                on_batch(ids)
+            deleted += len(ids)
+        return deleted
+    
+    def delete_documents(self, where: Dict) -> Dict:
+        """
+        Remove os chunks que passam no filtro de metadados (ex: um arquivo inteiro).
+        
+        A remoção é feita em lotes; índice BM25 e manifesto são atualizados (um
+        arquivo parcialmente removido é reprocessado na próxima ingestão).
+        """
+        if not where:
+            return {"status": "error", "message": "Informe um filtro (para apagar tudo use clear_collection)"}
+        try:
+            def forget(ids: List[str]):
+                self.bm25.remove(ids)
+                self.manifest.remove_chunks(set(ids))
+            
+            deleted = self._delete_where(where, forget)
+            if not deleted:
+                return {"status": "info", "message": "Nenhum documento corresponde ao filtro"}
+            self.bm25.save()
+            self.manifest.save()
+            self.figures.delete_sources(set(self.figures.sources()) - set(self.manifest.entries))
+            self.result_cache.clear()
+            self.filter_cache.clear()
+            return {
+                "status": "success",
+                "message": f"Removidos {deleted} documentos",
+                "documents_removed": deleted,
+                "total_documents": self.collection.count()
+            }
+        except Exception as e:
+            return {"status": "error", "message": f"Erro ao remover documentos: {str(e)}"}
+    
     def clear_collection(self) -> Dict:
-        """Limpa todos os documentos da coleção atual."""
+        """Limpa todos os documentos da coleção atual (em lotes, sem carregar os textos)."""
         try:
-            # Pegar todos os IDs
-            all_docs = self.collection.get()
-            if all_docs['ids']:
-                self.collection.delete(ids=all_docs['ids'])
-                return {"status": "success", "message": f"Removidos {len(all_docs['ids'])} documentos"}
+            removed = self._delete_where(None)
+            self.manifest.clear()
+            self.figures.clear()
+            if self.compact is not None:
+                self.compact.clear()
+            self.bm25.clear()
+            self.bm25.save()
+            self.result_cache.clear()
+            self.filter_cache.clear()
+            if removed:
+                return {"status": "success", "message": f"Removidos {removed} documentos"}
             else:
                 return {"status": "info", "message": "Coleção já estava vazia"}
         except Exception as e:
             return {"status": "error", "message": f"Erro ao limpar coleção: {str(e)}"}
     
+    def rebuild_collection(self, space: str = HNSW_SPACE, m: int = HNSW_M,
+                           ef_construction: int = HNSW_EF_CONSTRUCTION, ef_search: int = HNSW_EF_SEARCH,
+                           batch_size: int = WRITE_BATCH_SIZE) -> Dict:
+        """
+        Recria a coleção com novos parâmetros HNSW, sem reler os arquivos de origem.
+        
+        Documentos, metadados e embeddings são copiados em lotes para uma coleção
+        temporária com a nova configuração; só depois da cópia conferida a coleção
+        antiga é apagada e a nova assume o nome. IDs não mudam, então manifesto e
+        índice BM25 continuam válidos.
+        
+        Args:
+            space: Distância ("l2", "cosine" ou "ip")
+            m: Vizinhos por nó do grafo HNSW
+            ef_construction: Candidatos avaliados na inserção
+            ef_search: Candidatos avaliados na busca
+            batch_size: Chunks copiados por lote
+        """
+        try:
+            configuration = hnsw_configuration(space, m, ef_construction, ef_search)
+            start_time = time.perf_counter()
+            batch_size = min(batch_size, self.client.get_max_batch_size())
+            
+            if REBUILD_COLLECTION_NAME in {collection.name for collection in self.client.list_collections()}:
+                self.client.delete_collection(REBUILD_COLLECTION_NAME)
+            target = self.client.create_collection(
+                name=REBUILD_COLLECTION_NAME, embedding_function=None, configuration=configuration
+            )
+            
+            total = self.collection.count()
+            copied = 0
+            while copied < total:
+                page = self.collection.get(
+                    limit=batch_size, offset=copied, include=["documents", "metadatas", "embeddings"]
+                )
+                if not page['ids']:
+                    break
+                target.add(
+                    ids=page['ids'], documents=page['documents'], embeddings=page['embeddings'],
+                    metadatas=page['metadatas']
+                )
+                copied += len(page['ids'])
+                print(f"   {copied:,}/{total:,} chunks copiados...", end="\r")
+            
+            if target.count() != total:
+                self.client.delete_collection(REBUILD_COLLECTION_NAME)
+                return {"status": "error", "message": f"Cópia incompleta: {target.count()} de {total} chunks"}
+            
+            self.client.delete_collection(COLLECTION_NAME)
+            target.modify(name=COLLECTION_NAME)
+            self.collection = self.client.get_collection(name=COLLECTION_NAME, embedding_function=None)
+            self.space = space
+            
+            # Similaridades mudam de escala com a distância: invalidar resultados em cache
+            self.manifest.save()
+            self.result_cache.clear()
+            self.filter_cache.clear()
+            
+            elapsed = time.perf_counter() - start_time
+            print(f"✅ Coleção reconstruída: {copied} chunks em {elapsed:.1f}s")
+            return {
+                "status": "success",
+                "message": f"Coleção reconstruída com {copied} chunks",
+                "documents_copied": copied,
+                "seconds": round(elapsed, 2),
+                "hnsw": self._hnsw_settings()
+            }
+        except Exception as e:
+            return {"status": "error", "message": f"Erro ao reconstruir coleção: {str(e)}"}
+    
     def reset_database(self) -> Dict:
         """Reseta completamente o banco de dados (remove tudo)."""
         try:
             # Deletar coleção
             self.client.delete_collection(COLLECTION_NAME)
             
-            # Recriar coleção vazia
+            # Recriar coleção vazia (já com a configuração HNSW atual)
             self.collection = self.client.create_collection(
                 name=COLLECTION_NAME,
-                embedding_function=chromadb.utils.embedding_functions.DefaultEmbeddingFunction()
+                embedding_function=None,
+                configuration=hnsw_configuration()
             )
+            self.space = HNSW_SPACE
+            self.manifest.clear()
+            self.figures.clear()
+            if self.compact is not None:
+                self.compact.clear()
+            self.bm25.clear()
+            self.bm25.save()
+            self.result_cache.clear()
+            self.filter_cache.clear()
             
             return {"status": "success", "message": "Banco de dados resetado completamente"}
         except Exception as e:
             return {"status": "error", "message": f"Erro ao resetar banco: {str(e)}"}
 
-# Instância global
-vector_db = SimpleVectorDB()
+# Instância global, criada sob demanda
+_vector_db: Optional[SimpleVectorDB] = None
+_vector_db_lock = threading.Lock()
+
+
+def get_vector_db() -> SimpleVectorDB:
+    """Retorna o banco de vetores global, abrindo o ChromaDB na primeira chamada."""
+    global _vector_db
+    if _vector_db is None:
+        with _vector_db_lock:
+            if _vector_db is None:
+                _vector_db = SimpleVectorDB()
+    return _vector_db
+
+
+_search_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_search_executor() -> ThreadPoolExecutor:
+    """Pool de threads limitado onde rodam as buscas bloqueantes do caminho async."""
+    global _search_executor
+    if _search_executor is None:
+        with _vector_db_lock:
+            if _search_executor is None:
+                _search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search")
+    return _search_executor
+
+
+async def _run_in_search_pool(func: Callable[[], List[Dict]]) -> List[Dict]:
+    loop = asyncio.get_running_loop()
+    # Copiar o contexto para a thread: as medições da busca entram no trace do nó
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_search_executor(), context.run, func)
+
+
+async def asearch(query: str, k: int = 3, mode: str = "vector", where: Optional[Dict] = None) -> List[Dict]:
+    """
+    Versão async de SimpleVectorDB.search.
+    
+    A consulta ao ChromaDB (e o embedding da query) são bloqueantes; rodam no pool
+    limitado de SEARCH_WORKERS threads para não travar o event loop, que continua
+    atendendo as demais sessões.
+    """
+    return await _run_in_search_pool(lambda: get_vector_db().search(query, k=k, mode=mode, where=where))
+
+
+def retrieve(query: str, k: int = 3, mode: str = DEFAULT_SEARCH_MODE, where: Optional[Dict] = None) -> List[Dict]:
+    """
+    Busca com reranking: traz RERANK_CANDIDATES candidatos e devolve os k
+    melhores segundo o cross-encoder (rerank.py).
+    
+    Sem reranker (RERANK=0, modelo indisponível ou orçamento de latência
+    estourado), os k primeiros da busca são devolvidos na ordem original.
+    """
+    db = get_vector_db()
+    if not RERANK_ENABLED or not get_reranker().available():
+        return db.search(query, k=k, mode=mode, where=where)
+    candidates = db.search(query, k=max(k, RERANK_CANDIDATES), mode=mode, where=where)
+    return get_reranker().rerank(query, candidates, k)
+
+
+async def aretrieve(query: str, k: int = 3, mode: str = DEFAULT_SEARCH_MODE, where: Optional[Dict] = None) -> List[Dict]:
+    """Versão async de retrieve (busca e reranking no pool de threads de busca)."""
+    return await _run_in_search_pool(lambda: retrieve(query, k=k, mode=mode, where=where))
+
+
+def warm_up() -> Dict:
+    """
+    Abre o banco e carrega o modelo de embeddings antecipadamente.
+    
+    Útil para pagar o custo de inicialização antes da primeira consulta
+    (ex: em background ao subir o Streamlit).
+    
+    Returns:
+        Tempo de cada etapa em milissegundos
+    """
+    timings = {}
+    
+    start_time = time.perf_counter()
+    db = get_vector_db()
+    timings["open_db_ms"] = round((time.perf_counter() - start_time) * 1000, 1)
+    
+    start_time = time.perf_counter()
+    db.embedding_function(["aquecimento"])
+    timings["load_embedding_model_ms"] = round((time.perf_counter() - start_time) * 1000, 1)
+    
+    if RERANK_ENABLED:
+        start_time = time.perf_counter()
+        get_reranker().load()
+        timings["load_reranker_ms"] = round((time.perf_counter() - start_time) * 1000, 1)
+    
+    return timings
+
+
+def __getattr__(name: str):
+    # Compatibilidade: `from tools import vector_db` continua funcionando, agora sob demanda
+    if name == "vector_db":
+        return get_vector_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 @tool
 def vectorize_financial_reports(reports: List[str]) -> Dict:
     """Indexa relatórios financeiros no banco de vetores."""
     if not reports:
         return {"status": "error", "message": "Nenhum relatório fornecido"}
-    return vector_db.add_documents(reports)
+    return get_vector_db().add_documents(reports)
 
 @tool  
-def semantic_search(query: str, k: int = 3) -> List[Dict]:
-    """Realiza busca semântica nos relatórios financeiros."""
+def semantic_search(query: str, k: int = 3, mode: str = "vector") -> List[Dict]:
+    """
+    Realiza busca semântica nos relatórios financeiros.
+    
+    Args:
+        query: Consulta
+        k: Número de resultados
+        mode: "vector", "bm25" (termos exatos) ou "hybrid"
+    """
     if not query or not query.strip():
         return []
-    return vector_db.search(query, k)
+    return get_vector_db().search(query, k, mode=mode)
 
 @tool
 def get_vector_stats() -> Dict:
     """Retorna estatísticas do banco de vetores."""
-    return vector_db.get_stats()
+    return get_vector_db().get_stats()
 
 @tool
 def get_retrieval_metrics() -> Dict:
     """Retorna métricas do sistema de recuperação."""
-    stats = vector_db.get_stats()
+    db = get_vector_db()
+    stats = db.get_stats()
     return {
         "total_documents": stats["total_documents"],
         "collection_name": stats["collection_name"], 
         "storage_path": stats["storage_path"],
-        "status": "active" if stats["total_documents"] > 0 else "empty"
+        "status": "active" if stats["total_documents"] > 0 else "empty",
+        "query_cache": db.query_cache.stats(),
+        "result_cache": db.result_cache.stats(),
+        "answer_cache": get_answer_cache().stats(),
+        "retrieval": metrics.retrieval_summary().model_dump(),
+        "pipeline": metrics.registry.to_json()
     }
 
 @tool
@@ -223,7 +1287,7 @@ def clear_vector_database() -> Dict:
     Returns:
         Status da operação de limpeza
     """
-    return vector_db.clear_collection()
+    return get_vector_db().clear_collection()
 
 @tool  
 def reset_vector_database() -> Dict:
@@ -236,89 +1300,131 @@ def reset_vector_database() -> Dict:
     Returns:
         Status da operação de reset
     """
-    return vector_db.reset_database()
+    return get_vector_db().reset_database()
+
+# Palavras-chave do extract_relevant_info (buscadas no documento inteiro com str.find)
+_EXTRACT_STOP_WORDS = {'o', 'a', 'do', 'da', 'de', 'no', 'na', 'em', 'por', 'para', 'com', 'foi', 'ser', 'qual', 'que', 'como'}
+_CURRENCY_KEYWORDS = ('r$', 'milhões', 'bilhões', '%')
+_METRIC_KEYWORDS = ('lucro', 'receita', 'ebitda', 'roe', 'margem', 'patrimônio')
+_PERIOD_KEYWORDS = ('3t25', 'q3', 'trimestre', '2024', '2025')
+_TITLE_KEYWORDS = ('📄', 'relatório', 'trimestre')
+
+
+@lru_cache(maxsize=256)
+def _query_terms(query: str) -> FrozenSet[str]:
+    """Termos da query sem stop words e pontuação (cacheado por query)."""
+    terms = set()
+    for word in query.lower().split():
+        cleaned_word = word.strip('.,?!();:')
+        if len(cleaned_word) > 2 and cleaned_word not in _EXTRACT_STOP_WORDS:
+            terms.add(cleaned_word)
+    return frozenset(terms)
+
+
+def _lines_containing(keyword: str, text: str, line_starts: List[int]) -> Iterator[int]:
+    """
+    Índices das linhas de `text` que contêm `keyword`.
+    
+    Busca no texto inteiro e, a cada ocorrência, salta para o início da linha
+    seguinte: o custo é proporcional às linhas encontradas, não ao total de linhas.
+    """
+    find = text.find
+    last_line = len(line_starts) - 1
+    pos = find(keyword)
+    while pos != -1:
+        line_index = bisect_right(line_starts, pos) - 1
+        yield line_index
+        if line_index == last_line:
+            return
+        pos = find(keyword, line_starts[line_index + 1])
+
+
+def _lines_with_any(keywords: Iterable[str], text: str, line_starts: List[int]) -> Set[int]:
+    lines: Set[int] = set()
+    for keyword in keywords:
+        lines.update(_lines_containing(keyword, text, line_starts))
+    return lines
+
+
+def _first_lines(raw_lines: List[str], n: int) -> List[str]:
+    """Primeiras n linhas não vazias (sem espaços nas pontas)."""
+    stripped = (line.strip() for line in raw_lines)
+    return list(islice((line for line in stripped if line), n))
+
+
+def _score_lines(document: str, query: str) -> Tuple[Dict[int, int], Set[int]]:
+    """
+    Pontua as linhas de um texto para a query: termos da query (+3 cada), valores (+2),
+    métricas (+2), períodos (+1).
+    
+    Returns:
+        (score por índice de linha, índices das linhas com valores monetários)
+    """
+    document_lower = document.lower()
+    line_starts = list(accumulate((len(line) + 1 for line in document.split('\n')[:-1]), initial=0))
+    
+    scores: Dict[int, int] = {}
+    for term in _query_terms(query):
+        for line_index in _lines_containing(term, document_lower, line_starts):
+            scores[line_index] = scores.get(line_index, 0) + 3
+    
+    currency_lines = _lines_with_any(_CURRENCY_KEYWORDS, document_lower, line_starts)
+    for keyword_lines, bonus in (
+        (currency_lines, 2),
+        (_lines_with_any(_METRIC_KEYWORDS, document_lower, line_starts), 2),
+        (_lines_with_any(_PERIOD_KEYWORDS, document_lower, line_starts), 1),
+    ):
+        for line_index in keyword_lines:
+            scores[line_index] = scores.get(line_index, 0) + bonus
+    return scores, currency_lines
+
 
-def extract_relevant_info(document: str, query: str) -> str:
+def extract_relevant_info(document: str, query: str, top_n: int = 8) -> str:
     """
-    Extrai informações relevantes do documento baseado na query do usuário usando busca semântica.
+    Extrai informações relevantes do documento baseado na query do usuário.
+    
+    As palavras-chave (termos da query, cacheados por query, e as listas fixas)
+    são buscadas no documento inteiro de uma vez; só as linhas com alguma
+    ocorrência são pontuadas, e as top_n são escolhidas com heap.
     
     Args:
         document: Documento completo encontrado
         query: Pergunta do usuário
+        top_n: Número máximo de linhas selecionadas
         
     Returns:
         Informações específicas extraídas
     """
     try:
-        # Dividir documento em chunks menores para análise
-        document_lines = [line.strip() for line in document.split('\n') if line.strip()]
+        raw_lines = document.split('\n')
         
         # Extrair título do documento
         document_title = ""
-        for line in document_lines[:3]:
-            if '📄' in line or any(word in line.lower() for word in [ 'relatório', 'trimestre']):
+        for line in _first_lines(raw_lines, 3):
+            line_lower = line.lower()
+            if any(keyword in line_lower for keyword in _TITLE_KEYWORDS):
                 document_title = f"**{line}**"
                 break
         
-        # Extrair termos-chave da query do usuário para busca flexível
-        query_terms = set()
-        query_lower = query.lower()
+        scores, currency_lines = _score_lines(document, query)
         
-        # Adicionar palavras da query (removendo stop words básicas)
-        stop_words = {'o', 'a', 'do', 'da', 'de', 'no', 'na', 'em', 'por', 'para', 'com', 'foi', 'ser', 'qual', 'que', 'como'}
-        for word in query_lower.split():
-            cleaned_word = word.strip('.,?!();:')
-            if len(cleaned_word) > 2 and cleaned_word not in stop_words:
-                query_terms.add(cleaned_word)
-        
-        # Scoring de linhas baseado na relevância para a query
         scored_lines = []
+        for line_index in sorted(scores):
+            line = raw_lines[line_index].strip()
+            if len(line) >= 10:  # Ignorar linhas muito curtas
+                scored_lines.append((scores[line_index], line))
         
-        for line in document_lines:
-            if len(line) < 10:  # Ignorar linhas muito curtas
-                continue
-                
-            line_lower = line.lower()
-            score = 0
-            
-            # Pontuação por termos da query encontrados
-            for term in query_terms:
-                if term in line_lower:
-                    score += 3
-                    
-            # Bonificação para linhas com valores financeiros
-            if any(indicator in line_lower for indicator in ['r$', 'milhões', 'bilhões', '%']):
-                score += 2
-                
-            # Bonificação para linhas com métricas financeiras
-            if any(metric in line_lower for metric in ['lucro', 'receita', 'ebitda', 'roe', 'margem', 'patrimônio']):
-                score += 2
-                
-            # Bonificação para linhas com números e períodos
-            if any(period in line_lower for period in ['3t25', 'q3', 'trimestre', '2024', '2025']):
-                score += 1
-                
-            if score > 0:
-                scored_lines.append((score, line))
-        
-        # Ordenar por score e pegar as mais relevantes
-        scored_lines.sort(key=lambda x: x[0], reverse=True)
-        relevant_lines = [f"- {line}" for score, line in scored_lines[:8]]  # Top 8 linhas mais relevantes
-        
-        # Se não encontrou linhas relevantes, usar fallback inteligente
+        # Top N linhas mais relevantes (nlargest preserva a ordem original em empates)
+        best_lines = heapq.nlargest(top_n, scored_lines, key=lambda item: item[0])
+        relevant_lines = [f"- {line}" for score, line in best_lines]
+        
+        # Se não encontrou linhas relevantes, usar linhas com dados financeiros gerais
         if not relevant_lines:
-            # Buscar linhas com dados financeiros gerais
-            for line in document_lines:
-                if any(indicator in line.lower() for indicator in ['r$', '%', 'milhões', 'bilhões']):
-                    relevant_lines.append(f"- {line}")
-                    if len(relevant_lines) >= 5:
-                        break
+            relevant_lines = [f"- {raw_lines[i].strip()}" for i in sorted(currency_lines)[:5]]
         
         # Se ainda não encontrou nada, pegar início do documento
         if not relevant_lines:
-            for i, line in enumerate(document_lines[1:6]):  # Pular título
-                if len(line) > 20:
-                    relevant_lines.append(f"- {line}")
+            relevant_lines = [f"- {line}" for line in _first_lines(raw_lines, 6)[1:] if len(line) > 20]  # Pular título
         
         # Montar resultado final
         result_parts = []
@@ -338,10 +1444,123 @@ def extract_relevant_info(document: str, query: str) -> str:
     except Exception as e:
         # Em caso de erro, retornar versão truncada
         return f"**Erro na extração:** {str(e)}\n\n{document[:300]}..."
+
+_context_encoder = None
+
+
+def _context_tokens(text: str) -> int:
+    """Tokens no encoding do LLM (tiktoken); ~4 caracteres por token se indisponível."""
+    global _context_encoder
+    if _context_encoder is None:
+        try:
+            import tiktoken
+            _context_encoder = tiktoken.encoding_for_model(CONTEXT_TOKENIZER_MODEL)
+        except Exception as e:
+            print(f"⚠️ Tokenizer indisponível, estimando tokens por caracteres: {e}")
+            _context_encoder = False
+    return len(_context_encoder.encode(text)) if _context_encoder else max(1, len(text) // 4)
+
+
+def _chunk_origin(chunk: Dict, rank: int) -> Tuple[str, int, str]:
+    """(arquivo, posição no documento, corpo) de um chunk "📄 arquivo: (Parte N):\\ncorpo"."""
+    header, _, body = chunk["content"].partition('\n')
+    match = _CHUNK_HEADER.match(header.strip())
+    if not match:
+        header, body = "", chunk["content"]
+    metadata = chunk.get("metadata") or {}
+    source = metadata.get("source") or (match.group("source") if match else "Documento")
+    if "chunk_index" in metadata:
+        position = metadata["chunk_index"] + 1
+    else:
+        position = int(match.group("part")) if match else rank
+    return source, position, body
+
+
+def _is_heading(line: str) -> bool:
+    """Título de seção: linha curta terminada em ":" que não é item de lista."""
+    return line.endswith(':') and len(line) <= 80 and not line.startswith(('•', '-', '*'))
+
+
+def build_context(query: str, chunks: List[Dict], token_budget: int = CONTEXT_TOKEN_BUDGET,
+                  count_tokens: Optional[Callable[[str], int]] = None) -> str:
+    """
+    Monta o contexto do LLM com as linhas mais relevantes de vários chunks.
+    
+    1. Descarta o texto repetido pela sobreposição entre chunks do mesmo arquivo
+       (linhas já vistas, inclusive o início cortado de um chunk);
+    2. Pontua as linhas como extract_relevant_info;
+    3. Escolhe as linhas de maior score (em empate, do chunk mais bem ranqueado)
+       enquanto couberem no orçamento de tokens. Linhas entram inteiras, então
+       nenhum valor é cortado ao meio.
+    
+    Sem nenhuma linha pontuada, usa o início do melhor chunk.
+    
+    Args:
+        query: Pergunta do usuário
+        chunks: Chunks na ordem do ranking (busca/reranking)
+        token_budget: Máximo de tokens do contexto
+        count_tokens: Contador de tokens alternativo (padrão: tiktoken do LLM)
         
-    except Exception as e:
-        # Em caso de erro, retornar versão truncada
-        return document[:300] + "..."
+    Returns:
+        Linhas escolhidas agrupadas por arquivo, na ordem do documento
+    """
+    count_tokens = count_tokens or _context_tokens
+    seen: Dict[str, Set[str]] = {}  # arquivo -> linhas já vistas (na ordem do ranking)
+    candidates = []  # (score, rank do chunk, linha no chunk, arquivo, posição no documento, texto, seção)
+    fallback = []
+    
+    for rank, chunk in enumerate(chunks):
+        source, position, body = _chunk_origin(chunk, rank)
+        known = seen.setdefault(source, set())
+        scores, _ = _score_lines(body, query)
+        heading = None
+        for line_index, raw_line in enumerate(body.split('\n')):
+            line = raw_line.strip()
+            if not line:
+                continue
+            repeated = line in known or (line_index == 0 and any(seen_line.endswith(line) for seen_line in known))
+            known.add(line)
+            if _is_heading(line):
+                # Títulos de seção ("LUCRO POR SEGMENTO:") acompanham as linhas escolhidas abaixo deles
+                heading = (position, line_index, line)
+                continue
+            if repeated or len(line) < 10:
+                continue
+            entry = (scores.get(line_index, 0), rank, line_index, source, position, line, heading)
+            if entry[0] > 0:
+                candidates.append(entry)
+            elif rank == 0:
+                fallback.append(entry)
+    
+    # Seleção gulosa: cada linha paga também o cabeçalho do arquivo e o título da seção, se ainda não entraram
+    selected: Dict[str, Dict[str, Tuple[int, int, str]]] = {}  # arquivo -> texto -> (posição, linha, texto)
+    used = 0
+    for score, rank, line_index, source, position, line, heading in sorted(
+        candidates or fallback, key=lambda item: (-item[0], item[1], item[2])
+    ):
+        lines = selected.get(source)
+        new_lines = [(position, line_index, f"- {line}")]
+        if heading and (lines is None or heading[2] not in lines):
+            new_lines.append(heading)
+        cost = sum(count_tokens(f"{text}\n") for _, _, text in new_lines)
+        if lines is None:
+            cost += count_tokens(f"**📄 {source}**\n")
+        if used + cost > token_budget:
+            continue
+        lines = selected.setdefault(source, {})
+        for item in new_lines:
+            lines.setdefault(item[2], item)
+        used += cost
+    metrics.observe("context_tokens", used)
+    
+    # Arquivos na ordem do ranking (o do melhor chunk primeiro), linhas na ordem do documento
+    parts = []
+    for source in (source for source in seen if source in selected):
+        lines = selected[source]
+        parts.append(f"**📄 {source}**")
+        parts.extend(text for _, _, text in sorted(lines.values()))
+        parts.append("")
+    return "\n".join(parts).strip()
 
 def read_file_content(file_path: str) -> str:
     """
@@ -353,61 +1572,53 @@ def read_file_content(file_path: str) -> str:
     Returns:
         Conteúdo do arquivo como string
     """
+    file_path = Path(file_path)
     try:
-        file_path = Path(file_path)
-        
-        if file_path.suffix.lower() == '.txt':
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
-                
-        elif file_path.suffix.lower() == '.md':
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
-                
-        elif file_path.suffix.lower() == '.pdf':
-            try:
-                import PyPDF2
-                with open(file_path, 'rb') as f:
-                    reader = PyPDF2.PdfReader(f)
-                    text = ""
-                    for page in reader.pages:
-                        extracted = page.extract_text()
-                        if extracted:  # Verificar se extraiu texto
-                            text += extracted + "\n"
-                    return text if text.strip() else "⚠️ Não foi possível extrair texto do PDF"
-            except ImportError:
-                return f"⚠️ PyPDF2 não instalado. Para processar PDFs: pip install PyPDF2"
-            except Exception as e:
-                return f"⚠️ Erro ao processar PDF: {str(e)}"
-                
-        elif file_path.suffix.lower() in ['.docx', '.doc']:
-            try:
-                import docx
-                doc = docx.Document(file_path)
-                text = ""
-                for paragraph in doc.paragraphs:
-                    text += paragraph.text + "\n"
-                return text
-            except ImportError:
-                return f"⚠️ python-docx não instalado. Para processar Word: pip install python-docx"
-                
-        else:
-            return f"❌ Formato de arquivo não suportado: {file_path.suffix}"
-            
+        text = "".join(iter_file_content(file_path))
+        if file_path.suffix.lower() == '.pdf' and not text.strip():
+            return "⚠️ Não foi possível extrair texto do PDF"
+        return text
+        
+    except ImportError as e:
+        return f"⚠️ {str(e)}"
+    except ValueError as e:
+        return f"❌ {str(e)}"
     except Exception as e:
+        if file_path.suffix.lower() == '.pdf':
+            return f"⚠️ Erro ao processar PDF: {str(e)}"
         return f"❌ Erro ao ler arquivo {file_path}: {str(e)}"
 
+def discover_files(folder: Path, patterns: Iterable[str], recursive: bool = True) -> List[Path]:
+    """Arquivos da pasta que casam com algum dos padrões (sem repetição, em ordem de caminho)."""
+    found = set()
+    for pattern in patterns:
+        matches = folder.rglob(pattern) if recursive else folder.glob(pattern)
+        found.update(path for path in matches if path.is_file())
+    return sorted(found)
+
+
 @tool
-def index_documents_from_path(folder_path: str, file_pattern: str = "*.txt") -> Dict:
+def index_documents_from_path(
+    folder_path: str,
+    file_pattern: str = DEFAULT_FILE_PATTERNS,
+    recursive: bool = True,
+    workers: int = EMBED_WORKERS,
+    batch_size: int = EMBED_BATCH_SIZE,
+    parse_workers: int = PARSE_WORKERS
+) -> Dict:
     """
     Indexa documentos de uma pasta específica.
     
     Args:
         folder_path: Caminho para a pasta com documentos
-        file_pattern: Padrão de arquivos (ex: "*.txt", "*.pdf", "*.md")
+        file_pattern: Padrões de arquivos separados por vírgula (ex: "*.txt,*.pdf")
+        recursive: Incluir subpastas
+        workers: Processos usados para gerar embeddings em paralelo
+        batch_size: Chunks por lote de embedding
+        parse_workers: Processos usados para extrair texto de PDFs e DOCX
         
     Returns:
-        Resultado da indexação
+        Resultado da indexação, com os arquivos que falharam e a vazão (arquivos/s, MB/s)
     """
     try:
         folder = Path(folder_path)
@@ -419,72 +1630,160 @@ def index_documents_from_path(folder_path: str, file_pattern: str = "*.txt") ->
             return {"status": "error", "message": f"Caminho não é uma pasta: {folder_path}"}
         
         # Encontrar arquivos
-        files = list(folder.glob(file_pattern))
+        patterns = [pattern.strip() for pattern in file_pattern.split(",") if pattern.strip()]
+        files = discover_files(folder, patterns, recursive)
         
         if not files:
             return {"status": "error", "message": f"Nenhum arquivo encontrado com padrão '{file_pattern}' em {folder_path}"}
         
-        # Ler conteúdo dos arquivos
-        documents = []
-        for file_path in files:
-            content = read_file_content(file_path)
-            documents.append(f"📄 {file_path.name}:\n{content}")
-        
-        # Indexar no banco vetorial
-        result = vector_db.add_documents(documents)
+        # Nome relativo à pasta: arquivos homônimos em subpastas diferentes não se sobrescrevem
+        names = [path.relative_to(folder).as_posix() for path in files]
+        result = get_vector_db().add_file_tree(
+            zip(names, files), workers=workers, batch_size=batch_size, parse_workers=parse_workers
+        )
+        if result.get("status") == "error":
+            return result
         
+        failed = {error["file"] for error in result["errors"]}
         return {
-            "status": result["status"] if "status" in result else "success",
-            "files_processed": len(files),
-            "documents_added": result.get("documents_added", len(documents)),
+            "status": "success",
+            "message": f"{len(failed)} arquivos com erro de leitura" if failed else "Todos os arquivos indexados",
+            "files_processed": len(files) - len(failed),
+            "files_parsed": result["files_parsed"],
+            "files_unchanged": result["files_unchanged"],
+            "files_failed": len(failed),
+            "errors": result["errors"],
+            "documents_added": result.get("documents_added", 0),
             "total_documents": result.get("total_documents", 0),
-            "files": [f.name for f in files]
+            "chunks_per_sec": result.get("chunks_per_sec", 0.0),
+            "files_per_sec": result["files_per_sec"],
+            "mb_per_sec": result["mb_per_sec"],
+            "seconds": result["seconds"],
+            "files": [name for name in names if name not in failed]
         }
         
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+def _format_retrieval(query: str, chunks: List[Dict]) -> str:
+    """Formata a resposta do retriever: fonte do melhor chunk e contexto montado dos chunks ranqueados."""
+    if not chunks:
+        return f"""**❌ Nenhum resultado encontrado para:** "{query}"
+
+**Sugestões:**
+- Carregue documentos usando a interface Streamlit  
+- Tente termos como "lucro", "receita", "patrimônio"
+- Verifique se há PDFs indexados no sistema"""
+
+    # Melhores linhas dos chunks ranqueados, dentro do orçamento de tokens
+    best_chunk = chunks[0]
+    content = build_context(query, chunks)
+    
+    metadata = best_chunk.get("metadata") or {}
+    source_line = ""
+    if metadata.get("source"):
+        period = f"{metadata['quarter']}T{metadata['year']}" if metadata.get("quarter") else metadata.get("year", "")
+        details = " · ".join(str(value) for value in (metadata.get("bank"), period) if value)
+        source_line = f"\n**Fonte:** {metadata['source']}" + (f" ({details})" if details else "")
+        
+    return f"""**📊 Informação Encontrada**
+
+**Similaridade:** {best_chunk['similarity']:.1%}{source_line}
+
+---
+
+{content}
+
+---
+*Retriever: ChromaDB com embeddings{" + reranking" if "rerank_score" in best_chunk else ""}*"""
+
+
 @tool
-def financial_reports_retriever_tool(query: str) -> str:
+def financial_reports_retriever_tool(
+    query: str,
+    mode: str = DEFAULT_SEARCH_MODE,
+    bank: Optional[str] = None,
+    year: Optional[int] = None,
+    quarter: Optional[int] = None,
+    source: Optional[str] = None
+) -> str:
     """
     Retriever direto para relatórios financeiros.
     
     Args:
         query: Pergunta sobre dados financeiros
+        mode: "hybrid" (embeddings + termos exatos), "vector" ou "bm25"
+        bank: Filtra por instituição citada na pergunta (ex: "Itaú", "Bradesco")
+        year: Filtra pelo ano do relatório (ex: 2024)
+        quarter: Filtra pelo trimestre do relatório (1 a 4)
+        source: Filtra por nome de arquivo (ex: "itau_q3_2024.txt")
         
     Returns:
-        Chunks mais relevantes encontrados
+        Linhas mais relevantes dos chunks encontrados (orçamento CONTEXT_TOKEN_BUDGET)
     """
     try:
-        # Buscar chunks relevantes
-        chunks = vector_db.search(query, k=3)
+        # Buscar chunks relevantes, só entre os que passam nos filtros
+        where = build_where(source=source, bank=bank, year=year, quarter=quarter)
+        chunks = retrieve(query, k=CONTEXT_CHUNKS, mode=mode, where=where)
+        return _format_retrieval(query, chunks)
         
-        if not chunks:
-            return f"""**❌ Nenhum resultado encontrado para:** "{query}"
+    except Exception as e:
+        return f"❌ Erro no retriever: {str(e)}"
 
-**Sugestões:**
-- Carregue documentos usando a interface Streamlit  
-- Tente termos como "lucro", "receita", "patrimônio"
-- Verifique se há PDFs indexados no sistema"""
 
-        # Pegar o melhor chunk
-        best_chunk = chunks[0]
+async def _afinancial_reports_retriever(
+    query: str,
+    mode: str = DEFAULT_SEARCH_MODE,
+    bank: Optional[str] = None,
+    year: Optional[int] = None,
+    quarter: Optional[int] = None,
+    source: Optional[str] = None
+) -> str:
+    """Caminho async do retriever (usado por ToolNode.ainvoke): busca no pool de threads."""
+    try:
+        where = build_where(source=source, bank=bank, year=year, quarter=quarter)
+        chunks = await aretrieve(query, k=CONTEXT_CHUNKS, mode=mode, where=where)
+        return _format_retrieval(query, chunks)
         
-        # Limitar o tamanho do conteúdo
-        content = best_chunk["content"]
-        if len(content) > 1500:
-            content = content[:1500] + "..."
-            
-        return f"""**📊 Informação Encontrada**
+    except Exception as e:
+        return f"❌ Erro no retriever: {str(e)}"
 
-**Similaridade:** {best_chunk['similarity']:.1%}
 
----
+financial_reports_retriever_tool.coroutine = _afinancial_reports_retriever
 
-{content}
 
----
-*Retriever: ChromaDB com embeddings*"""
+@tool
+def financial_figures_tool(
+    metric: str,
+    bank: Optional[str] = None,
+    year: Optional[int] = None,
+    quarter: Optional[int] = None
+) -> str:
+    """
+    Consulta exata dos números dos relatórios (tabela extraída na ingestão, sem busca vetorial).
+    
+    Use para o valor de um indicador (lucro líquido, ROE, margem financeira,
+    índice de Basileia, ...) de uma instituição ou para comparar instituições:
+    sem `bank`, traz o indicador de todas e um ranking.
+    
+    Args:
+        metric: Nome do indicador (ex: "lucro líquido", "ROE", "índice de eficiência")
+        bank: Instituição (ex: "Itaú", "Bradesco"); vazio compara todas
+        year: Ano do relatório (ex: 2024)
+        quarter: Trimestre do relatório (1 a 4)
+        
+    Returns:
+        Tabela com valor (e variação), seção e arquivo de cada número encontrado
+    """
+    try:
+        bank_id = None
+        if bank:
+            bank_id = normalize_bank(bank)
+            if bank_id is None:
+                return f"❌ Instituição desconhecida: {bank} (opções: {', '.join(BANK_ALIASES)})"
+        with metrics.timer("figures_lookup_ms"):
+            figures = get_vector_db().figures.lookup(metric, bank=bank_id, year=year, quarter=quarter)
+        return format_figures(metric, figures)
         
     except Exception as e:
-        return f"❌ Erro no retriever: {str(e)}"
\ No newline at end of file
+        return f"❌ Erro na consulta de números: {str(e)}"